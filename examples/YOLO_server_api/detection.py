@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-import gc
-
 import cv2
 import numpy as np
 from flask import Blueprint
@@ -140,7 +138,6 @@ def remove_overlapping_labels(datas):
     for index in sorted(to_remove, reverse=True):
         datas.pop(index)
 
-    gc.collect()
     return datas
 
 
@@ -223,7 +220,6 @@ def calculate_overlap(bbox1, bbox2):
 
     overlap_percentage = intersection_area / \
         float(bbox1_area + bbox2_area - intersection_area)
-    gc.collect()
     return overlap_percentage
 
 
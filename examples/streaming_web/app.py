@@ -12,6 +12,7 @@ from flask_socketio import SocketIO
 
 from .routes import register_routes
 from .sockets import register_sockets
+from .utils import frame_cache
 
 load_dotenv()
 
@@ -20,6 +21,9 @@ redis_host: str = os.getenv('redis_host') or 'localhost'
 redis_port: int = int(os.getenv('redis_port') or 6379)
 redis_password: str | None = os.getenv('redis_password') or None
 
+# Memory budget of the encoded frame cache, in megabytes
+frame_cache.max_bytes = int(os.getenv('FRAME_CACHE_MB') or 64) * 1024 * 1024
+
 # Connect to Redis
 r = redis.StrictRedis(
     host=redis_host,
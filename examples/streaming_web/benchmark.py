@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import time
+from collections.abc import Callable
+
+import cv2
+import numpy as np
+
+from src.drawing_manager import DrawingManager
+from src.frame_encoder import FrameEncoder
+
+# Detections of a busy frame: [x1, y1, x2, y2, confidence, class]
+SAMPLE_DATAS: list[list[float]] = [
+    [100, 300, 180, 520, 0.92, 5],
+    [110, 300, 160, 340, 0.88, 0],
+    [105, 360, 175, 440, 0.81, 7],
+    [400, 280, 470, 500, 0.90, 5],
+    [410, 280, 455, 320, 0.77, 2],
+    [405, 340, 465, 420, 0.70, 4],
+    [700, 250, 1100, 600, 0.95, 8],
+    [150, 500, 420, 700, 0.89, 9],
+    [900, 320, 960, 540, 0.86, 5],
+    [910, 320, 950, 360, 0.84, 0],
+]
+
+
+def measure(
+    name: str,
+    frames: list[np.ndarray],
+    build_update: Callable[[np.ndarray], bytes],
+    repeat: int,
+) -> tuple[str, int, float]:
+    """
+    Measure the bytes sent and server CPU time of one wall update.
+
+    Args:
+        name (str): The name of the mode.
+        frames (list[np.ndarray]): One frame per camera of the wall.
+        build_update (Callable[[np.ndarray], bytes]): Builds the bytes
+            sent to the browser for one camera.
+        repeat (int): The number of wall updates to average over.
+
+    Returns:
+        tuple[str, int, float]: The mode, bytes per wall update and CPU
+        milliseconds per wall update.
+    """
+    size = 0
+    start = time.process_time()
+    for _ in range(repeat):
+        size = sum(len(build_update(frame)) for frame in frames)
+    cpu_ms = (time.process_time() - start) * 1000 / repeat
+    return name, size, cpu_ms
+
+
+def main() -> None:
+    """
+    Compare the live view payloads for a wall of cameras: base64 images
+    in JSON (the former behaviour), binary frames annotated by the server,
+    and binary raw frames with the detections drawn by the browser.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        '--image', default='assets/images/data_aug/origin_image.jpg',
+    )
+    parser.add_argument('--cameras', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Cannot read {args.image}")
+    image = cv2.resize(image, (1280, 720))
+    # Vary the frames slightly so each camera is encoded for real
+    frames = [
+        cv2.add(image, np.full_like(image, i)) for i in range(args.cameras)
+    ]
+
+    drawing_manager = DrawingManager()
+    encoder = FrameEncoder()
+    metadata = json.dumps({
+        'annotated': False,
+        'detections': SAMPLE_DATAS,
+        'polygons': [],
+    }).encode()
+
+    def legacy(frame: np.ndarray) -> bytes:
+        annotated = drawing_manager.annotate(frame, [], SAMPLE_DATAS)
+        png = annotated.encode('en', '.png')
+        encoded = base64.b64encode(png).decode('utf-8')
+        return json.dumps({'images': [encoded]}).encode()
+
+    def base64_jpeg(frame: np.ndarray) -> bytes:
+        jpeg = server_overlay(frame)
+        encoded = base64.b64encode(jpeg).decode('utf-8')
+        return json.dumps({'images': [encoded]}).encode()
+
+    def server_overlay(frame: np.ndarray) -> bytes:
+        annotated = drawing_manager.annotate(frame, [], SAMPLE_DATAS)
+        return annotated.encode('en', *encoder.get_params('live'))
+
+    def client_overlay(frame: np.ndarray) -> bytes:
+        return encoder.encode(frame, 'live') + metadata
+
+    results = [
+        measure('base64 PNG in JSON', frames, legacy, args.repeat),
+        measure('base64 JPEG in JSON', frames, base64_jpeg, args.repeat),
+        measure(
+            'binary JPEG, server overlay', frames,
+            server_overlay, args.repeat,
+        ),
+        measure(
+            'binary JPEG, client overlay', frames,
+            client_overlay, args.repeat,
+        ),
+    ]
+    encoder.shutdown()
+
+    print(f"{args.cameras} cameras, 1280x720, {len(SAMPLE_DATAS)} detections")
+    print(f"{'mode':<30}{'KiB/update':>12}{'CPU ms/update':>16}")
+    for name, size, cpu_ms in results:
+        print(f"{name:<30}{size / 1024:>12.0f}{cpu_ms:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
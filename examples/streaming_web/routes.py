@@ -2,13 +2,23 @@ from __future__ import annotations
 
 from flask import abort
 from flask import Flask
+from flask import jsonify
 from flask import make_response
 from flask import render_template
+from flask import request
 from flask import Response
 from flask_limiter import Limiter
 
+from .utils import entry_timestamp
+from .utils import frame_cache
+from .utils import generate_mjpeg
+from .utils import get_frame
 from .utils import get_image_data
 from .utils import get_labels
+from .utils import get_latest_frames
+from .utils import get_mimetype
+from .utils import mark_viewed
+from .utils import MJPEG_BOUNDARY
 
 
 def register_routes(app: Flask, limiter: Limiter, r) -> None:
@@ -45,30 +55,62 @@ def register_routes(app: Flask, limiter: Limiter, r) -> None:
     @limiter.limit('60 per minute')
     def image(label: str, filename: str) -> Response:
         """
-        Serve an image file from Redis.
+        Serve the latest frame of a camera stream from Redis.
 
         Args:
             label (str): The label/category of the image.
             filename (str): The filename of the image.
 
         Returns:
-            Response: The image file as a response.
+            Response: The image file as a response, or 304 Not Modified
+            if the client already has the latest frame.
         """
         redis_key = f"{label}_{filename}"
-        img_encoded = r.get(redis_key)
+        latest = get_latest_frames(r, [redis_key])
+        mark_viewed(r, [redis_key])
+
+        img_encoded = None
+        if redis_key in latest:
+            entry_id, fields = latest[redis_key]
+            img_encoded = get_frame(fields)
 
         if img_encoded is None:
             abort(404, description='Resource not found')
 
         response = make_response(img_encoded)
-        response.headers.set('Content-Type', 'image/png')
-        response.headers['Cache-Control'] = (
-            'no-cache, no-store, must-revalidate'
-        )
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+        response.headers.set('Content-Type', get_mimetype(img_encoded))
+        # Let browsers revalidate, unchanged frames are answered with 304
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(entry_id)
+        response.last_modified = entry_timestamp(entry_id)
+
+        return response.make_conditional(request)
+
+    @app.route('/stream/<label>/<camera_id>.mjpg')
+    @limiter.limit('60 per minute')
+    def mjpeg_stream(label: str, camera_id: str) -> Response:
+        """
+        Stream the frames of a camera as multipart MJPEG, pushing each
+        frame as soon as it is added to Redis.
 
-        return response
+        Args:
+            label (str): The label/category of the camera.
+            camera_id (str): The specific ID of the camera to view.
+
+        Returns:
+            Response: The multipart/x-mixed-replace response.
+        """
+        return Response(
+            generate_mjpeg(r, f"{label}_{camera_id}"),
+            mimetype=(
+                f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+            ),
+            headers={
+                'Cache-Control': 'no-cache, no-store, must-revalidate',
+                # Stop Nginx from buffering the stream
+                'X-Accel-Buffering': 'no',
+            },
+        )
 
     @app.route('/camera/<label>/<camera_id>')
     @limiter.limit('60 per minute')
@@ -84,3 +126,14 @@ def register_routes(app: Flask, limiter: Limiter, r) -> None:
             str: The rendered 'camera.html' page for the specific camera.
         """
         return render_template('camera.html', label=label, camera_id=camera_id)
+
+    @app.route('/stats/frame-cache')
+    @limiter.limit('60 per minute')
+    def frame_cache_stats() -> Response:
+        """
+        Report the memory use and hit rate of the encoded frame cache.
+
+        Returns:
+            Response: The cache statistics as JSON.
+        """
+        return jsonify(frame_cache.stats())
@@ -1,28 +1,163 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections.abc import Callable
 from typing import Any
 
+from flask import request
 from flask_socketio import emit
+from flask_socketio import join_room
+from flask_socketio import leave_room
 from flask_socketio import SocketIO
 
-from .utils import get_image_data
+from .utils import get_cameras
+from .utils import get_frame
+from .utils import get_frame_metadata
 from .utils import get_labels
+from .utils import get_latest_frames
+from .utils import get_mimetype
+from .utils import mark_viewed
+from .utils import read_new_frames
 
 
-def register_sockets(socketio: SocketIO, r: Any) -> None:
+class FrameBroadcaster:
+    """
+    Runs a single background task per process that reads each camera
+    stream once and pushes new frames to the room of its label, so the
+    load scales with the cameras being viewed rather than with viewers.
+    """
+
+    def __init__(self, socketio: SocketIO, r: Any) -> None:
+        """
+        Initialise the broadcaster.
+
+        Args:
+            socketio (SocketIO): The SocketIO instance.
+            r (Any): The Redis connection.
+        """
+        self.socketio = socketio
+        self.r = r
+        # Labels subscribed to by each client session
+        self.subscriptions: dict[str, set[str]] = {}
+        self.task: Any = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, sid: str, label: str) -> None:
+        """
+        Subscribe a client to the updates of a label.
+
+        Args:
+            sid (str): The session ID of the client.
+            label (str): The label to subscribe to.
+        """
+        with self.lock:
+            self.subscriptions.setdefault(sid, set()).add(label)
+        self.start()
+
+    def unsubscribe(self, sid: str, label: str | None = None) -> None:
+        """
+        Unsubscribe a client from a label, or from all labels.
+
+        Args:
+            sid (str): The session ID of the client.
+            label (str | None): The label to unsubscribe from, or None to
+                drop all subscriptions of the client.
+        """
+        with self.lock:
+            if label is None:
+                self.subscriptions.pop(sid, None)
+                return
+            labels = self.subscriptions.get(sid, set())
+            labels.discard(label)
+            if not labels:
+                self.subscriptions.pop(sid, None)
+
+    def active_labels(self) -> set[str]:
+        """
+        Get the labels with at least one subscriber.
+
+        Returns:
+            set[str]: The subscribed labels.
+        """
+        with self.lock:
+            return set().union(*self.subscriptions.values())
+
+    def start(self) -> None:
+        """
+        Start the background task unless it is already running.
+        """
+        with self.lock:
+            if self.task is not None:
+                return
+            self.task = self.socketio.start_background_task(self.run)
+
+    def run(self) -> None:
+        """
+        Push updates until the task fails, then allow a restart on the
+        next subscription.
+        """
+        try:
+            update_images(
+                self.socketio, self.r, active_labels=self.active_labels,
+            )
+        finally:
+            with self.lock:
+                self.task = None
+
+
+def register_sockets(socketio: SocketIO, r: Any) -> FrameBroadcaster:
+    """
+    Register the WebSocket event handlers.
+
+    Args:
+        socketio (SocketIO): The SocketIO instance.
+        r (Any): The Redis connection.
+
+    Returns:
+        FrameBroadcaster: The broadcaster shared by all clients.
+    """
+    broadcaster = FrameBroadcaster(socketio, r)
+
     @socketio.on('connect')
     def handle_connect() -> None:
         """
         Handle client connection to the WebSocket.
         """
         emit('message', {'data': 'Connected'})
-        socketio.start_background_task(update_images, socketio, r)
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data: dict) -> None:
+        """
+        Join the room of a label to receive its frame updates.
+
+        Args:
+            data (dict): The event data with the 'label' to subscribe to.
+        """
+        label = str(data.get('label', ''))
+        if not label:
+            return
+        join_room(label)
+        broadcaster.subscribe(request.sid, label)
+
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(data: dict) -> None:
+        """
+        Leave the room of a label.
+
+        Args:
+            data (dict): The event data with the 'label' to unsubscribe from.
+        """
+        label = str(data.get('label', ''))
+        leave_room(label)
+        broadcaster.unsubscribe(request.sid, label)
 
     @socketio.on('disconnect')
     def handle_disconnect() -> None:
         """
         Handle client disconnection from the WebSocket.
         """
+        broadcaster.unsubscribe(request.sid)
         print('Client disconnected')
 
     @socketio.on('error')
@@ -35,30 +170,122 @@ def register_sockets(socketio: SocketIO, r: Any) -> None:
         """
         print(f"Error: {str(e)}")
 
+    return broadcaster
 
-def update_images(socketio: SocketIO, r: Any) -> None:
+
+def update_images(
+    socketio: SocketIO,
+    r: Any,
+    block: int = 1000,
+    refresh_interval: float = 10,
+    active_labels: Callable[[], set[str]] | None = None,
+) -> None:
     """
-    Update images every 10 seconds by scanning Redis
-    and emitting updates to clients.
+    Push new frames to the room of their label as soon as they are added
+    to the Redis streams, blocking on XREAD instead of polling.
 
     Args:
         socketio (SocketIO): The SocketIO instance.
         r (Any): The Redis connection.
+        block (int): The maximum time to block on XREAD, in milliseconds.
+        refresh_interval (float): How often to look for new or removed
+            streams and refresh their viewer heartbeats, in seconds.
+        active_labels (Callable[[], set[str]] | None): Returns the labels
+            being viewed. Only their streams are read. None reads all.
     """
+    last_ids: dict[str, str] = {}
+    cameras: dict[str, tuple[str, str]] = {}
+    last_refresh = float('-inf')
+    labels: set[str] | None = None
     while True:
         try:
-            socketio.sleep(10)
-            labels = get_labels(r)
-            for label in labels:
-                image_data = get_image_data(r, label)
-                socketio.emit(
-                    'update',
-                    {
-                        'label': label,
-                        'images': [img for img, _ in image_data],
-                        'image_names': [name for _, name in image_data],
-                    },
+            current = active_labels() if active_labels else None
+            if (
+                current != labels
+                or time.monotonic() - last_refresh >= refresh_interval
+            ):
+                labels = current
+                cameras = get_cameras(
+                    r, sorted(labels) if labels is not None else get_labels(r),
                 )
+                last_ids = refresh_stream_ids(r, last_ids, list(cameras))
+                mark_viewed(r, list(last_ids))
+                last_refresh = time.monotonic()
+
+            if not last_ids:
+                socketio.sleep(block / 1000)
+                continue
+
+            frames = read_new_frames(r, last_ids, block)
+            for label, update in group_by_label(frames, cameras).items():
+                socketio.emit('update', update, to=label)
+            # Let other greenlets run between reads
+            socketio.sleep(0)
         except Exception as e:
             print(f"Error updating images: {str(e)}")
             break
+
+
+def refresh_stream_ids(
+    r: Any,
+    last_ids: dict[str, str],
+    keys: list[str],
+) -> dict[str, str]:
+    """
+    Track the current set of streams, starting new streams from their
+    latest entry so only frames added from now on are pushed.
+
+    Args:
+        r (Any): The Redis connection.
+        last_ids (dict[str, str]): The last entry ID seen per stream.
+        keys (list[str]): The Redis keys of the streams to track.
+
+    Returns:
+        dict[str, str]: The last entry ID per tracked stream.
+    """
+    new_keys = [key for key in keys if key not in last_ids]
+    latest = get_latest_frames(r, new_keys)
+    return {
+        key: last_ids.get(key) or latest.get(key, ('0-0',))[0]
+        for key in keys
+    }
+
+
+def group_by_label(
+    frames: dict[str, tuple[str, dict]],
+    cameras: dict[str, tuple[str, str]],
+) -> dict[str, dict[str, list]]:
+    """
+    Group new frames into one update per label. Frames are sent as
+    binary attachments, with the detections for drawing them in the
+    browser when the frame is not annotated.
+
+    Args:
+        frames (dict[str, tuple[str, dict]]): The newest entry per stream.
+        cameras (dict[str, tuple[str, str]]): The label and camera name
+            per stream, from the camera index.
+
+    Returns:
+        dict[str, dict[str, list]]: The update payload, keyed by label.
+    """
+    grouped: dict[str, dict[str, list]] = {}
+    for key, (_, fields) in sorted(frames.items()):
+        image = get_frame(fields)
+        if image is None or key not in cameras:
+            continue
+        label, image_name = cameras[key]
+        update = grouped.setdefault(
+            label,
+            {
+                'label': label,
+                'images': [],
+                'image_names': [],
+                'mime_types': [],
+                'metadata': [],
+            },
+        )
+        update['images'].append(image)
+        update['image_names'].append(image_name)
+        update['mime_types'].append(get_mimetype(image))
+        update['metadata'].append(get_frame_metadata(fields))
+    return grouped
@@ -1,7 +1,38 @@
 $(document).ready(function(){
+    var image = $("#camera-image");
+    // The live MJPEG stream is used by default. If it fails, for example
+    // behind a proxy that buffers responses, poll snapshots instead.
+    image.one('error', function(){
+        startSnapshotPolling(image);
+    });
+});
+
+/**
+ * Poll the latest snapshot of the camera. The browser revalidates the
+ * cached snapshot, so unchanged frames are answered with 304.
+ * @param {jQuery} image - The camera image element
+ */
+function startSnapshotPolling(image) {
+    var url = image.attr('data-snapshot');
+    var lastEtag = null;
+    var objectUrl = null;
+
     function updateImage() {
-        var src = $("#camera-image").attr("src").split('?')[0]; // Remove any existing query string
-        $("#camera-image").attr("src", src + '?' + new Date().getTime());
+        fetch(url, { cache: 'no-cache' })
+            .then(function(response) {
+                var etag = response.headers.get('ETag');
+                if (!response.ok || (etag && etag === lastEtag)) return null;
+                lastEtag = etag;
+                return response.blob();
+            })
+            .then(function(blob) {
+                if (!blob) return;
+                if (objectUrl) URL.revokeObjectURL(objectUrl);
+                objectUrl = URL.createObjectURL(blob);
+                image.attr('src', objectUrl);
+            })
+            .catch(function() {});
     }
+    updateImage();
     setInterval(updateImage, 5000);  // Update every 5 seconds
-});
+}
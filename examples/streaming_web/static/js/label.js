@@ -65,6 +65,8 @@ function getCurrentPageLabel() {
 function setupSocketEventHandlers(socket, currentPageLabel) {
     socket.on('connect', () => {
         debugLog('WebSocket connected!');
+        // Join the room of this label; also re-joins after reconnecting
+        socket.emit('subscribe', { label: currentPageLabel });
     });
 
     socket.on('connect_error', (error) => {
@@ -96,39 +98,135 @@ function handleUpdate(data, currentPageLabel) {
 }
 
 /**
- * Update the camera grid
- * @param {Object} data - The data containing images and names
+ * Update the camera grid in place. Updates only carry the cameras
+ * with new frames, so the other cameras are left untouched.
+ * @param {Object} data - The data containing images, names and metadata
  */
 function updateCameraGrid(data) {
-    const fragment = document.createDocumentFragment();
+    const grid = $('.camera-grid');
     data.images.forEach((image, index) => {
-        const cameraData = {
-            image: image,
-            imageName: data.image_names[index],
-            label: data.label
-        };
-        const cameraDiv = createCameraDiv(cameraData);
-        fragment.appendChild(cameraDiv);
+        const imageName = data.image_names[index];
+        let cameraDiv = grid.children('.camera').filter(function () {
+            return $(this).attr('data-name') === imageName;
+        });
+        if (!cameraDiv.length) {
+            cameraDiv = $(createCameraDiv({ imageName, label: data.label }));
+            grid.append(cameraDiv);
+        }
+        setCameraFrame(
+            cameraDiv,
+            image,
+            data.mime_types[index],
+            data.metadata[index]
+        );
     });
-    $('.camera-grid').empty().append(fragment);
 }
 
 /**
  * Create a camera div element
  * @param {Object} cameraData - The data for creating the camera div
- * @param {string} cameraData.image - The image data
  * @param {string} cameraData.imageName - The image name
  * @param {string} cameraData.label - The label name
  * @returns {HTMLElement} - The div element containing the image and title
  */
-function createCameraDiv({ image, imageName, label }) {
-    const cameraDiv = $('<div>').addClass('camera');
+function createCameraDiv({ imageName, label }) {
+    const cameraDiv = $('<div>').addClass('camera').attr('data-name', imageName);
     const title = $('<h2>').text(imageName);
-    const img = $('<img>').attr('src', `data:image/png;base64,${image}`).attr('alt', `${label} image`);
-    cameraDiv.append(title).append(img);
+    const frame = $('<div>').addClass('frame');
+    const img = $('<img>').attr('alt', `${label} image`);
+    const canvas = $('<canvas>').addClass('overlay');
+    frame.append(img).append(canvas);
+    cameraDiv.append(title).append(frame);
     return cameraDiv[0];
 }
 
+/**
+ * Show a binary frame and draw its detections if the server did not.
+ * @param {jQuery} cameraDiv - The camera div
+ * @param {ArrayBuffer} image - The encoded frame
+ * @param {string} mimeType - The MIME type of the frame
+ * @param {Object} metadata - The detections and polygons of the frame
+ */
+function setCameraFrame(cameraDiv, image, mimeType, metadata) {
+    const img = cameraDiv.find('img')[0];
+    const canvas = cameraDiv.find('canvas.overlay')[0];
+    const previousUrl = img.dataset.objectUrl;
+    const url = URL.createObjectURL(new Blob([image], { type: mimeType }));
+
+    img.onload = () => {
+        // Release the previous frame once the new one is shown
+        if (previousUrl) URL.revokeObjectURL(previousUrl);
+        if (metadata.annotated) {
+            clearOverlay(canvas);
+        } else {
+            drawOverlay(canvas, img.naturalWidth, img.naturalHeight, metadata);
+        }
+    };
+    img.dataset.objectUrl = url;
+    img.src = url;
+}
+
+/**
+ * Clear the overlay of a camera.
+ * @param {HTMLCanvasElement} canvas - The overlay canvas
+ */
+function clearOverlay(canvas) {
+    canvas.getContext('2d').clearRect(0, 0, canvas.width, canvas.height);
+}
+
+// Colours and labels of the drawn categories, matching DrawingManager
+const CATEGORY_STYLES = {
+    0: { colour: 'rgb(0, 255, 0)', label: 'helmet' },
+    2: { colour: 'rgb(255, 0, 0)', label: 'no helmet' },
+    4: { colour: 'rgb(255, 0, 0)', label: 'no safety vest' },
+    5: { colour: 'rgb(255, 165, 0)', label: 'person' },
+    7: { colour: 'rgb(0, 255, 0)', label: 'safety vest' },
+    8: { colour: 'rgb(255, 225, 0)', label: 'machinery' },
+    9: { colour: 'rgb(255, 255, 0)', label: 'vehicle' }
+};
+
+/**
+ * Draw the controlled areas and detections of a frame on its overlay.
+ * @param {HTMLCanvasElement} canvas - The overlay canvas
+ * @param {number} width - The width of the frame in pixels
+ * @param {number} height - The height of the frame in pixels
+ * @param {Object} metadata - The detections and polygons of the frame
+ */
+function drawOverlay(canvas, width, height, metadata) {
+    // Draw in frame coordinates, CSS scales the canvas with the image
+    canvas.width = width;
+    canvas.height = height;
+    const ctx = canvas.getContext('2d');
+
+    metadata.polygons.forEach((points) => {
+        if (!points.length) return;
+        ctx.beginPath();
+        points.forEach(([x, y], i) => (i ? ctx.lineTo(x, y) : ctx.moveTo(x, y)));
+        ctx.closePath();
+        ctx.fillStyle = 'rgba(255, 105, 180, 0.5)';
+        ctx.fill();
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = 'rgb(255, 0, 255)';
+        ctx.stroke();
+    });
+
+    ctx.font = '20px sans-serif';
+    ctx.textBaseline = 'bottom';
+    metadata.detections.forEach(([x1, y1, x2, y2, , classId]) => {
+        const style = CATEGORY_STYLES[classId];
+        if (!style) return;
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = style.colour;
+        ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+
+        const textWidth = ctx.measureText(style.label).width;
+        ctx.fillStyle = style.colour;
+        ctx.fillRect(x1, y1 - 25, textWidth, 25);
+        ctx.fillStyle = 'black';
+        ctx.fillText(style.label, x1, y1 - 5);
+    });
+}
+
 /**
  * Log messages for debugging purposes
  * @param  {...any} messages - The messages to log
@@ -1,16 +1,38 @@
 from __future__ import annotations
 
 import base64
-from functools import lru_cache
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timezone
 
+import cv2
+import numpy as np
 import redis
 
+# Heartbeat keys telling the detection workers a stream is being viewed.
+# The prefix must match RedisManager.viewer_heartbeat_prefix in src/utils.py
+VIEWER_HEARTBEAT_PREFIX = '_viewers:'
+VIEWER_HEARTBEAT_TTL = 30
+
+# Camera index maintained by the detection workers: a hash of site -> last
+# frame timestamp, and per-site hashes (prefix + site) of camera -> JSON
+# with its stream key. Must match RedisManager.camera_index_key.
+CAMERA_INDEX_KEY = '_cameras'
+
+# Boundary between the frames of the multipart MJPEG streams
+MJPEG_BOUNDARY = 'frame'
+
+# JPEG quality of the frames converted for the MJPEG streams
+MJPEG_QUALITY = 80
+
 
-@lru_cache(maxsize=1024)
 def encode_image(image: bytes) -> str:
     """
-    Encode the image data to a base64 string,
-    with caching to optimize performance.
+    Encode the image data to a base64 string.
 
     Args:
         image (bytes): The image data in bytes.
@@ -21,9 +43,167 @@ def encode_image(image: bytes) -> str:
     return base64.b64encode(image).decode('utf-8')
 
 
+class FrameCache:
+    """
+    A memory-budgeted LRU cache of encoded frames, keyed by stream key
+    and entry ID. Stream entries never change, so the key identifies a
+    frame without hashing its bytes. Only the newest entry of each
+    stream is kept.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Initialise the cache.
+
+        Args:
+            max_bytes (int): The budget for the cached payloads, in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        # The cached entry ID of each stream
+        self.latest_ids: dict[str, str] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, entry_id: str) -> str | None:
+        """
+        Look up an encoded frame.
+
+        Args:
+            key (str): The Redis key of the stream.
+            entry_id (str): The ID of the stream entry.
+
+        Returns:
+            str | None: The encoded frame, or None if it is not cached.
+        """
+        with self.lock:
+            payload = self.entries.get((key, entry_id))
+            if payload is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((key, entry_id))
+            self.hits += 1
+            return payload
+
+    def put(self, key: str, entry_id: str, payload: str) -> None:
+        """
+        Cache an encoded frame, replacing older frames of its stream and
+        evicting the least recently used frames over the budget.
+
+        Args:
+            key (str): The Redis key of the stream.
+            entry_id (str): The ID of the stream entry.
+            payload (str): The encoded frame.
+        """
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            previous_id = self.latest_ids.get(key)
+            if previous_id is not None:
+                self._remove((key, previous_id))
+            self.entries[(key, entry_id)] = payload
+            self.latest_ids[key] = entry_id
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, cache_key: tuple[str, str]) -> None:
+        """
+        Remove an entry. The caller must hold the lock.
+
+        Args:
+            cache_key (tuple[str, str]): The stream key and entry ID.
+        """
+        payload = self.entries.pop(cache_key, None)
+        if payload is None:
+            return
+        self.size -= len(payload)
+        if self.latest_ids.get(cache_key[0]) == cache_key[1]:
+            del self.latest_ids[cache_key[0]]
+
+    def clear(self) -> None:
+        """
+        Drop all entries and reset the statistics.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.latest_ids.clear()
+            self.size = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the usage and hit-rate statistics of the cache.
+
+        Returns:
+            dict[str, float]: Entries, bytes, budget, hits, misses,
+            evictions and the hit rate.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Base64 frames of the label pages, shared by the request threads
+frame_cache = FrameCache()
+
+
+def get_mimetype(image: bytes) -> str:
+    """
+    Get the MIME type of an encoded frame from its signature, as the
+    detection workers may publish PNG, JPEG or WebP frames.
+
+    Args:
+        image (bytes): The encoded image.
+
+    Returns:
+        str: The MIME type, 'image/png' if the format is unknown.
+    """
+    if image[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if image[:4] == b'RIFF' and image[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/png'
+
+
+def mark_viewed(r: redis.Redis, keys: list[bytes] | list[str]) -> None:
+    """
+    Refresh the viewer heartbeats of the given stream keys, so the
+    detection workers keep rendering and publishing their frames.
+
+    Args:
+        r (redis.Redis): The Redis connection.
+        keys (list): The Redis keys of the streams being viewed.
+    """
+    if not keys:
+        return
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        pipe.set(
+            f"{VIEWER_HEARTBEAT_PREFIX}{key}", 1, ex=VIEWER_HEARTBEAT_TTL,
+        )
+    pipe.execute()
+
+
 def get_labels(r: redis.Redis) -> list[str]:
     """
-    Retrieve and decode unique labels from Redis keys, excluding 'test'.
+    Retrieve the labels (sites) from the camera index, excluding 'test'.
+
+    Sites whose camera hash expired, as all their cameras stopped
+    publishing, are left out and pruned from the index.
 
     Args:
         r (redis.Redis): The Redis connection.
@@ -31,17 +211,151 @@ def get_labels(r: redis.Redis) -> list[str]:
     Returns:
         list: Sorted list of unique labels.
     """
-    cursor, keys = r.scan()
-    decoded_keys = [key.decode('utf-8') for key in keys]
-    labels = {
-        key.split('_')[0]
-        for key in decoded_keys
-        if key.count('_') == 1
-        and not key.startswith('_')
-        and not key.endswith('_')
-        and key.split('_')[0] != 'test'
+    labels = sorted({
+        label.decode('utf-8') if isinstance(label, bytes) else label
+        for label in r.hkeys(CAMERA_INDEX_KEY)
+    } - {'test'})
+    if not labels:
+        return []
+    pipe = r.pipeline(transaction=False)
+    for label in labels:
+        pipe.exists(f"{CAMERA_INDEX_KEY}:{label}")
+    exists = pipe.execute()
+    expired = [label for label, found in zip(labels, exists) if not found]
+    if expired:
+        r.hdel(CAMERA_INDEX_KEY, *expired)
+    return [label for label, found in zip(labels, exists) if found]
+
+
+def get_cameras(
+    r: redis.Redis,
+    labels: list[str],
+) -> dict[str, tuple[str, str]]:
+    """
+    Look up the cameras of the given labels in the camera index.
+
+    Args:
+        r (redis.Redis): The Redis connection.
+        labels (list[str]): The labels (sites) to look up.
+
+    Returns:
+        dict[str, tuple[str, str]]: The label and camera name, keyed by
+        the Redis key of the camera stream.
+    """
+    if not labels:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for label in labels:
+        pipe.hgetall(f"{CAMERA_INDEX_KEY}:{label}")
+    cameras = {}
+    for label, entries in zip(labels, pipe.execute()):
+        for camera, value in entries.items():
+            if isinstance(camera, bytes):
+                camera = camera.decode('utf-8')
+            cameras[json.loads(value)['stream']] = (label, camera)
+    return cameras
+
+
+def get_latest_frames(
+    r: redis.Redis,
+    keys: list[str],
+) -> dict[str, tuple[str, dict]]:
+    """
+    Read the latest entry of each stream in a single round trip.
+
+    Args:
+        r (redis.Redis): The Redis connection.
+        keys (list[str]): The Redis keys of the streams.
+
+    Returns:
+        dict[str, tuple[str, dict]]: The entry ID and fields of the latest
+        entry, keyed by stream. Empty streams are left out.
+    """
+    if not keys:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.xrevrange(key, count=1)
+    latest = {}
+    for key, entries in zip(keys, pipe.execute()):
+        if entries:
+            entry_id, fields = entries[0]
+            if isinstance(entry_id, bytes):
+                entry_id = entry_id.decode('utf-8')
+            latest[key] = (entry_id, fields)
+    return latest
+
+
+def read_new_frames(
+    r: redis.Redis,
+    last_ids: dict[str, str],
+    block: int = 1000,
+) -> dict[str, tuple[str, dict]]:
+    """
+    Block until new entries arrive on any of the streams and return the
+    newest entry of each stream that advanced.
+
+    Args:
+        r (redis.Redis): The Redis connection.
+        last_ids (dict[str, str]): The last entry ID seen per stream.
+            Updated in place with the IDs of the returned entries.
+        block (int): The maximum time to block, in milliseconds.
+
+    Returns:
+        dict[str, tuple[str, dict]]: The entry ID and fields of the newest
+        entry, keyed by stream. Empty if nothing arrived in time.
+    """
+    if not last_ids:
+        return {}
+    response = r.xread(streams=last_ids, block=block) or []
+    frames = {}
+    for key, entries in response:
+        if not entries:
+            continue
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        # Viewers only need the newest frame of each camera
+        entry_id, fields = entries[-1]
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode('utf-8')
+        last_ids[key] = entry_id
+        frames[key] = (entry_id, fields)
+    return frames
+
+
+def get_frame(fields: dict) -> bytes | None:
+    """
+    Get the encoded frame of a stream entry.
+
+    Args:
+        fields (dict): The fields of the stream entry.
+
+    Returns:
+        bytes | None: The encoded frame, or None if the entry has none.
+    """
+    return fields.get(b'frame', fields.get('frame'))
+
+
+def get_frame_metadata(fields: dict) -> dict:
+    """
+    Get the detections of a stream entry for drawing them in the browser.
+
+    Args:
+        fields (dict): The fields of the stream entry.
+
+    Returns:
+        dict: Whether the frame is already annotated, the detections as
+        ``[x1, y1, x2, y2, confidence, class]`` and the controlled-area
+        polygons as lists of ``[x, y]`` points.
+    """
+    def field(name: str, default: bytes) -> bytes:
+        return fields.get(name.encode(), fields.get(name, default))
+
+    return {
+        'annotated': field('annotated', b'1') not in (b'0', '0'),
+        'detections': json.loads(field('detections', b'[]')),
+        'polygons': json.loads(field('polygons', b'[]')),
     }
-    return sorted(labels)
 
 
 def get_image_data(r: redis.Redis, label: str) -> list[tuple[str, str]]:
@@ -55,14 +369,120 @@ def get_image_data(r: redis.Redis, label: str) -> list[tuple[str, str]]:
     Returns:
         list: List of tuples containing base64 encoded images and their names.
     """
-    cursor, keys = r.scan(match=f"{label}_*")
-    image_data = []
+    cameras = get_cameras(r, [label])
+    keys = list(cameras)
 
-    for key in keys:
-        image = r.get(key)
+    # Someone is looking at this label, keep its streams published
+    mark_viewed(r, keys)
+
+    image_data = []
+    for key, (entry_id, fields) in get_latest_frames(r, keys).items():
+        image = get_frame(fields)
         if image is not None:
-            encoded_image = encode_image(image)
-            image_name = key.decode('utf-8').split('_')[1]
+            encoded_image = frame_cache.get(key, entry_id)
+            if encoded_image is None:
+                encoded_image = encode_image(image)
+                frame_cache.put(key, entry_id, encoded_image)
+            image_name = cameras[key][1]
             image_data.append((encoded_image, image_name))
 
     return sorted(image_data, key=lambda x: x[1])
+
+
+def entry_timestamp(entry_id: str) -> datetime:
+    """
+    Get the time a stream entry was added from its ID.
+
+    Args:
+        entry_id (str): The stream entry ID, '<milliseconds>-<sequence>'.
+
+    Returns:
+        datetime: The UTC time the entry was added.
+    """
+    milliseconds = int(entry_id.split('-', 1)[0])
+    return datetime.fromtimestamp(milliseconds / 1000, tz=timezone.utc)
+
+
+def build_multipart_frame(image: bytes) -> bytes:
+    """
+    Build one part of a multipart/x-mixed-replace response.
+
+    Args:
+        image (bytes): The encoded frame.
+
+    Returns:
+        bytes: The boundary, headers and body of the part.
+    """
+    headers = (
+        f"--{MJPEG_BOUNDARY}\r\n"
+        f"Content-Type: {get_mimetype(image)}\r\n"
+        f"Content-Length: {len(image)}\r\n\r\n"
+    )
+    return headers.encode('utf-8') + image + b'\r\n'
+
+
+def to_jpeg(image: bytes, quality: int = MJPEG_QUALITY) -> bytes | None:
+    """
+    Convert an encoded frame to JPEG, as MJPEG clients only render JPEG
+    parts while the live profile may publish WebP or PNG.
+
+    Args:
+        image (bytes): The encoded frame.
+        quality (int): The JPEG quality of converted frames.
+
+    Returns:
+        bytes | None: The frame as is if already JPEG, else converted;
+        None if it cannot be decoded.
+    """
+    if get_mimetype(image) == 'image/jpeg':
+        return image
+    frame = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    success, buffer = cv2.imencode(
+        '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality],
+    )
+    return buffer.tobytes() if success else None
+
+
+def generate_mjpeg(
+    r: redis.Redis,
+    key: str,
+    block: int = 1000,
+    heartbeat_interval: float = 10,
+) -> Iterator[bytes]:
+    """
+    Yield the frames of a stream as multipart JPEG parts as they arrive,
+    starting with its latest frame. Frames published in another format
+    are converted, and frames that cannot be decoded are skipped.
+
+    Args:
+        r (redis.Redis): The Redis connection.
+        key (str): The Redis key of the stream.
+        block (int): The maximum time to block on XREAD, in milliseconds.
+        heartbeat_interval (float): How often to refresh the viewer
+            heartbeat of the stream, in seconds.
+
+    Yields:
+        bytes: One multipart part per frame.
+    """
+    latest = get_latest_frames(r, [key])
+    last_ids = {key: latest[key][0] if key in latest else '0-0'}
+    if key in latest:
+        image = get_frame(latest[key][1])
+        image = to_jpeg(image) if image is not None else None
+        if image is not None:
+            yield build_multipart_frame(image)
+
+    last_heartbeat = float('-inf')
+    while True:
+        if time.monotonic() - last_heartbeat >= heartbeat_interval:
+            mark_viewed(r, [key])
+            last_heartbeat = time.monotonic()
+
+        frames = read_new_frames(r, last_ids, block)
+        if key in frames:
+            image = get_frame(frames[key][1])
+            image = to_jpeg(image) if image is not None else None
+            if image is not None:
+                yield build_multipart_frame(image)
@@ -6,36 +6,64 @@ import gc
 import logging
 import os
 import time
+from collections.abc import AsyncGenerator
 from datetime import datetime
-from multiprocessing import Process
 from typing import TypedDict
 
 import anyio
 import cv2
+import numpy as np
 import yaml
+from aiohttp import web
 from dotenv import load_dotenv
 from watchdog.observers import Observer
 
+from src.cpu_governor import CpuGovernor
 from src.danger_detector import DangerDetector
+from src.detection_scheduler import DetectionScheduler
+from src.drawing_manager import AnnotatedFrame
 from src.drawing_manager import DrawingManager
+from src.duty_schedule import DutySchedule
+from src.duty_schedule import Period
+from src.duty_schedule import zone_only_rules
+from src.frame_encoder import FrameEncoder
+from src.frame_encoder import shutdown_executor
+from src.frame_pool import MemoryPolicy
+from src.frame_trace import FrameTrace
+from src.frame_trace import TraceRecorder
 from src.lang_config import Translator
 from src.live_stream_detection import LiveStreamDetector
 from src.monitor_logger import LoggerConfig
 from src.notifiers.line_notifier import LineNotifier
+from src.pipeline import BLOCK
+from src.pipeline import DROP_OLDEST
+from src.pipeline import Pipeline
+from src.pipeline import Stage
+from src.safety_rules import PERSON
+from src.stage_metrics import metrics
+from src.stage_metrics import render
 from src.stream_capture import StreamCapture
 from src.utils import FileEventHandler
 from src.utils import RedisManager
 from src.utils import Utils
+from src.worker_pool import send_report
+from src.worker_pool import worker_count
+from src.worker_pool import WorkerPool
 
 # Load environment variables
 load_dotenv()
 
 is_windows = os.name == 'nt'
 
-# Initialise Redis manager
+# Initialise Redis manager. Each process lazily opens its own
+# connection pool, so the stream processes forked later are safe.
 if not is_windows:
     redis_manager = RedisManager()
 
+# Collects garbage only when the RSS of a process crosses
+# GC_RSS_THRESHOLD_MB, rather than after every frame
+memory_policy = MemoryPolicy()
+
 
 class AppConfig(TypedDict, total=False):
     """
@@ -50,6 +78,703 @@ class AppConfig(TypedDict, total=False):
     expire_date: str | None
     line_token: str | None
     language: str | None
+    safety_rules: dict | None
+    encoding: dict | None
+    detection_rate: dict | None
+    schedule: dict | None
+
+
+class FrameJob(TypedDict, total=False):
+    """
+    Typed dictionary of one frame passed between the pipeline stages.
+    """
+    frame: np.ndarray
+    timestamp: float
+    # When the frame entered the pipeline
+    start_time: float
+    datas: list[list[float]]
+    warnings: list[str]
+    polygons: list
+    annotated_frame: AnnotatedFrame
+    # Language of the last notification token, for the displayed frame
+    language: str | None
+    # Detection mode of the schedule when the frame was captured
+    period: Period
+    # Spans of the frame through the stages, if traced
+    trace: FrameTrace | None
+
+
+class StreamWorkflow:
+    """
+    Detects hazards on one video stream, notifies and publishes frames.
+
+    Detection, evaluation, notification and publishing run as the stages
+    of a pipeline, so frame N+1 is inferred while frame N is rendered and
+    published.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        video_url: str,
+        model_key: str = 'yolo11n',
+        site: str | None = None,
+        stream_name: str = 'prediction_visual',
+        notifications: dict[str, str] | None = None,
+        detect_with_server: bool = False,
+        safety_rules: dict | None = None,
+        encoding: dict | None = None,
+        models: dict | None = None,
+        schedule: dict | None = None,
+    ) -> None:
+        """
+        Initialise the workflow of a stream.
+
+        Args:
+            logger (logging.Logger): A logger instance for logging messages.
+            video_url (str): The URL of the live stream to monitor.
+            model_key (str): The model key for detection.
+            site (Optional[str]): The site for stream processing.
+            stream_name (str, optional): The camera name of the stream.
+            notifications (Optional[dict]): Line tokens with their languages.
+            detect_with_server (bool): If run detection with server api or not.
+            safety_rules (Optional[dict]): Safety rules to override
+                or disable for this stream.
+            encoding (Optional[dict]): Output format and quality
+                per consumer of the annotated frames.
+            models (Optional[dict]): Loaded models shared by the streams
+                of this process.
+            schedule (Optional[dict]): Working hours and detection mode
+                of each period of the day.
+        """
+        self.logger = logger
+        self.video_url = video_url
+        self.site = site
+        self.stream_name = stream_name
+        self.safety_rules = safety_rules
+        self.encoding = encoding
+        self.detect_with_server = detect_with_server
+        self.models = models
+
+        # Working hours and detection mode of each period
+        self.schedule = schedule
+        self.duty_schedule = self.load_schedule(schedule)
+        self.period: Period = {'mode': 'full'}
+
+        # Frames per second allotted by the detection scheduler, if any
+        self.rate: float | None = None
+
+        # Initialise the stream capture object
+        self.streaming_capture = StreamCapture(stream_url=video_url)
+
+        # Initialise the live stream detector
+        self.live_stream_detector = LiveStreamDetector(
+            api_url=os.getenv('API_URL', 'http://localhost:5000'),
+            model_key=model_key,
+            output_folder=site,
+            detect_with_server=detect_with_server,
+            models=models,
+        )
+
+        # Detectors of the controlled-zone-only periods, by model key
+        self.zone_detectors: dict[str, LiveStreamDetector] = {}
+
+        # Initialise the drawing manager
+        self.drawing_manager = DrawingManager()
+
+        # Initialise the encoder of the annotated frames
+        self.frame_encoder = FrameEncoder(encoding)
+
+        # Writes sampled and slow frame traces of this worker
+        self.tracer = TraceRecorder()
+
+        # Initialise the LINE notifier
+        self.line_notifier = LineNotifier()
+
+        # Initialise the DangerDetector, and the one of the
+        # controlled-zone-only periods
+        self.danger_detector = DangerDetector(safety_rules)
+        self.zone_danger_detector = DangerDetector(
+            zone_only_rules(safety_rules),
+        )
+
+        # Dictionary to store last notification time for each language
+        self.notifications = notifications or {}
+        self.last_notification_times = {
+            line_token: int(time.time()) - 300
+            for line_token in self.notifications
+        }
+
+        # Without viewers, only publish a snapshot at this interval (in
+        # seconds) so the stream remains listed in the web interface
+        self.idle_publish_interval = int(
+            os.getenv('IDLE_PUBLISH_INTERVAL', 60),
+        )
+        self.last_publish_time = 0.0
+
+        # With the 'thumbnail' retention, idle snapshots are stored
+        # downscaled, as nobody is watching the full-size live view
+        self.thumbnail_retention = (
+            os.getenv('REDIS_RETENTION', 'full') == 'thumbnail'
+        )
+
+        # Stale frames are dropped before detection and publishing, while
+        # every detected frame is evaluated and checked for notifications
+        self.pipeline = Pipeline([
+            Stage('detect', self.detect, maxsize=1, policy=DROP_OLDEST),
+            Stage('evaluate', self.evaluate, maxsize=2, policy=BLOCK),
+            Stage('notify', self.notify, maxsize=2, policy=BLOCK),
+            Stage('publish', self.publish, maxsize=1, policy=DROP_OLDEST),
+        ], on_drop=self.drop)
+
+    def observe(
+        self,
+        stage: str,
+        seconds: float,
+        trace: FrameTrace | None = None,
+    ) -> None:
+        """
+        Record the time a stage took in the metrics of this process, and
+        in the trace of the frame.
+
+        Args:
+            stage (str): The stage, one of ``stage_metrics.STAGES``.
+            seconds (float): The time taken, ending now.
+            trace (Optional[FrameTrace]): The trace of the frame, if any.
+        """
+        metrics.observe(self.site, self.stream_name, stage, seconds)
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    @property
+    def key(self) -> str:
+        """
+        Get the Redis stream key of the stream.
+
+        Returns:
+            str: The key, ``{site}_{stream_name}``.
+        """
+        return f"{self.site}_{self.stream_name}"
+
+    async def run(self, updates: asyncio.Queue | None = None) -> None:
+        """
+        Process the stream until it ends or the task is cancelled.
+
+        Args:
+            updates (Optional[asyncio.Queue]): Changed configurations of
+                the stream, applied between frames.
+        """
+        try:
+            await self.pipeline.run(self.frames(updates))
+        finally:
+            # Release resources after processing
+            await self.streaming_capture.release_resources()
+            self.frame_encoder.shutdown()
+            self.tracer.close()
+            if not is_windows:
+                await redis_manager.remove_stream(
+                    self.site, self.stream_name,
+                )
+                self.logger.info(f"Deleted Redis key: {self.key}")
+            gc.collect()
+
+    async def frames(
+        self,
+        updates: asyncio.Queue | None = None,
+    ) -> AsyncGenerator[FrameJob]:
+        """
+        Capture the frames of the stream, the source of the pipeline.
+
+        Args:
+            updates (Optional[asyncio.Queue]): Changed configurations and
+                detection rates of the stream, applied before the next
+                frame is captured.
+
+        Yields:
+            FrameJob: The captured frame and its timestamp.
+        """
+        wait_start = time.perf_counter()
+        async for frame, timestamp in (
+            self.streaming_capture.execute_capture()
+        ):
+            trace = self.tracer.start(
+                self.site, self.stream_name, timestamp,
+            )
+            capture_wait = time.perf_counter() - wait_start
+            decode = self.streaming_capture.read_time
+            self.observe('capture_wait', capture_wait)
+            self.observe('decode', decode)
+            if trace is not None:
+                # Both end as the frame enters the pipeline
+                trace.add('capture_wait', capture_wait, end=0.0)
+                trace.add('decode', decode, end=0.0)
+            await self.apply_updates(updates)
+            if self.update_period(timestamp)['mode'] == 'off':
+                # Disconnect from the camera until the period ends. The
+                # capture reconnects on the next read.
+                self.streaming_capture.release_frame(frame)
+                await self.streaming_capture.release_resources()
+                while self.update_period(time.time())['mode'] == 'off':
+                    await asyncio.sleep(
+                        self.duty_schedule.seconds_to_next_minute(
+                            time.time(),
+                        ),
+                    )
+                    await self.apply_updates(updates)
+                wait_start = time.perf_counter()
+                continue
+
+            # Capture at the allotted rate, or at the pace of the slowest
+            # stage without a scheduler, and at most at the reduced rate
+            # of the schedule
+            bottleneck = self.pipeline.bottleneck()
+            interval = (
+                max(1 / self.rate, bottleneck) if self.rate
+                else int(bottleneck) + 1
+            )
+            if self.period['mode'] == 'reduced':
+                interval = max(interval, 1 / self.period['rate'])
+            self.streaming_capture.update_capture_interval(interval)
+            yield {
+                'frame': frame,
+                'timestamp': timestamp,
+                'start_time': time.time(),
+                'period': self.period,
+                'trace': trace,
+            }
+            wait_start = time.perf_counter()
+
+    async def apply_updates(self, updates: asyncio.Queue | None) -> None:
+        """
+        Apply the queued configurations and detection rates.
+
+        Args:
+            updates (Optional[asyncio.Queue]): Changed configurations and
+                detection rates of the stream.
+        """
+        while updates is not None and not updates.empty():
+            kind, payload = updates.get_nowait()
+            if kind == 'rate':
+                self.rate = payload
+            else:
+                await self.apply_update(payload)
+
+    def load_schedule(self, schedule: dict | None) -> DutySchedule:
+        """
+        Build the duty schedule of the stream.
+
+        Args:
+            schedule (Optional[dict]): The ``schedule`` configuration.
+
+        Returns:
+            DutySchedule: The schedule, or the default one if invalid.
+        """
+        try:
+            return DutySchedule.from_config(schedule)
+        except (KeyError, ValueError) as e:
+            self.logger.error(
+                f"Invalid schedule for {self.video_url}: {e}. "
+                'Using the default working hours.',
+            )
+            return DutySchedule()
+
+    def update_period(self, timestamp: float) -> Period:
+        """
+        Switch to the detection mode of the schedule at a time.
+
+        Args:
+            timestamp (float): The UNIX timestamp.
+
+        Returns:
+            Period: The current detection mode.
+        """
+        period = self.duty_schedule.period_at(timestamp)
+        if period != self.period:
+            self.logger.info(
+                f"Detection mode of {self.video_url}: {period['mode']}",
+            )
+            self.period = period
+        return period
+
+    def zone_detector(self, model_key: str) -> LiveStreamDetector:
+        """
+        Get the detector of a controlled-zone-only period.
+
+        Args:
+            model_key (str): The model of the period.
+
+        Returns:
+            LiveStreamDetector: The detector, created on first use.
+        """
+        if model_key == self.live_stream_detector.model_key:
+            return self.live_stream_detector
+        detector = self.zone_detectors.get(model_key)
+        if detector is None:
+            detector = LiveStreamDetector(
+                api_url=os.getenv('API_URL', 'http://localhost:5000'),
+                model_key=model_key,
+                output_folder=self.site,
+                detect_with_server=self.detect_with_server,
+                models=self.models,
+            )
+            self.zone_detectors[model_key] = detector
+        return detector
+
+    async def apply_update(self, config: AppConfig) -> None:
+        """
+        Apply the live-updatable fields of a changed configuration.
+
+        Args:
+            config (AppConfig): The changed configuration.
+        """
+        self.notifications = MainApp.get_notifications(config) or {}
+        self.last_notification_times = {
+            line_token: self.last_notification_times.get(
+                line_token, int(time.time()) - 300,
+            )
+            for line_token in self.notifications
+        }
+        if config.get('safety_rules') != self.safety_rules:
+            # Build the new detectors first so invalid rules keep the old
+            try:
+                danger_detector = DangerDetector(config.get('safety_rules'))
+                zone_danger_detector = DangerDetector(
+                    zone_only_rules(config.get('safety_rules')),
+                )
+            except (AttributeError, TypeError, ValueError) as e:
+                self.logger.error(
+                    f"Invalid safety rules for {self.video_url}: {e}. "
+                    'Keeping the current rules.',
+                )
+            else:
+                self.safety_rules = config.get('safety_rules')
+                self.danger_detector = danger_detector
+                self.zone_danger_detector = zone_danger_detector
+        if config.get('schedule') != self.schedule:
+            self.schedule = config.get('schedule')
+            self.duty_schedule = self.load_schedule(self.schedule)
+        if config.get('encoding') != self.encoding:
+            try:
+                frame_encoder = FrameEncoder(config.get('encoding'))
+            except (AttributeError, TypeError, ValueError) as e:
+                self.logger.error(
+                    f"Invalid encoding for {self.video_url}: {e}. "
+                    'Keeping the current encoding.',
+                )
+            else:
+                self.encoding = config.get('encoding')
+                self.frame_encoder.shutdown()
+                self.frame_encoder = frame_encoder
+        site = config.get('site')
+        stream_name = config.get('stream_name', 'prediction_visual')
+        if (site, stream_name) != (self.site, self.stream_name):
+            # Move the frames to the stream of the new name
+            if not is_windows:
+                await redis_manager.remove_stream(
+                    self.site, self.stream_name,
+                )
+            self.site, self.stream_name = site, stream_name
+            self.live_stream_detector.output_folder = site
+            for detector in self.zone_detectors.values():
+                detector.output_folder = site
+            self.last_publish_time = 0.0
+        self.logger.info(f"Configuration updated: {self.video_url}")
+
+    def drop(self, stage: str, job: FrameJob) -> None:
+        """
+        Record and release a frame dropped by a stage, stale or failed.
+
+        Args:
+            stage (str): The stage that dropped the frame.
+            job (FrameJob): The frame, as far as it was processed.
+        """
+        metrics.count(self.site, self.stream_name, 'dropped_frames', stage)
+        trace = job.get('trace')
+        if trace is not None:
+            trace.dropped = stage
+            self.tracer.finish(trace)
+        annotated_frame = job.get('annotated_frame')
+        if annotated_frame is not None:
+            annotated_frame.release()
+        self.streaming_capture.release_frame(job['frame'])
+
+    async def detect(self, job: FrameJob) -> FrameJob:
+        """
+        Detect objects in the frame.
+
+        Args:
+            job (FrameJob): The captured frame.
+
+        Returns:
+            FrameJob: The job with its detections.
+        """
+        period = job['period']
+        detector = (
+            self.zone_detector(period['model_key'])
+            if period['mode'] == 'zone_only'
+            else self.live_stream_detector
+        )
+        job['datas'], _ = await detector.generate_detections(job['frame'])
+        for stage, seconds in detector.timings.items():
+            self.observe(stage, seconds, job['trace'])
+        return job
+
+    async def evaluate(self, job: FrameJob) -> FrameJob:
+        """
+        Check the detections against the safety rules.
+
+        Args:
+            job (FrameJob): The frame with its detections.
+
+        Returns:
+            FrameJob: The job with its warnings and annotated frame.
+        """
+        danger_detector = (
+            self.zone_danger_detector
+            if job['period']['mode'] == 'zone_only'
+            else self.danger_detector
+        )
+        start = time.perf_counter()
+        job['warnings'], job['polygons'] = (
+            danger_detector.detect_danger(job['datas'])
+        )
+        self.observe(
+            'danger_analysis', time.perf_counter() - start, job['trace'],
+        )
+        self.logger.debug(f"Rule timings: {danger_detector.rule_timings}")
+
+        # Report the activity to the detection scheduler
+        send_report({
+            'type': 'activity',
+            'video_url': self.video_url,
+            'timestamp': job['timestamp'],
+            'people': sum(1 for data in job['datas'] if data[5] == PERSON),
+            'warnings': len(job['warnings']),
+        })
+
+        # Render and encode at most once per distinct language
+        job['annotated_frame'] = self.drawing_manager.annotate(
+            job['frame'], job['polygons'], job['datas'],
+        )
+        return job
+
+    async def notify(self, job: FrameJob) -> FrameJob:
+        """
+        Send the warnings of the frame to the LINE tokens.
+
+        Args:
+            job (FrameJob): The frame with its warnings.
+
+        Returns:
+            FrameJob: The job with the language of the last token.
+        """
+        timestamp = job['timestamp']
+        warnings = job['warnings']
+
+        # Convert UNIX timestamp to the time of the site
+        detection_time = self.duty_schedule.local_time(timestamp)
+        working_hours = self.duty_schedule.is_working_hours(timestamp)
+
+        # Check if there is a warning for people in the controlled zone
+        controlled_zone_warning_str = next(
+            # Find the first warning containing 'controlled area'
+            (
+                warning
+                for warning in warnings
+                if 'controlled area' in warning
+            ),
+            None,
+        )
+
+        # Convert the warning to a list for translation
+        controlled_zone_warning: list[str] = [
+            controlled_zone_warning_str,
+        ] if controlled_zone_warning_str else []
+
+        # Track the language of the last notification token
+        job['language'] = None
+
+        if not self.notifications:
+            self.logger.info('No notifications provided.')
+            return job
+
+        # Check if notifications are provided
+        for line_token, language in self.notifications.items():
+            # Remember the language for the displayed frame
+            job['language'] = language
+
+            # Check if notification should be skipped
+            # (sent within last 300 seconds)
+            last_time = self.last_notification_times[line_token]
+            if (timestamp - last_time) < 300:
+                continue
+
+            # Translate the warnings
+            translated_warnings = Translator.translate_warning(
+                warnings, language,
+            )
+
+            # If it is outside working hours and there is
+            # a warning for people in the controlled zone
+            if controlled_zone_warning and not working_hours:
+                translated_controlled_zone_warning: list[str] = (
+                    Translator.translate_warning(
+                        controlled_zone_warning, language,
+                    )
+                )
+                message = (
+                    f"{self.stream_name}\n[{detection_time}]\n"
+                    f"{translated_controlled_zone_warning}"
+                )
+
+            elif translated_warnings and working_hours:
+                # During working hours, combine all warnings
+                message = (
+                    f"{self.stream_name}\n[{detection_time}]\n"
+                    + '\n'.join(translated_warnings)
+                )
+
+            else:
+                message = None
+
+            # If a notification needs to be sent
+            if not message:
+                self.logger.info('No warnings or outside notification time.')
+                continue
+
+            image = await job['annotated_frame'].encode_for(
+                self.frame_encoder, 'notification', language,
+            )
+            start = time.perf_counter()
+            notification_status = self.line_notifier.send_notification(
+                message, image=image, line_token=line_token,
+            )
+            self.observe(
+                'notification_send', time.perf_counter() - start,
+                job['trace'],
+            )
+            metrics.count(
+                self.site, self.stream_name, 'notifications',
+                'sent' if notification_status == 200 else 'failed',
+            )
+
+            # To connect to the broadcast system, do it here:
+            # broadcast_status = (
+            #   broadcast_notifier.broadcast_message(message)
+            # )
+            # logger.info(f"Broadcast status: {broadcast_status}")
+
+            if notification_status == 200:
+                self.logger.info(f"Notification sent successfully: {message}")
+                self.last_notification_times[line_token] = int(timestamp)
+            else:
+                self.logger.error(f"Failed to send notification: {message}")
+
+            # Log the notification token and language
+            self.logger.info(
+                f"Notification sent to {line_token} in {language}.",
+            )
+
+        # Save the frame with detections
+        # save_file_name = f'{site}_{stream_name}_{detection_time}'
+        # drawing_manager.save_frame(
+        #   await annotated_frame.encode_for(
+        #       frame_encoder, 'archive', job['language'] or 'en',
+        #   ),
+        #   save_file_name
+        # )
+        return job
+
+    async def publish(self, job: FrameJob) -> None:
+        """
+        Store the frame in Redis for the web viewers, and log the frame.
+
+        Args:
+            job (FrameJob): The frame with its detections and warnings.
+        """
+        timestamp = job['timestamp']
+        language = job['language'] or 'en'
+
+        # Store the frame in Redis if not running on Windows, but only
+        # render and encode it when a web viewer will consume it
+        viewed = (
+            not is_windows and await redis_manager.has_viewers(self.key)
+        )
+        if not is_windows and (
+            viewed
+            or timestamp - self.last_publish_time
+            >= self.idle_publish_interval
+        ):
+            try:
+                annotated = self.frame_encoder.renders_overlay('live')
+                if self.thumbnail_retention and not viewed:
+                    annotated = True
+                    frame_bytes = await job['annotated_frame'].encode_for(
+                        self.frame_encoder, 'thumbnail', language,
+                    )
+                elif annotated:
+                    # Reuse the notification render and encode if any
+                    frame_bytes = await job['annotated_frame'].encode_for(
+                        self.frame_encoder, 'live', language,
+                    )
+                else:
+                    # Viewers draw the detections from the metadata
+                    start = time.perf_counter()
+                    frame_bytes = await self.frame_encoder.encode_async(
+                        job['frame'], 'live',
+                    )
+                    self.observe(
+                        'encoding', time.perf_counter() - start,
+                        job['trace'],
+                    )
+
+                # Store the frame and its detections in Redis Stream
+                # with a maximum length of about 10
+                start = time.perf_counter()
+                await redis_manager.publish_frame(
+                    {
+                        'stream_name': self.key,
+                        'site': self.site,
+                        'camera': self.stream_name,
+                        'frame': frame_bytes,
+                        'datas': job['datas'],
+                        'warnings': job['warnings'],
+                        'polygons': job['polygons'],
+                        'timestamp': timestamp,
+                        'annotated': annotated,
+                    },
+                    maxlen=10,
+                )
+                self.observe(
+                    'redis_publish', time.perf_counter() - start,
+                    job['trace'],
+                )
+                self.last_publish_time = timestamp
+            except Exception as e:
+                self.logger.error(f"Failed to store frame in Redis: {e}")
+
+        # Log the detection results
+        processing_time = time.time() - job['start_time']
+        self.logger.info(f"{self.site} - {self.stream_name}")
+        self.logger.info(
+            f"Detection time: {datetime.fromtimestamp(timestamp)}",
+        )
+        self.logger.info(f"Processing time: {processing_time:.2f} seconds")
+        self.logger.debug(f"Pipeline stages: {self.pipeline.stats()}")
+
+        # Drawing and encoding happen on demand in the notify and publish
+        # stages, so they are only complete now
+        for stage, seconds in job['annotated_frame'].timings.items():
+            if seconds:
+                self.observe(stage, seconds, job['trace'])
+        metrics.flush(send_report)
+        self.tracer.finish(job['trace'])
+
+        # Reuse the buffers of the frame and its drawn layers, which are
+        # no longer referenced
+        job['annotated_frame'].release()
+        self.streaming_capture.release_frame(job['frame'])
+        memory_policy.maybe_collect()
 
 
 class MainApp:
@@ -57,6 +782,15 @@ class MainApp:
     Main application class for managing multiple video streams.
     """
 
+    # Fields whose change requires restarting the stream, as the capture
+    # or the detection model must be recreated. Other changes are sent
+    # to the running stream and applied between frames.
+    RESTART_FIELDS: dict[str, object] = {
+        'video_url': '',
+        'model_key': 'yolo11n',
+        'detect_with_server': False,
+    }
+
     def __init__(self, config_file: str):
         """
         Initialise the MainApp class.
@@ -65,30 +799,44 @@ class MainApp:
             config_file (str): The path to the YAML configuration file.
         """
         self.config_file = config_file
-        self.running_processes: dict[str, dict] = {}
-        self.current_config_hashes: dict[str, str] = {}
+
+        # Streams run as coroutines in a fixed pool of worker processes,
+        # each pinned to its own CPUs with matching thread pools
+        workers = worker_count()
+        self.governor = CpuGovernor(workers)
+        self.pool = WorkerPool(
+            self.process_streams,
+            max_workers=workers,
+            cleanup=self.close_worker,
+            initializer=self.governor.apply,
+        )
+
+        # Models loaded by the streams of a worker, shared by model key
+        self.models: dict[str, object] = {}
+
+        # Shares the inference budget between the streams by activity
+        self.scheduler = DetectionScheduler()
+
+        # Latest stage metrics sent by each worker, by process ID
+        self.worker_metrics: dict[int, dict] = {}
         self.lock = anyio.Lock()
         self.logger = LoggerConfig().get_logger()
 
-    def compute_config_hash(self, config: dict) -> str:
+    def requires_restart(self, old: dict, new: dict) -> bool:
         """
-        Compute a hash based on relevant configuration parameters.
+        Check whether a configuration change requires a stream restart.
 
         Args:
-            config (dict): The configuration dictionary for a video stream.
+            old (dict): The configuration the stream runs with.
+            new (dict): The changed configuration.
 
         Returns:
-            str: A hash representing the configuration.
-        """
-        relevant_config = {
-            'video_url': config['video_url'],
-            'model_key': config['model_key'],
-            'site': config['site'],
-            'stream_name': config.get('stream_name', 'prediction_visual'),
-            'notifications': config['notifications'],
-            'detect_with_server': config['detect_with_server'],
-        }
-        return str(relevant_config)  # Convert to string for hashing
+            bool: True if a field of ``RESTART_FIELDS`` changed.
+        """
+        return any(
+            old.get(field, default) != new.get(field, default)
+            for field, default in self.RESTART_FIELDS.items()
+        )
 
     async def reload_configurations(self):
         """
@@ -102,89 +850,57 @@ class MainApp:
         }
 
         async with self.lock:
-            # Track keys that exist in the current config
-            current_keys = {
-                (
-                    f"{config['site']}_"
-                    f"{config.get('stream_name', 'prediction_visual')}"
-                )
-                for config in configurations
-            }
+            active_configs: dict[str, dict] = {}
+            for video_url, config in current_configs.items():
+                if Utils.is_expired(config.get('expire_date')):
+                    self.logger.info(
+                        f"Skip expired configuration: {video_url}",
+                    )
+                    continue
+                active_configs[video_url] = config
 
-            # Stop processes for removed or updated configurations
-            for video_url in list(self.running_processes.keys()):
-                config_data = self.running_processes[video_url]
-                config = current_configs.get(video_url)
+            diff = Utils.diff_configs(self.pool.configs, active_configs)
+            if not any(diff.values()):
+                self.logger.info('No stream configuration changed.')
+                return
 
-                # Get the key to be deleted
-                # if config has been removed or modified
-                site = config_data['config']['site']
-                stream_name = config_data['config'].get(
-                    'stream_name', 'prediction_visual',
-                )
-                key_to_delete = f"{site}_{stream_name}"
-
-                # Stop the process if the configuration is removed
-                if not config or Utils.is_expired(config.get('expire_date')):
-                    self.logger.info(f"Stop workflow: {video_url}")
-                    self.stop_process(config_data['process'])
-                    del self.running_processes[video_url]
-                    del self.current_config_hashes[video_url]
-
-                    # Delete old key in Redis
-                    # if it no longer exists in the config
-                    if key_to_delete not in current_keys:
-                        await redis_manager.delete(key_to_delete)
-                        self.logger.info(f"Deleted Redis key: {key_to_delete}")
-
-                # Restart the process if the configuration is updated
-                elif self.compute_config_hash(config) != (
-                    self.current_config_hashes.get(
-                        video_url,
-                    )
+            for video_url in diff['added']:
+                self.logger.info(f"Launch new workflow: {video_url}")
+
+            # Stop workflows whose configuration was removed or expired.
+            # Stopped streams delete their Redis stream as they exit.
+            for video_url in diff['removed']:
+                self.logger.info(f"Stop workflow: {video_url}")
+                self.scheduler.unregister(video_url)
+
+            for video_url in diff['added'] + diff['changed']:
+                limits = active_configs[video_url].get('detection_rate')
+                try:
+                    self.scheduler.register(video_url, limits)
+                except ValueError as e:
+                    self.logger.error(f"Invalid detection_rate: {e}")
+                    self.scheduler.register(video_url)
+
+            changed: list[str] = []
+            updated: list[str] = []
+            for video_url in diff['changed']:
+                if self.requires_restart(
+                    self.pool.configs[video_url], active_configs[video_url],
                 ):
                     self.logger.info(
                         f"Config changed for {video_url}. "
                         'Restarting workflow.',
                     )
-                    self.stop_process(config_data['process'])
-
-                    # Delete old key in Redis
-                    # if it no longer exists in the config
-                    if key_to_delete not in current_keys:
-                        await redis_manager.delete(key_to_delete)
-                        self.logger.info(f"Deleted Redis key: {key_to_delete}")
-
-                    # Start the new process
-                    self.running_processes[video_url] = {
-                        'process': self.start_process(config),
-                        'config': config,
-                    }
-                    self.current_config_hashes[video_url] = (
-                        self.compute_config_hash(
-                            config,
-                        )
-                    )
-
-            # Start processes for new configurations
-            for video_url, config in current_configs.items():
-                if Utils.is_expired(config.get('expire_date')):
+                    changed.append(video_url)
+                else:
                     self.logger.info(
-                        f"Skip expired configuration: {video_url}",
+                        f"Config changed for {video_url}. "
+                        'Updating workflow in place.',
                     )
-                    continue
+                    updated.append(video_url)
 
-                if video_url not in self.running_processes:
-                    self.logger.info(f"Launch new workflow: {video_url}")
-                    self.running_processes[video_url] = {
-                        'process': self.start_process(config),
-                        'config': config,
-                    }
-                    self.current_config_hashes[video_url] = (
-                        self.compute_config_hash(
-                            config,
-                        )
-                    )
+            # Assign the streams to the workers and rebalance them
+            self.pool.update(active_configs, changed, updated)
 
     async def run_multiple_streams(self) -> None:
         """
@@ -196,12 +912,21 @@ class MainApp:
         Returns:
             None
         """
+        for line in self.governor.describe():
+            self.logger.info(line)
+
+        # Serve the stage metrics of the workers to Prometheus
+        metrics_runner = await self.start_metrics_server()
+
         # Initial load of configurations
         await self.reload_configurations()
 
-        # Set up watchdog observer
+        # Set up watchdog observer. Events are debounced and reloads run
+        # on this event loop, only when the file content changed.
         event_handler = FileEventHandler(
-            self.config_file, self.reload_configurations,
+            self.config_file,
+            self.reload_configurations,
+            debounce=float(os.getenv('CONFIG_RELOAD_DEBOUNCE', 0.5)),
         )
         observer = Observer()
         observer.schedule(
@@ -211,13 +936,129 @@ class MainApp:
         )
         observer.start()
 
+        # Interval (in seconds) of the report of Redis memory per camera
+        report_interval = int(os.getenv('REDIS_MEMORY_REPORT_INTERVAL', 300))
+        last_report_time = time.time()
+
+        # Interval (in seconds) between detection rate allocations
+        schedule_interval = float(
+            os.getenv('DETECTION_SCHEDULE_INTERVAL', 5),
+        )
+        last_schedule_time = 0.0
+
         try:
             while True:
                 await anyio.sleep(1)
+                self.pool.respawn()
+                self.handle_reports()
+                if (
+                    self.scheduler.enabled
+                    and time.time() - last_schedule_time >= schedule_interval
+                ):
+                    self.pool.set_rates(self.scheduler.allocate())
+                    last_schedule_time = time.time()
+                if (
+                    not is_windows and report_interval
+                    and time.time() - last_report_time >= report_interval
+                ):
+                    await self.log_memory_report()
+                    last_report_time = time.time()
         except KeyboardInterrupt:
             observer.stop()
+        finally:
+            self.pool.shutdown()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
         observer.join()
 
+    def handle_reports(self) -> None:
+        """
+        Log the thread layout reported by the workers, and feed the
+        activity reported by the streams to the scheduler.
+        """
+        for report in self.pool.drain_reports():
+            if report['type'] == 'metrics':
+                self.worker_metrics[report['pid']] = report['snapshot']
+                continue
+            if report['type'] == 'layout':
+                self.logger.info(
+                    f"Worker {report['worker']} (pid {report['pid']}): "
+                    f"CPUs {report['cpus']}, torch {report['torch']}, "
+                    f"OpenCV {report['opencv']}, BLAS {report['blas']} "
+                    'threads',
+                )
+                continue
+            self.scheduler.report(
+                report['video_url'],
+                report['timestamp'],
+                report['people'],
+                report['warnings'],
+            )
+
+    def metrics_text(self) -> str:
+        """
+        Merge the stage metrics of the running workers.
+
+        Returns:
+            str: The metrics in the Prometheus text format.
+        """
+        alive = {process.pid for process, _ in self.pool.workers.values()}
+        for pid in set(self.worker_metrics) - alive:
+            del self.worker_metrics[pid]
+        return render(self.worker_metrics.values())
+
+    async def serve_metrics(self, request: web.Request) -> web.Response:
+        """
+        Handle a Prometheus scrape.
+
+        Args:
+            request (web.Request): The scrape request.
+
+        Returns:
+            web.Response: The stage metrics of the workers.
+        """
+        return web.Response(
+            body=self.metrics_text().encode('utf-8'),
+            headers={
+                'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+            },
+        )
+
+    async def start_metrics_server(self) -> web.AppRunner | None:
+        """
+        Serve the stage metrics on ``/metrics`` at METRICS_HOST and
+        METRICS_PORT.
+
+        Returns:
+            web.AppRunner | None: The server, or None if METRICS_PORT is 0.
+        """
+        port = int(os.getenv('METRICS_PORT', 9108))
+        if not port:
+            return None
+        host = os.getenv('METRICS_HOST', '127.0.0.1')
+        app = web.Application()
+        app.router.add_get('/metrics', self.serve_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self.logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return runner
+
+    async def log_memory_report(self) -> None:
+        """
+        Log the Redis memory used by the frame stream of each camera.
+        """
+        report = await redis_manager.memory_report()
+        if not report:
+            return
+        total = sum(report.values())
+        self.logger.info(
+            f"Redis frame streams: {total / 1024 / 1024:.1f} MiB "
+            f"over {len(report)} cameras",
+        )
+        for key, usage in report.items():
+            self.logger.info(f"Redis stream {key}: {usage / 1024:.0f} KiB")
+
     async def process_single_stream(
         self,
         logger: logging.Logger,
@@ -227,6 +1068,10 @@ class MainApp:
         stream_name: str = 'prediction_visual',
         notifications: dict[str, str] | None = None,
         detect_with_server: bool = False,
+        safety_rules: dict | None = None,
+        encoding: dict | None = None,
+        schedule: dict | None = None,
+        updates: asyncio.Queue | None = None,
     ) -> None:
         """
         Function to detect hazards, notify, log, save images (optional).
@@ -239,308 +1084,91 @@ class MainApp:
                 Defaults to 'demo_data/{site}/prediction_visual.png'.
             notifications (Optional[dict]): Line tokens with their languages.
             detect_with_server (bool): If run detection with server api or not.
+            safety_rules (Optional[dict]): Safety rules to override
+                or disable for this stream.
+            encoding (Optional[dict]): Output format and quality
+                per consumer of the annotated frames.
+            schedule (Optional[dict]): Working hours and detection mode
+                of each period of the day.
+            updates (Optional[asyncio.Queue]): Changed configurations of
+                the stream, applied between frames.
         """
-        # Initialise the stream capture object
-        streaming_capture = StreamCapture(stream_url=video_url)
-
-        # Get the API URL from environment variables
-        api_url = os.getenv('API_URL', 'http://localhost:5000')
-
-        # Initialise the live stream detector
-        live_stream_detector = LiveStreamDetector(
-            api_url=api_url,
+        workflow = StreamWorkflow(
+            logger,
+            video_url=video_url,
             model_key=model_key,
-            output_folder=site,
+            site=site,
+            stream_name=stream_name,
+            notifications=notifications,
             detect_with_server=detect_with_server,
+            safety_rules=safety_rules,
+            encoding=encoding,
+            models=self.models,
+            schedule=schedule,
         )
+        await workflow.run(updates)
 
-        # Initialise the drawing manager
-        drawing_manager = DrawingManager()
-
-        # Initialise the LINE notifier
-        line_notifier = LineNotifier()
-
-        # Initialise the DangerDetector
-        danger_detector = DangerDetector()
-
-        # Dictionary to store last notification time for each language
-        if notifications is None:
-            notifications = {}
-
-        last_notification_times = {
-            line_token: int(
-                time.time(),
-            ) - 300 for line_token in notifications
-        }
-
-        # Use the generator function to process detections
-        async for frame, timestamp in streaming_capture.execute_capture():
-            start_time = time.time()
-            # Convert UNIX timestamp to datetime object and format it as string
-            detection_time = datetime.fromtimestamp(timestamp)
-            current_hour = detection_time.hour
-
-            # Detect hazards in the frame
-            datas, _ = await live_stream_detector.generate_detections(frame)
-
-            # Check for warnings and send notifications if necessary
-            warnings, controlled_zone_polygon = danger_detector.detect_danger(
-                datas,
-            )
-
-            # Check if there is a warning for people in the controlled zone
-            controlled_zone_warning_str = next(
-                # Find the first warning containing 'controlled area'
-                (
-                    warning
-                    for warning in warnings
-                    if 'controlled area' in warning
-                ),
-                None,
-            )
-
-            # Convert the warning to a list for translation
-            controlled_zone_warning: list[str] = [
-                controlled_zone_warning_str,
-            ] if controlled_zone_warning_str else []
-
-            # Track whether we sent any notification
-            last_line_token = None
-            last_language = None
-            frame_with_detections = None
-
-            if not notifications:
-                logger.info('No notifications provided.')
-
-            else:
-                # Check if notifications are provided
-                for line_token, language in notifications.items():
-                    # Check if notification should be skipped
-                    # (sent within last 300 seconds)
-                    if (timestamp - last_notification_times[line_token]) < 300:
-                        # Store the last token and language,
-                        # but don't send notifications
-                        last_line_token = line_token
-                        last_language = language
-                        # Skip the current notification
-                        # but remember the last one
-                        continue
-
-                    # Translate the warnings
-                    translated_warnings = Translator.translate_warning(
-                        warnings, language,
-                    )
-
-                    # Draw the detections on the frame
-                    frame_with_detections = (
-                        drawing_manager.draw_detections_on_frame(
-                            frame, controlled_zone_polygon, datas,
-                            language=language,
-                        )
-                    )
-
-                    # Convert the frame to a byte array
-                    _, buffer = cv2.imencode('.png', frame_with_detections)
-                    frame_bytes = buffer.tobytes()
-
-                    # If it is outside working hours and there is
-                    # a warning for people in the controlled zone
-                    if (
-                        controlled_zone_warning
-                        and not (7 <= current_hour < 18)
-                    ):
-                        translated_controlled_zone_warning: list[str] = (
-                            Translator.translate_warning(
-                                controlled_zone_warning, language,
-                            )
-                        )
-                        message = (
-                            f"{stream_name}\n[{detection_time}]\n"
-                            f"{translated_controlled_zone_warning}"
-                        )
-
-                    elif translated_warnings and (7 <= current_hour < 18):
-                        # During working hours, combine all warnings
-                        message = (
-                            f"{stream_name}\n[{detection_time}]\n"
-                            + '\n'.join(translated_warnings)
-                        )
-
-                    else:
-                        message = None
-
-                    # If a notification needs to be sent
-                    if not message:
-                        logger.info(
-                            'No warnings or outside notification time.',
-                        )
-                        continue
-
-                    notification_status = line_notifier.send_notification(
-                        message,
-                        image=frame_bytes
-                        if frame_bytes is not None
-                        else None,
-                        line_token=line_token,
-                    )
-
-                    # To connect to the broadcast system, do it here:
-                    # broadcast_status = (
-                    #   broadcast_notifier.broadcast_message(message)
-                    # )
-                    # logger.info(f"Broadcast status: {broadcast_status}")
-
-                    if notification_status == 200:
-                        logger.info(
-                            f"Notification sent successfully: {message}",
-                        )
-                        last_notification_times[line_token] = int(timestamp)
-                    else:
-                        logger.error(f"Failed to send notification: {message}")
-
-                    # Log the notification token and language
-                    logger.info(
-                        f"Notification sent to {line_token} in {language}.",
-                    )
-
-                # If no notification was sent and the time condition was met,
-                # only draw the image
-                if last_line_token and last_language:
-                    language = last_language
-
-            # Draw the detections on the frame for the last token/language
-            # (if not already drawn)
-            if frame_with_detections is None:
-                frame_with_detections = (
-                    drawing_manager.draw_detections_on_frame(
-                        frame, controlled_zone_polygon,
-                        datas,
-                        language=last_language or 'en',
-                    )
-                )
-
-            # Convert the frame to a byte array
-            _, buffer = cv2.imencode('.png', frame_with_detections)
-            frame_bytes = buffer.tobytes()
-
-            # Save the frame with detections
-            # save_file_name = f'{site}_{stream_name}_{detection_time}'
-            # drawing_manager.save_frame(
-            #   frame_with_detections,
-            #   save_file_name
-            # )
-
-            # Store the frame in Redis if not running on Windows
-            if not is_windows:
-                try:
-                    # Use a unique key for each thread or process
-                    key = f"{site}_{stream_name}"
-
-                    # Store the frame in Redis Stream
-                    # with a maximum length of 10
-                    await redis_manager.add_to_stream(
-                        key, {'frame': frame_bytes}, maxlen=10,
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to store frame in Redis: {e}")
-
-            # Update the capture interval based on processing time
-            processing_time = time.time() - start_time
-            streaming_capture.update_capture_interval(int(processing_time) + 1)
-
-            # Log the detection results
-            logger.info(f"{site} - {stream_name}")
-            logger.info(f"Detection time: {detection_time}")
-            logger.info(f"Processing time: {processing_time:.2f} seconds")
-
-            # Clear variables to free up memory
-            del datas, frame, timestamp, detection_time
-            del frame_with_detections, buffer, frame_bytes
-            gc.collect()
-
-        # Release resources after processing
-        await streaming_capture.release_resources()
-        gc.collect()
-
-    async def process_streams(self, config: AppConfig) -> None:
+    async def process_streams(
+        self,
+        config: AppConfig,
+        updates: asyncio.Queue | None = None,
+    ) -> None:
         """
         Process a video stream based on the given configuration.
 
         Args:
             config (StreamConfig): The configuration for the stream processing.
+            updates (asyncio.Queue | None): Changed configurations of the
+                stream to apply without restarting it.
 
         Returns:
             None
         """
-        try:
-            # Check if 'notifications' field exists (new format)
-            if (
-                'notifications' in config and
-                config['notifications'] is not None
-            ):
-                notifications = config['notifications']
-            # Otherwise, handle the old format
-            elif 'line_token' in config and 'language' in config:
-                line_token = config.get('line_token')
-                language = config.get('language')
-                if line_token is not None and language is not None:
-                    notifications = {line_token: language}
-                else:
-                    notifications = None
-            else:
-                notifications = None
-
-            # Continue processing the remaining configuration
-            video_url = config.get('video_url', '')
-            model_key = config.get('model_key', 'yolo11n')
-            site = config.get('site')
-            stream_name = config.get('stream_name', 'prediction_visual')
-            detect_with_server = config.get('detect_with_server', False)
-
-            # Run hazard detection on a single video stream
-            await self.process_single_stream(
-                self.logger,
-                video_url=video_url,
-                model_key=model_key,
-                site=site,
-                stream_name=stream_name,
-                notifications=notifications,
-                detect_with_server=detect_with_server,
-            )
-        finally:
-            if not is_windows:
-                site = config.get('site')
-                stream_name = config.get('stream_name', 'prediction_visual')
-                key = f"{site}_{stream_name}"
-                await redis_manager.delete(key)
-                self.logger.info(f"Deleted Redis key: {key}")
+        # Run hazard detection on a single video stream
+        await self.process_single_stream(
+            self.logger,
+            video_url=config.get('video_url', ''),
+            model_key=config.get('model_key', 'yolo11n'),
+            site=config.get('site'),
+            stream_name=config.get('stream_name', 'prediction_visual'),
+            notifications=self.get_notifications(config),
+            detect_with_server=config.get('detect_with_server', False),
+            safety_rules=config.get('safety_rules'),
+            encoding=config.get('encoding'),
+            schedule=config.get('schedule'),
+            updates=updates,
+        )
 
-    def start_process(self, config: AppConfig) -> Process:
+    @staticmethod
+    def get_notifications(config: AppConfig) -> dict[str, str] | None:
         """
-        Start a new process for processing a video stream.
+        Get the LINE tokens and languages of a stream configuration.
 
         Args:
-            config (StreamConfig): The configuration for the stream processing.
+            config (AppConfig): The configuration of the stream.
 
         Returns:
-            Process: The newly started process.
+            dict[str, str] | None: The language of each LINE token.
         """
-        p = Process(target=lambda: asyncio.run(self.process_streams(config)))
-        p.start()
-        return p
-
-    def stop_process(self, process: Process) -> None:
+        # Check if 'notifications' field exists (new format)
+        if 'notifications' in config and config['notifications'] is not None:
+            return config['notifications']
+        # Otherwise, handle the old format
+        line_token = config.get('line_token')
+        language = config.get('language')
+        if line_token is not None and language is not None:
+            return {line_token: language}
+        return None
+
+    async def close_worker(self) -> None:
         """
-        Stop a running process.
-
-        Args:
-            process (Process): The process to be terminated.
-
-        Returns:
-            None
+        Release the resources of a worker once all its streams stopped.
         """
-        process.terminate()
-        process.join()
+        # Stop the encoder threads shared by the streams of the worker
+        shutdown_executor()
+        if not is_windows:
+            # Release this worker's Redis connections
+            await redis_manager.close()
 
 
 async def process_single_image(
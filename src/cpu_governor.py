@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import logging
+import os
+from typing import TypedDict
+
+import cv2
+import torch
+from threadpoolctl import threadpool_info
+from threadpoolctl import threadpool_limits
+
+# Read by OpenMP and the BLAS libraries when their thread pools start,
+# e.g. in libraries loaded after the worker was configured
+THREAD_ENV_VARS: tuple[str, ...] = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+)
+
+
+class ThreadLayout(TypedDict):
+    """
+    Typed dictionary of the effective CPUs and threads of a worker.
+    """
+    worker: int
+    pid: int
+    cpus: list[int]
+    torch: int
+    opencv: int
+    # Threads of each loaded BLAS or OpenMP library, by library name
+    blas: dict[str, int]
+
+
+def available_cpus() -> list[int]:
+    """
+    Get the CPUs this process may run on.
+
+    Returns:
+        list[int]: The CPU indices, e.g. restricted by a container.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cpus(cpus: list[int], workers: int) -> list[list[int]]:
+    """
+    Split CPUs into contiguous sets, one per worker.
+
+    Sets differ in size by at most one CPU. With more workers than CPUs,
+    workers share single CPUs in turn.
+
+    Args:
+        cpus (list[int]): The CPUs to split.
+        workers (int): The number of workers.
+
+    Returns:
+        list[list[int]]: The CPU set of each worker.
+    """
+    workers = max(1, workers)
+    if workers >= len(cpus):
+        return [[cpus[worker % len(cpus)]] for worker in range(workers)]
+    share, extra = divmod(len(cpus), workers)
+    sets = []
+    start = 0
+    for worker in range(workers):
+        size = share + (1 if worker < extra else 0)
+        sets.append(cpus[start:start + size])
+        start += size
+    return sets
+
+
+class CpuGovernor:
+    """
+    Pins each worker process to its own CPUs and sizes the thread pools
+    of PyTorch, OpenCV and BLAS to match, so workers do not each start
+    one thread per core of the machine.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        cpus: list[int] | None = None,
+        pin: bool | None = None,
+    ) -> None:
+        """
+        Initialise the governor.
+
+        Args:
+            workers (int): The number of worker processes.
+            cpus (list[int] | None): The CPUs to share. Defaults to those
+                available to this process.
+            pin (bool | None): Whether to set the CPU affinity of the
+                workers. Defaults to WORKER_CPU_AFFINITY, or True. Thread
+                pools are sized either way.
+        """
+        self.cpus = cpus if cpus is not None else available_cpus()
+        self.pin = (
+            pin if pin is not None
+            else os.getenv('WORKER_CPU_AFFINITY', '1') != '0'
+        )
+        self.cpu_sets = split_cpus(self.cpus, workers)
+
+    def apply(self, worker: int) -> ThreadLayout:
+        """
+        Restrict the calling worker process to the CPUs of its set.
+
+        Args:
+            worker (int): The index of the worker.
+
+        Returns:
+            ThreadLayout: The effective CPUs and thread counts.
+        """
+        cpus = self.cpu_sets[worker % len(self.cpu_sets)]
+        if self.pin and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError as e:
+                logging.warning(f"Failed to pin worker {worker}: {e}")
+        threads = len(cpus)
+
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(threads)
+        cv2.setNumThreads(threads)
+        threadpool_limits(limits=threads)
+
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(threads)
+        except RuntimeError:
+            # Only possible before the first parallel work started
+            pass
+
+        return {
+            'worker': worker,
+            'pid': os.getpid(),
+            'cpus': available_cpus(),
+            'torch': torch.get_num_threads(),
+            'opencv': cv2.getNumThreads(),
+            'blas': {
+                pool['prefix']: pool['num_threads']
+                for pool in threadpool_info()
+            },
+        }
+
+    def describe(self) -> list[str]:
+        """
+        Describe the planned CPU set of each worker.
+
+        Returns:
+            list[str]: One line per worker.
+        """
+        mode = 'pinned to' if self.pin else 'sized for'
+        return [
+            f"Worker {worker}: {len(cpus)} threads, {mode} CPUs {cpus}"
+            for worker, cpus in enumerate(self.cpu_sets)
+        ]
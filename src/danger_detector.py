@@ -1,10 +1,19 @@
 from __future__ import annotations
 
 import numpy as np
-from shapely.geometry import MultiPoint
-from shapely.geometry import Point
 from shapely.geometry import Polygon
-from sklearn.cluster import HDBSCAN
+
+from .safety_rules import compile_rules
+from .safety_rules import cone_clusterer
+from .safety_rules import cone_polygons
+from .safety_rules import count_people_inside
+from .safety_rules import driver_matrix
+from .safety_rules import evaluate_rules
+from .safety_rules import merge_rule_config
+from .safety_rules import pairwise_overlap
+from .safety_rules import proximity_matrix
+from .safety_rules import RuleContext
+from .safety_rules import SAFETY_CONE
 
 
 class DangerDetector:
@@ -12,12 +21,20 @@ class DangerDetector:
     A class to detect potential safety hazards based on the detection data.
     """
 
-    def __init__(self):
+    def __init__(self, safety_rules: dict | None = None):
         """
         Initialises the danger detector.
+
+        Args:
+            safety_rules (dict | None): Per-stream rule declarations that
+                override or disable the default safety rules.
         """
-        # Initialise the HDBSCAN clusterer
-        self.clusterer = HDBSCAN(min_samples=3, min_cluster_size=2)
+        # Compile the rules once so each frame only runs enabled rules
+        self.safety_rules = merge_rule_config(safety_rules)
+        self.rules = compile_rules(self.safety_rules)
+
+        # Evaluation time of each rule for the last frame, in seconds
+        self.rule_timings: dict[str, float] = {}
 
     def normalise_bbox(self, bbox):
         """
@@ -57,47 +74,18 @@ class DangerDetector:
         Detects polygons from the safety cones in the detection data.
 
         Args:
-            datas (List[List[float]]): The detection data.
+            datas (List[List[float]]): The normalised detection data.
 
         Returns:
             List[Polygon]: A list of polygons formed by the safety cones.
         """
-        if not datas:
-            return []
-
-        # Get positions of safety cones
-        cone_positions = np.array([
-            (
-                (float(data[0]) + float(data[2])) / 2,
-                (float(data[1]) + float(data[3])) / 2,
-            )
-            for data in datas if data[5] == 6
-        ])
-
-        # Check if there are at least three safety cones to form a polygon
-        if len(cone_positions) < 3:
-            return []
-
-        # Cluster the safety cones
-        labels = self.clusterer.fit_predict(cone_positions)
-
-        # Extract clusters
-        clusters: dict[int, list[np.ndarray]] = {}
-        for point, label in zip(cone_positions, labels):
-            if label == -1:
-                continue  # Skip noise points
-            if label not in clusters:
-                clusters[label] = []
-            clusters[label].append(point)
-
-        # Create polygons from clusters
-        polygons = []
-        for cluster_points in clusters.values():
-            if len(cluster_points) >= 3:
-                polygon = MultiPoint(cluster_points).convex_hull
-                polygons.append(polygon)
-
-        return polygons
+        params = self.safety_rules['controlled_area']
+        ctx = RuleContext.from_datas(datas)
+        return cone_polygons(
+            ctx.boxes[ctx.classes == SAFETY_CONE],
+            cone_clusterer(params),
+            params['min_cones'],
+        )
 
     def calculate_people_in_controlled_area(
         self,
@@ -109,35 +97,14 @@ class DangerDetector:
 
         Args:
             polygons (List[Polygon]): Polygons representing controlled areas.
-            datas (List[List[float]]): The detection data.
+            datas (List[List[float]]): The normalised detection data.
 
         Returns:
             int: The number of people within the controlled area.
         """
-        # Check if there are any detections
-        if not datas:
-            return 0
-
-        # Check if there are valid polygons
-        if not polygons:
-            return 0
-
-        # Use a set to track unique people
-        unique_people = set()
-
-        # Count the number of people within the controlled area
-        for data in datas:
-            if data[5] == 5:  # Check if it's a person
-                x_center = (data[0] + data[2]) / 2
-                y_center = (data[1] + data[3]) / 2
-                point = Point(x_center, y_center)
-                for polygon in polygons:
-                    if polygon.contains(point):
-                        # Update the set of unique people
-                        unique_people.add((x_center, y_center))
-                        break  # No need to check other polygons
-
-        return len(unique_people)
+        return count_people_inside(
+            RuleContext.from_datas(datas).persons, polygons,
+        )
 
     def detect_danger(
         self,
@@ -146,11 +113,14 @@ class DangerDetector:
         """
         Detects potential safety violations in a construction site.
 
-        This function checks for two types of safety violations:
+        This function checks for three types of safety violations:
         1. Workers entering the controlled area.
         2. Workers not wearing hardhats or safety vests.
         3. Workers dangerously close to machinery or vehicles.
 
+        Only the rules enabled in the configuration are evaluated,
+        and the time spent in each is stored in ``rule_timings``.
+
         Args:
             datas (List[List[float]]): A list of detections which includes
                 bounding box coordinates, confidence score, and class label.
@@ -158,66 +128,12 @@ class DangerDetector:
         Returns:
             Tuple[Set[str], List[Polygon]]: Warnings and polygons list.
         """
-        warnings = set()  # Initialise the list to store warning messages
-
         # Normalise data
         datas = self.normalise_data(datas)
 
-        # Check if people are entering the controlled area
-        polygons = self.detect_polygon_from_cones(datas)
-        people_count = self.calculate_people_in_controlled_area(
-            polygons, datas,
-        )
-        if people_count > 0:
-            warnings.add(
-                f"Warning: {people_count} people "
-                'have entered the controlled area!',
-            )
-
-        # Classify detected objects into different categories
-        persons = [d for d in datas if d[5] == 5]  # Persons
-        hardhat_violations = [d for d in datas if d[5] == 2]  # No hardhat
-        safety_vest_violations = [
-            d for d in datas if d[5] == 4
-        ]  # No safety vest
-        machinery_vehicles = [
-            d for d in datas if d[5]
-            in [8, 9]
-        ]  # Machinery and vehicles
-
-        # Filter out persons who are likely drivers
-        if machinery_vehicles:
-            non_drivers = [
-                p for p in persons if not any(
-                    self.is_driver(p[:4], mv[:4]) for mv in machinery_vehicles
-                )
-            ]
-            persons = non_drivers
-
-        # Check for hardhat and safety vest violations
-        for violation in hardhat_violations + safety_vest_violations:
-            label = 'NO-Hardhat' if violation[5] == 2 else 'NO-Safety Vest'
-            if not any(
-                self.overlap_percentage(violation[:4], p[:4]) > 0.5
-                for p in persons
-            ):
-                warning_msg = (
-                    'Warning: Someone is not wearing a hardhat!'
-                    if label == 'NO-Hardhat'
-                    else 'Warning: Someone is not wearing a safety vest!'
-                )
-                warnings.add(warning_msg)
-
-        # Check if anyone is dangerously close to machinery or vehicles
-        for person in persons:
-            for mv in machinery_vehicles:
-                label = 'machinery' if mv[5] == 8 else 'vehicle'
-                if self.is_dangerously_close(person[:4], mv[:4], label):
-                    warning_msg = f"Warning: Someone is too close to {label}!"
-                    warnings.add(warning_msg)
-                    break
-
-        return list(warnings), polygons
+        # Evaluate the enabled rules and record their timings
+        self.rule_timings = {}
+        return evaluate_rules(self.rules, datas, self.rule_timings)
 
     @staticmethod
     def is_driver(person_bbox: list[float], vehicle_bbox: list[float]) -> bool:
@@ -231,45 +147,12 @@ class DangerDetector:
         Returns:
             bool: True if the person is likely the driver, False otherwise.
         """
-        # Extract coordinates and dimensions of person and vehicle boxes
-        person_bottom_y = person_bbox[3]
-        person_top_y = person_bbox[1]
-        person_left_x = person_bbox[0]
-        person_right_x = person_bbox[2]
-        person_width = person_bbox[2] - person_bbox[0]
-        person_height = person_bbox[3] - person_bbox[1]
-
-        vehicle_top_y = vehicle_bbox[1]
-        vehicle_bottom_y = vehicle_bbox[3]
-        vehicle_left_x = vehicle_bbox[0]
-        vehicle_right_x = vehicle_bbox[2]
-        vehicle_height = vehicle_bbox[3] - vehicle_bbox[1]
-
-        # 1. Check vertical bottom position: person's bottom should be above
-        #    the vehicle's bottom by at least half the person's height
-        if not (
-            person_bottom_y < vehicle_bottom_y
-            and vehicle_bottom_y - person_bottom_y >= person_height / 2
-        ):
-            return False
-
-        # 2. Check horizontal position: person's edges should not extend
-        #    beyond half the width of the person from the vehicle's edges
-        if not (
-            person_left_x >= vehicle_left_x - person_width / 2
-            and person_right_x <= vehicle_right_x + person_width / 2
-        ):
-            return False
-
-        # 3. The person's top must be below the vehicle's top
-        if not (person_top_y > vehicle_top_y):
-            return False
-
-        # 4. Person's height is less than or equal to half the vehicle's height
-        if not (person_height <= vehicle_height / 2):
-            return False
-
-        return True
+        return bool(
+            driver_matrix(
+                np.array([person_bbox[:4]], dtype=np.float64),
+                np.array([vehicle_bbox[:4]], dtype=np.float64),
+            )[0, 0],
+        )
 
     @staticmethod
     def overlap_percentage(
@@ -286,30 +169,22 @@ class DangerDetector:
         Returns:
             float: The overlap percentage.
         """
-        # Calculate the coordinates of the intersection rectangle
-        x1 = max(bbox1[0], bbox2[0])
-        y1 = max(bbox1[1], bbox2[1])
-        x2 = min(bbox1[2], bbox2[2])
-        y2 = min(bbox1[3], bbox2[3])
-
-        # Calculate the area of the intersection rectangle
-        overlap_area = max(0, x2 - x1) * max(0, y2 - y1)
-
-        # Calculate the area of both bounding boxes
-        area1 = (bbox1[2] - bbox1[0]) * (bbox1[3] - bbox1[1])
-        area2 = (bbox2[2] - bbox2[0]) * (bbox2[3] - bbox2[1])
-
-        # Calculate the overlap percentage
-        return overlap_area / float(area1 + area2 - overlap_area)
+        return float(
+            pairwise_overlap(
+                np.array([bbox1[:4]], dtype=np.float64),
+                np.array([bbox2[:4]], dtype=np.float64),
+            )[0, 0],
+        )
 
-    @staticmethod
     def is_dangerously_close(
+        self,
         person_bbox: list[float],
         vehicle_bbox: list[float],
         label: str,
     ) -> bool:
         """
-        Determine if a person is dangerously close to machinery or vehicles.
+        Determine if a person is dangerously close to machinery or vehicles,
+        with the thresholds of the ``close_to_machinery`` rule.
 
         Args:
             person_bbox (list[float]): Bounding box of person.
@@ -319,38 +194,19 @@ class DangerDetector:
         Returns:
             bool: True if the person is dangerously close, False otherwise.
         """
-        # Calculate dimensions of the person bounding box
-        person_width = person_bbox[2] - person_bbox[0]
-        person_height = person_bbox[3] - person_bbox[1]
-        person_area = person_width * person_height
-
-        # Calculate the area of the vehicle bounding box
-        vehicle_area = (vehicle_bbox[2] - vehicle_bbox[0]) * \
-            (vehicle_bbox[3] - vehicle_bbox[1])
-        acceptable_ratio = 0.1 if label == 'vehicle' else 0.05
-
-        # Check if person area ratio is acceptable compared to vehicle area
-        if person_area / vehicle_area > acceptable_ratio:
-            return False
-
-        # Define danger distances
-        danger_distance_horizontal = 5 * person_width
-        danger_distance_vertical = 1.5 * person_height
-
-        # Calculate min horizontal/vertical distance between person and vehicle
-        horizontal_distance = min(
-            abs(person_bbox[2] - vehicle_bbox[0]),
-            abs(person_bbox[0] - vehicle_bbox[2]),
+        params = self.safety_rules['close_to_machinery']
+        ratio = (
+            params['vehicle_area_ratio'] if label == 'vehicle'
+            else params['machinery_area_ratio']
         )
-        vertical_distance = min(
-            abs(person_bbox[3] - vehicle_bbox[1]),
-            abs(person_bbox[1] - vehicle_bbox[3]),
-        )
-
-        # Determine if the person is dangerously close
-        return (
-            horizontal_distance <= danger_distance_horizontal
-            and vertical_distance <= danger_distance_vertical
+        return bool(
+            proximity_matrix(
+                np.array([person_bbox[:4]], dtype=np.float64),
+                np.array([vehicle_bbox[:4]], dtype=np.float64),
+                np.array([ratio]),
+                params['horizontal_factor'],
+                params['vertical_factor'],
+            )[0, 0],
         )
 
 
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from dataclasses import dataclass
+
+# Share of the free budget given to a camera, by its recent activity
+PRIORITY_WEIGHTS: dict[str, float] = {
+    'hazard': 4.0,
+    'people': 2.0,
+    'active': 1.0,
+    'idle': 0.0,
+}
+
+
+@dataclass
+class StreamActivity:
+    """
+    Rate limits and recent activity of one camera.
+    """
+    floor: float
+    ceiling: float
+    # When the camera was registered, and last saw people or a warning
+    registered: float
+    last_people: float = -math.inf
+    last_warning: float = -math.inf
+
+
+class DetectionScheduler:
+    """
+    Shares an inference budget, in frames per second, between cameras.
+
+    Every camera gets at least its floor rate. The rest of the budget
+    goes to the cameras with recent warnings first, then to those with
+    people, up to their ceiling rate. Cameras that have been empty for a
+    while are kept at their floor.
+    """
+
+    def __init__(
+        self,
+        budget: float | None = None,
+        floor: float | None = None,
+        ceiling: float | None = None,
+        hazard_hold: float = 300,
+        idle_after: float = 600,
+    ) -> None:
+        """
+        Initialise the scheduler.
+
+        Args:
+            budget (float | None): The frames per second shared by all
+                cameras. Defaults to DETECTION_BUDGET_FPS, or 0 to
+                disable scheduling.
+            floor (float | None): The default minimum rate of a camera.
+                Defaults to DETECTION_FLOOR_FPS, or 0.1.
+            ceiling (float | None): The default maximum rate of a camera.
+                Defaults to DETECTION_CEILING_FPS, or 1.
+            hazard_hold (float): Seconds a camera keeps its priority
+                after a warning or after people were last seen.
+            idle_after (float): Seconds without people after which a
+                camera is idle.
+        """
+        self.budget: float = (
+            budget if budget is not None
+            else float(os.getenv('DETECTION_BUDGET_FPS', 0))
+        )
+        self.floor: float = (
+            floor if floor is not None
+            else float(os.getenv('DETECTION_FLOOR_FPS', 0.1))
+        )
+        self.ceiling: float = (
+            ceiling if ceiling is not None
+            else float(os.getenv('DETECTION_CEILING_FPS', 1))
+        )
+        self.hazard_hold = hazard_hold
+        self.idle_after = idle_after
+        self.streams: dict[str, StreamActivity] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Check whether a budget is set.
+
+        Returns:
+            bool: False if cameras run at their own pace.
+        """
+        return self.budget > 0
+
+    def register(
+        self,
+        video_url: str,
+        limits: dict | None = None,
+        now: float | None = None,
+    ) -> None:
+        """
+        Add a camera, or change its rate limits.
+
+        Args:
+            video_url (str): The camera.
+            limits (dict | None): The ``floor`` and ``ceiling`` rates of
+                the camera, each defaulting to the scheduler's.
+            now (float | None): The current time. Defaults to time.time().
+
+        Raises:
+            ValueError: If the floor is above the ceiling.
+        """
+        limits = limits or {}
+        floor = float(limits.get('floor', self.floor))
+        ceiling = float(limits.get('ceiling', self.ceiling))
+        if floor > ceiling:
+            raise ValueError(
+                f"Detection floor {floor} is above the ceiling {ceiling} "
+                f"for {video_url}",
+            )
+        stream = self.streams.get(video_url)
+        if stream is None:
+            self.streams[video_url] = StreamActivity(
+                floor, ceiling, now if now is not None else time.time(),
+            )
+        else:
+            stream.floor, stream.ceiling = floor, ceiling
+
+    def unregister(self, video_url: str) -> None:
+        """
+        Remove a camera.
+
+        Args:
+            video_url (str): The camera.
+        """
+        self.streams.pop(video_url, None)
+
+    def report(
+        self,
+        video_url: str,
+        timestamp: float,
+        people: int,
+        warnings: int,
+    ) -> None:
+        """
+        Record the activity seen on a frame of a camera.
+
+        Args:
+            video_url (str): The camera.
+            timestamp (float): When the frame was captured.
+            people (int): The number of people detected.
+            warnings (int): The number of safety warnings.
+        """
+        stream = self.streams.get(video_url)
+        if stream is None:
+            return
+        if people:
+            stream.last_people = max(stream.last_people, timestamp)
+        if warnings:
+            stream.last_warning = max(stream.last_warning, timestamp)
+
+    def priority(self, stream: StreamActivity, now: float) -> str:
+        """
+        Classify the recent activity of a camera.
+
+        Args:
+            stream (StreamActivity): The camera.
+            now (float): The current time.
+
+        Returns:
+            str: A key of ``PRIORITY_WEIGHTS``.
+        """
+        if now - stream.last_warning < self.hazard_hold:
+            return 'hazard'
+        if now - stream.last_people < self.hazard_hold:
+            return 'people'
+        last_seen = max(stream.last_people, stream.registered)
+        if now - last_seen < self.idle_after:
+            return 'active'
+        return 'idle'
+
+    def allocate(self, now: float | None = None) -> dict[str, float]:
+        """
+        Share the budget between the cameras.
+
+        Floors are always granted, even beyond the budget. The rest is
+        shared by priority weight, and the share a camera cannot use
+        above its ceiling goes to the others.
+
+        Args:
+            now (float | None): The current time. Defaults to time.time().
+
+        Returns:
+            dict[str, float]: The frames per second of each camera.
+        """
+        now = now if now is not None else time.time()
+        rates = {url: stream.floor for url, stream in self.streams.items()}
+        remaining = self.budget - sum(rates.values())
+        weights = {
+            url: PRIORITY_WEIGHTS[self.priority(stream, now)]
+            for url, stream in self.streams.items()
+        }
+        hungry = {
+            url: weight for url, weight in weights.items()
+            if weight > 0 and rates[url] < self.streams[url].ceiling
+        }
+
+        while remaining > 1e-9 and hungry:
+            total = sum(hungry.values())
+            granted = 0.0
+            for url, weight in list(hungry.items()):
+                share = remaining * weight / total
+                room = self.streams[url].ceiling - rates[url]
+                grant = min(share, room)
+                rates[url] += grant
+                granted += grant
+                if room <= share:
+                    del hungry[url]
+            remaining -= granted
+        return rates
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import time
+from functools import lru_cache
 from pathlib import Path
 
 import cv2
@@ -9,9 +11,96 @@ from PIL import ImageDraw
 from PIL import ImageFont
 from shapely.geometry import Polygon
 
+from .frame_encoder import FrameEncoder
+from .frame_encoder import guess_extension
+from .frame_pool import FramePool
 from .lang_config import LANGUAGES
 
 
+class GlyphAtlas:
+    """
+    A cache of pre-rasterised glyph masks for a single font.
+
+    Text is composed from the cached masks with NumPy, so FreeType is
+    only involved the first time a character is seen.
+    """
+
+    def __init__(
+        self,
+        font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+        charset: str = '',
+    ) -> None:
+        """
+        Initialise the atlas and pre-render the given characters.
+
+        Args:
+            font (ImageFont.FreeTypeFont | ImageFont.ImageFont):
+                The font to rasterise glyphs with.
+            charset (str): Characters to pre-render.
+        """
+        self.font = font
+        self.glyphs: dict[str, tuple[np.ndarray, int, int, int]] = {}
+        for char in charset:
+            self.get_glyph(char)
+
+    def get_glyph(self, char: str) -> tuple[np.ndarray, int, int, int]:
+        """
+        Get the mask and metrics of a character, rendering it if needed.
+
+        Args:
+            char (str): The character to look up.
+
+        Returns:
+            tuple[np.ndarray, int, int, int]: The alpha mask, the x and y
+            offsets from the pen position and the horizontal advance.
+        """
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            left, top, right, bottom = self.font.getbbox(char)
+            mask = Image.new(
+                'L', (max(int(right - left), 1), max(int(bottom - top), 1)),
+            )
+            ImageDraw.Draw(mask).text(
+                (-left, -top), char, fill=255, font=self.font,
+            )
+            advance = int(round(self.font.getlength(char)))
+            glyph = (np.asarray(mask), int(left), int(top), advance)
+            self.glyphs[char] = glyph
+        return glyph
+
+    def render(self, text: str) -> np.ndarray:
+        """
+        Compose the alpha mask of a text string from cached glyphs.
+
+        Args:
+            text (str): The text to render.
+
+        Returns:
+            np.ndarray: A 2D uint8 alpha mask tightly enclosing the text.
+        """
+        placed = []
+        pen_x = 0
+        for char in text:
+            mask, left, top, advance = self.get_glyph(char)
+            placed.append((mask, pen_x + left, top))
+            pen_x += advance
+
+        if not placed:
+            return np.zeros((0, 0), dtype=np.uint8)
+
+        min_x = min(x for _, x, _ in placed)
+        min_y = min(y for _, _, y in placed)
+        max_x = max(x + mask.shape[1] for mask, x, _ in placed)
+        max_y = max(y + mask.shape[0] for mask, _, y in placed)
+
+        canvas = np.zeros((max_y - min_y, max_x - min_x), dtype=np.uint8)
+        for mask, x, y in placed:
+            h, w = mask.shape
+            region = canvas[y - min_y:y - min_y + h, x - min_x:x - min_x + w]
+            np.maximum(region, mask, out=region)
+        return canvas
+
+
 class DrawingManager:
     """
     A class for drawing detections on frames and saving them to disk.
@@ -20,56 +109,115 @@ class DrawingManager:
     # Class variable for caching default font
     default_font: ImageFont.FreeTypeFont | ImageFont.ImageFont | None = None
 
+    # Glyph atlases shared by all instances, keyed by font path and size
+    glyph_atlases: dict[tuple[str, int], GlyphAtlas] = {}
+
+    # Font size of the labels
+    font_size: int = 20
+
+    # BGR colours of the categories that are drawn
+    colours: dict[int, tuple[int, int, int]] = {
+        0: (0, 255, 0),      # Helmet
+        2: (0, 0, 255),      # No helmet
+        4: (0, 0, 255),      # No vest
+        5: (0, 165, 255),    # Person
+        7: (0, 255, 0),      # Vest
+        8: (0, 225, 255),    # Machinery
+        9: (0, 255, 255),    # Vehicle
+    }
+
+    # Language keys of the category labels, indexed by class ID
+    category_keys: dict[int, str] = {
+        0: 'helmet',
+        1: 'mask',
+        2: 'no_helmet',
+        3: 'no_mask',
+        4: 'no_vest',
+        5: 'person',
+        6: 'cone',
+        7: 'vest',
+        8: 'machinery',
+        9: 'vehicle',
+    }
+
+    # BGR fill and border colours and opacity of the controlled areas
+    polygon_fill: tuple[int, int, int] = (180, 105, 255)
+    polygon_border: tuple[int, int, int] = (255, 0, 255)
+    polygon_alpha: float = 128 / 255
+
     def __init__(self) -> None:
         """
         Initialise the DrawingManager class.
         """
-        # Font cache to avoid repeated loading
-        self.font_cache: dict[
-            str, ImageFont.FreeTypeFont |
-            ImageFont.ImageFont,
-        ] = {}
+        # Buffers of the drawn layers, returned by AnnotatedFrame.release
+        self.frame_pool = FramePool()
 
         # Load default font if not already loaded
         if DrawingManager.default_font is None:
             DrawingManager.default_font = ImageFont.load_default()
 
-    def get_font(
-        self, language: str,
-    ) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    @staticmethod
+    def get_font_path(language: str) -> str:
         """
-        Load the appropriate font based on the language input, with caching.
+        Get the font file able to render the given language.
 
         Args:
             language (str): The language to use for the font.
 
         Returns:
-            ImageFont.FreeTypeFont | ImageFont.ImageFont:
-            The loaded font object.
+            str: The path to the font file.
         """
-        # Select font path based on language
         if language == 'th':
-            font_path = 'assets/fonts/NotoSansThai-VariableFont_wdth.ttf'
-        else:
-            font_path = 'assets/fonts/NotoSansTC-VariableFont_wght.ttf'
-
-        # Check if the font is already in the cache
-        if font_path in self.font_cache:
-            return self.font_cache[font_path]
-
-        # Load and cache the font
-        try:
-            font = ImageFont.truetype(font_path, 20)
-        except OSError:
-            print(f"Error loading font from {font_path}. Using default font.")
-            if DrawingManager.default_font is None:
-                # Load default font only once
-                DrawingManager.default_font = ImageFont.load_default()
-            return DrawingManager.default_font
-
-        # Cache the font using the path as the key
-        self.font_cache[font_path] = font
-        return font
+            return 'assets/fonts/NotoSansThai-VariableFont_wdth.ttf'
+        return 'assets/fonts/NotoSansTC-VariableFont_wght.ttf'
+
+    @classmethod
+    def get_glyph_atlas(
+        cls,
+        language: str,
+        font_size: int | None = None,
+    ) -> GlyphAtlas:
+        """
+        Get the glyph atlas for a language, building it on first use.
+
+        The atlas is pre-rendered with every label of all the languages
+        sharing the same font, e.g. the Noto TC font for the CJK and
+        Latin languages and the Noto Thai font for Thai.
+
+        Args:
+            language (str): The language of the labels.
+            font_size (int | None): The font size, defaults to
+                ``font_size``.
+
+        Returns:
+            GlyphAtlas: The shared glyph atlas.
+        """
+        font_size = font_size or cls.font_size
+        font_path = cls.get_font_path(language)
+        key = (font_path, font_size)
+        atlas = cls.glyph_atlases.get(key)
+        if atlas is None:
+            try:
+                font = ImageFont.truetype(font_path, font_size)
+            except OSError:
+                print(
+                    f"Error loading font from {font_path}. "
+                    'Using default font.',
+                )
+                if cls.default_font is None:
+                    cls.default_font = ImageFont.load_default()
+                font = cls.default_font
+
+            charset = ''.join(sorted({
+                char
+                for lang, lang_config in LANGUAGES.items()
+                if cls.get_font_path(lang) == font_path
+                for category in cls.category_keys.values()
+                for char in lang_config[category]
+            }))
+            atlas = GlyphAtlas(font, charset)
+            cls.glyph_atlases[key] = atlas
+        return atlas
 
     def draw_polygons(
         self,
@@ -77,7 +225,10 @@ class DrawingManager:
         polygons: list[Polygon],
     ) -> np.ndarray:
         """
-        Draws polygons on the given frame.
+        Draws polygons on the given frame in place.
+
+        The semi-transparent fill is only blended inside the bounding
+        rectangle of each polygon rather than over the whole frame.
 
         Args:
             frame (np.ndarray): The frame on which to draw polygons.
@@ -86,40 +237,144 @@ class DrawingManager:
         Returns:
             np.ndarray: The frame with polygons drawn.
         """
-        # Convert frame to PIL image
-        frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-
-        # Create a transparent layer
-        overlay = Image.new('RGBA', frame_pil.size, (255, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
+        frame_height, frame_width = frame.shape[:2]
 
-        # Draw the polygons
         for polygon in polygons:
             # Get polygon points
-            points = polygon.exterior.coords if isinstance(
+            coords = polygon.exterior.coords if isinstance(
                 polygon, Polygon,
             ) else polygon.coords
-            points = [
-                tuple(point)
-                for point in points
-            ]  # Convert points to tuples
+            points = np.round(np.asarray(coords)).astype(np.int32)
+            if not len(points):
+                continue
 
-            # Draw the polygon or line
-            overlay_draw.polygon(points, fill=(255, 105, 180, 128))
+            # Blend the fill within the clipped bounding rectangle only
+            x, y, w, h = cv2.boundingRect(points)
+            x0, y0 = max(x, 0), max(y, 0)
+            x1 = min(x + w, frame_width)
+            y1 = min(y + h, frame_height)
+            if len(points) >= 3 and x1 > x0 and y1 > y0:
+                roi = frame[y0:y1, x0:x1]
+                overlay = roi.copy()
+                cv2.fillPoly(
+                    overlay, [points - (x0, y0)], self.polygon_fill,
+                )
+                cv2.addWeighted(
+                    overlay, self.polygon_alpha,
+                    roi, 1 - self.polygon_alpha,
+                    0, dst=roi,
+                )
 
             # Draw the polygon border
-            overlay_draw.line(
-                points + [points[0]],
-                fill=(255, 0, 255), width=2,
+            cv2.polylines(
+                frame, [points], isClosed=True,
+                color=self.polygon_border, thickness=2,
             )
 
-        # Composite the overlay with the original image
-        frame_pil = Image.alpha_composite(frame_pil.convert('RGBA'), overlay)
+        return frame
 
-        # Convert back to OpenCV image
-        frame = cv2.cvtColor(
-            np.array(frame_pil.convert('RGB')), cv2.COLOR_RGB2BGR,
-        )
+    def draw_label(
+        self,
+        frame: np.ndarray,
+        text: str,
+        x: int,
+        y: int,
+        colour: tuple[int, int, int],
+        language: str = 'en',
+    ) -> None:
+        """
+        Draws a label with a filled background above a point, in place.
+
+        The label is blitted from the process-wide sprite cache, so it is
+        only rasterised the first time it is drawn.
+
+        Args:
+            frame (np.ndarray): The frame on which to draw the label.
+            text (str): The label text.
+            x (int): The left edge of the label.
+            y (int): The bottom edge of the label.
+            colour (tuple[int, int, int]): The BGR background colour.
+            language (str): The language of the label.
+        """
+        patch = get_label_sprite(language, text, colour, self.font_size)
+        sprite_height, sprite_width = patch.shape[:2]
+        top = y - sprite_height
+
+        # Clip the sprite to the frame
+        frame_height, frame_width = frame.shape[:2]
+        x0, y0 = max(x, 0), max(top, 0)
+        x1 = min(x + sprite_width, frame_width)
+        y1 = min(y, frame_height)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        # Labels are opaque, so the sprite is a plain copy
+        frame[y0:y1, x0:x1] = patch[y0 - top:y1 - top, x0 - x:x1 - x]
+
+    def draw_base_layer(
+        self,
+        frame: np.ndarray,
+        polygons: list[Polygon],
+        datas: list[list[float]],
+    ) -> np.ndarray:
+        """
+        Draws the language-independent layer of polygons and boxes.
+
+        Args:
+            frame (np.ndarray): The frame on which to draw.
+            polygons (List[Polygon]): Polygons of the controlled areas.
+            datas (List[List[float]]): The detection data.
+
+        Returns:
+            np.ndarray: A copy of the frame with polygons and boxes drawn;
+            the input frame is left untouched.
+        """
+        # Draw on a copy so the caller's frame can be reused
+        frame = self.frame_pool.copy(frame)
+
+        # Draw polygons first
+        if polygons:
+            self.draw_polygons(frame, polygons)
+
+        # Draw the bounding boxes
+        for data in datas:
+            x1, y1, x2, y2, _, label_id = data[:6]
+            colour = self.colours.get(int(label_id))
+            if colour is None:
+                continue
+            x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
+            cv2.rectangle(frame, (x1, y1), (x2, y2), colour, 2)
+
+        return frame
+
+    def draw_labels(
+        self,
+        frame: np.ndarray,
+        datas: list[list[float]],
+        language: str = 'en',
+    ) -> np.ndarray:
+        """
+        Draws the localised labels of the detections in place.
+
+        Args:
+            frame (np.ndarray): The frame on which to draw the labels,
+                typically a copy of the base layer.
+            datas (List[List[float]]): The detection data.
+            language (str): The language to use for labels.
+
+        Returns:
+            np.ndarray: The frame with labels drawn.
+        """
+        # Load language configuration
+        lang_config = LANGUAGES.get(language, LANGUAGES['en'])
+
+        for data in datas:
+            x1, y1, _, _, _, label_id = data[:6]
+            colour = self.colours.get(int(label_id))
+            if colour is None:
+                continue
+            label = lang_config[self.category_keys[int(label_id)]]
+            self.draw_label(frame, label, int(x1), int(y1), colour, language)
 
         return frame
 
@@ -134,6 +389,9 @@ class DrawingManager:
         Draws detections on the given frame
         and supports dynamic language selection.
 
+        Everything is drawn with OpenCV directly on a single BGR copy of
+        the frame; the input frame is left untouched.
+
         Args:
             frame (np.ndarray): The frame on which to draw detections.
             datas (List[List[float]]): The detection data.
@@ -142,85 +400,35 @@ class DrawingManager:
         Returns:
             np.ndarray: The frame with detections drawn.
         """
-        # Load language configuration
-        lang_config = LANGUAGES.get(language, LANGUAGES['en'])
-
-        # Define category names based on language
-        category_id_to_name: dict[int, str] = {
-            0: lang_config['helmet'],
-            1: lang_config['mask'],
-            2: lang_config['no_helmet'],
-            3: lang_config['no_mask'],
-            4: lang_config['no_vest'],
-            5: lang_config['person'],
-            6: lang_config['cone'],
-            7: lang_config['vest'],
-            8: lang_config['machinery'],
-            9: lang_config['vehicle'],
-        }
-
-        # Define colours for each category
-        colours: dict[str, tuple[int, int, int]] = {
-            lang_config['helmet']: (0, 255, 0),
-            lang_config['vest']: (0, 255, 0),
-            lang_config['machinery']: (255, 225, 0),
-            lang_config['vehicle']: (255, 255, 0),
-            lang_config['no_helmet']: (255, 0, 0),
-            lang_config['no_vest']: (255, 0, 0),
-            lang_config['person']: (255, 165, 0),
-        }
-
-        # Load the font based on the input language
-        font = self.get_font(language)
-
-        # Draw polygons first
-        if polygons:
-            frame = self.draw_polygons(frame, polygons)
-
-        # Convert the frame to RGB and create a PIL image
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(frame_rgb)
-        draw = ImageDraw.Draw(pil_image)
-
-        # Draw the detections on the frame
-        for data in datas:
-            x1, y1, x2, y2, _, label_id = data
-            label_id = int(label_id)
-            if label_id in category_id_to_name:
-                label = category_id_to_name[label_id]
-            else:
-                continue
+        base = self.draw_base_layer(frame, polygons, datas)
+        return self.draw_labels(base, datas, language)
 
-            # Draw the bounding box
-            x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
-            if label in colours:
-                colour = colours.get(label, (255, 255, 255))
-                draw.rectangle((x1, y1, x2, y2), outline=colour, width=2)
-                text = f"{label}"
-                text_bbox = draw.textbbox((x1, y1), text, font=font)
-                text_width, text_height = text_bbox[2] - \
-                    text_bbox[0], text_bbox[3] - text_bbox[1]
-                text_background = (
-                    x1, y1 - text_height -
-                    5, x1 + text_width, y1,
-                )
-                draw.rectangle(text_background, fill=colour)
-                draw.text(
-                    (x1, y1 - text_height - 5), text,
-                    fill=(0, 0, 0), font=font,
-                )
+    def annotate(
+        self,
+        frame: np.ndarray,
+        polygons: list[Polygon],
+        datas: list[list[float]],
+    ) -> AnnotatedFrame:
+        """
+        Wraps a frame and its detections for memoised per-language output.
 
-        # Convert the PIL image back to OpenCV format
-        frame_with_detections = cv2.cvtColor(
-            np.array(pil_image), cv2.COLOR_RGB2BGR,
-        )
+        Args:
+            frame (np.ndarray): The original frame.
+            polygons (List[Polygon]): Polygons of the controlled areas.
+            datas (List[List[float]]): The detection data.
 
-        return frame_with_detections
+        Returns:
+            AnnotatedFrame: The annotated frame.
+        """
+        return AnnotatedFrame(self, frame, polygons, datas)
 
     def save_frame(self, frame_bytes: bytearray, output_filename: str) -> None:
         """
         Saves detected frame to given output folder and filename.
 
+        The file extension follows the format of the encoded frame, so an
+        encode made for another consumer can be saved as is.
+
         Args:
             frame_bytes (bytearray): The byte stream of the frame.
             output_filename (str): The output filename.
@@ -230,13 +438,202 @@ class DrawingManager:
         output_dir.mkdir(parents=True, exist_ok=True)
 
         # Define the output path
-        output_path = output_dir / f"{output_filename}.png"
+        extension = guess_extension(bytes(frame_bytes[:12]))
+        output_path = output_dir / f"{output_filename}{extension}"
 
         # Save the byte stream to the output path
         with open(output_path, 'wb') as f:
             f.write(frame_bytes)
 
 
+class AnnotatedFrame:
+    """
+    Renders and encodes one frame once per distinct language.
+
+    The language-independent base layer is drawn on first use and shared
+    by every language; each language then only adds its label sprites.
+    Renders and encodes are memoised for the lifetime of the object, which
+    is meant to be a single frame.
+    """
+
+    def __init__(
+        self,
+        drawing_manager: DrawingManager,
+        frame: np.ndarray,
+        polygons: list[Polygon],
+        datas: list[list[float]],
+    ) -> None:
+        """
+        Initialise the annotated frame.
+
+        Args:
+            drawing_manager (DrawingManager): The manager used to draw.
+            frame (np.ndarray): The original frame.
+            polygons (List[Polygon]): Polygons of the controlled areas.
+            datas (List[List[float]]): The detection data.
+        """
+        self.drawing_manager = drawing_manager
+        self.frame = frame
+        self.polygons = polygons
+        self.datas = datas
+        self._base: np.ndarray | None = None
+        self._renders: dict[str, np.ndarray] = {}
+        # Keyed by language, format and parameters, plus the maximum
+        # width for downscaled encodes
+        self._encodes: dict[tuple, bytes] = {}
+        # Total time spent drawing and encoding, in seconds
+        self.timings: dict[str, float] = {'drawing': 0.0, 'encoding': 0.0}
+
+    @property
+    def base(self) -> np.ndarray:
+        """
+        The polygons and boxes layer, drawn on first access.
+        """
+        if self._base is None:
+            start = time.perf_counter()
+            self._base = self.drawing_manager.draw_base_layer(
+                self.frame, self.polygons, self.datas,
+            )
+            self.timings['drawing'] += time.perf_counter() - start
+        return self._base
+
+    def render(self, language: str = 'en') -> np.ndarray:
+        """
+        Get the frame annotated with labels in the given language.
+
+        Args:
+            language (str): The language to use for labels.
+
+        Returns:
+            np.ndarray: The annotated frame; callers must not modify it.
+        """
+        rendered = self._renders.get(language)
+        if rendered is None:
+            base = self.base
+            start = time.perf_counter()
+            rendered = self.drawing_manager.draw_labels(
+                self.drawing_manager.frame_pool.copy(base), self.datas,
+                language,
+            )
+            self.timings['drawing'] += time.perf_counter() - start
+            self._renders[language] = rendered
+        return rendered
+
+    def encode(
+        self,
+        language: str = 'en',
+        ext: str = '.png',
+        params: tuple[int, ...] = (),
+    ) -> bytes:
+        """
+        Get the encoded annotated frame in the given language.
+
+        Args:
+            language (str): The language to use for labels.
+            ext (str): The image format extension passed to cv2.imencode.
+            params (tuple[int, ...]): The cv2.imencode parameters.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        key = (language, ext, tuple(params))
+        encoded = self._encodes.get(key)
+        if encoded is None:
+            rendered = self.render(language)
+            start = time.perf_counter()
+            encoded = FrameEncoder.imencode(rendered, ext, params)
+            self.timings['encoding'] += time.perf_counter() - start
+            self._encodes[key] = encoded
+        return encoded
+
+    async def encode_for(
+        self,
+        encoder: FrameEncoder,
+        consumer: str,
+        language: str = 'en',
+    ) -> bytes:
+        """
+        Get the annotated frame encoded for a consumer in the thread pool.
+
+        Consumers sharing the same format and quality reuse one encode.
+
+        Args:
+            encoder (FrameEncoder): The encoder holding the profiles.
+            consumer (str): The consumer, e.g. 'live' or 'notification'.
+            language (str): The language to use for labels.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        ext, params = encoder.get_params(consumer)
+        max_width = encoder.profiles[consumer].get('max_width')
+        key = (language, ext, params) if not max_width else (
+            language, ext, params, max_width,
+        )
+        encoded = self._encodes.get(key)
+        if encoded is None:
+            rendered = self.render(language)
+            start = time.perf_counter()
+            resized = encoder.resize(rendered, consumer)
+            encoded = await encoder.run(resized, ext, params)
+            encoder.release(resized, rendered)
+            self.timings['encoding'] += time.perf_counter() - start
+            self._encodes[key] = encoded
+        return encoded
+
+    def release(self) -> None:
+        """
+        Return the drawn layers to the pool of the drawing manager.
+
+        Rendered arrays must no longer be referenced; encoded bytes are
+        kept, so encodes remain available.
+        """
+        pool = self.drawing_manager.frame_pool
+        for rendered in self._renders.values():
+            pool.release(rendered)
+        self._renders.clear()
+        pool.release(self._base)
+        self._base = None
+
+
+@lru_cache(maxsize=512)
+def get_label_sprite(
+    language: str,
+    label: str,
+    colour: tuple[int, int, int],
+    font_size: int,
+) -> np.ndarray:
+    """
+    Get a pre-rendered label sprite, shared by the whole process.
+
+    The sprite is the label's opaque filled background with the text
+    blended on in black by its glyph coverage.
+
+    Args:
+        language (str): The language of the label, selecting the font.
+        label (str): The label text.
+        colour (tuple[int, int, int]): The BGR background colour.
+        font_size (int): The font size.
+
+    Returns:
+        np.ndarray: The read-only BGR patch of the sprite.
+    """
+    mask = DrawingManager.get_glyph_atlas(language, font_size).render(label)
+    text_height, text_width = mask.shape
+
+    # Background with 5 pixels of padding below the text
+    patch = np.empty((text_height + 5, text_width, 3), dtype=np.uint8)
+    patch[:] = colour
+    text = patch[:text_height]
+    text[:] = (
+        text.astype(np.uint16) * (255 - mask[..., None]) // 255
+    ).astype(np.uint8)
+
+    # The sprites are shared, so guard them against modification
+    patch.flags.writeable = False
+    return patch
+
+
 def main() -> None:
     """
     Main function to process and save the frame with detections.
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+from datetime import datetime
+from datetime import time as dtime
+from datetime import timedelta
+from typing import TypedDict
+from zoneinfo import ZoneInfo
+
+from .safety_rules import merge_rule_config
+
+# Detection modes of a period:
+# - full: detect at the stream's own pace with every safety rule
+# - reduced: detect at most ``rate`` frames per second
+# - zone_only: detect with ``model_key``, usually a smaller model, and
+#   only check the controlled area
+# - off: stop capturing and detecting until the period ends
+MODES: tuple[str, ...] = ('full', 'reduced', 'zone_only', 'off')
+
+WEEKDAYS: tuple[str, ...] = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Schedule of streams without one: the historical working hours, with
+# full detection around the clock
+DEFAULT_WORKING_HOURS = '07:00-18:00'
+
+# Rate of the reduced mode, in frames per second, if not configured
+DEFAULT_REDUCED_RATE = 0.1
+
+# Model of the controlled-zone-only mode, if not configured
+DEFAULT_ZONE_MODEL = 'yolo11n'
+
+# Safety rules kept in the controlled-zone-only mode
+ZONE_RULES: tuple[str, ...] = ('controlled_area', 'driver_exclusion')
+
+
+class Period(TypedDict, total=False):
+    """
+    Typed dictionary of the detection mode of a period.
+    """
+    mode: str
+    rate: float
+    model_key: str
+
+
+def parse_hours(hours: str) -> tuple[dtime, dtime]:
+    """
+    Parse a range of hours such as '18:00-07:00'.
+
+    Args:
+        hours (str): The start and end times, the end being exclusive.
+            Ranges may wrap past midnight, and equal times cover the
+            whole day.
+
+    Returns:
+        tuple[dtime, dtime]: The start and end times.
+
+    Raises:
+        ValueError: If the range is malformed.
+    """
+    try:
+        start, end = (
+            dtime.fromisoformat(part.strip()) for part in hours.split('-')
+        )
+    except ValueError as e:
+        raise ValueError(f"Invalid hours {hours!r}: use 'HH:MM-HH:MM'") from e
+    return start, end
+
+
+def zone_only_rules(safety_rules: dict | None) -> dict[str, dict]:
+    """
+    Restrict the safety rules of a stream to the controlled area.
+
+    Args:
+        safety_rules (dict | None): The rule declarations of the stream.
+
+    Returns:
+        dict[str, dict]: The rules, with those outside ``ZONE_RULES``
+        disabled.
+    """
+    rules = merge_rule_config(safety_rules)
+    for name, params in rules.items():
+        if name not in ZONE_RULES:
+            params['enabled'] = False
+    return rules
+
+
+class DutySchedule:
+    """
+    The working hours and the detection mode of each period of a site.
+
+    Times not covered by a period use the full mode.
+    """
+
+    def __init__(
+        self,
+        working_hours: str = DEFAULT_WORKING_HOURS,
+        periods: list[dict] | None = None,
+        timezone: str | None = None,
+    ) -> None:
+        """
+        Initialise the schedule.
+
+        Args:
+            working_hours (str): The working hours, e.g. '07:00-18:00'.
+                Outside of them, only controlled area warnings are sent.
+            periods (list[dict] | None): The periods, each with optional
+                ``hours`` (the whole day by default), a ``mode`` of
+                ``MODES``, optional ``days`` (e.g.
+                ``['sat', 'sun']``) and the ``rate`` or ``model_key`` of
+                its mode. The first matching period applies.
+            timezone (str | None): The IANA time zone of the site.
+                Defaults to the local time zone.
+
+        Raises:
+            ValueError: If a period is invalid.
+            ZoneInfoNotFoundError: If the time zone is unknown.
+        """
+        self.working_hours = parse_hours(working_hours)
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self.periods: list[tuple[tuple[dtime, dtime], set[int], Period]] = []
+        for period in periods or []:
+            mode = period.get('mode', 'full')
+            if mode not in MODES:
+                raise ValueError(f"Unsupported detection mode: {mode}")
+            days = period.get('days') or WEEKDAYS
+            unknown = set(days) - set(WEEKDAYS)
+            if unknown:
+                raise ValueError(f"Unknown days: {sorted(unknown)}")
+            detection: Period = {'mode': mode}
+            if mode == 'reduced':
+                detection['rate'] = float(
+                    period.get('rate', DEFAULT_REDUCED_RATE),
+                )
+                if detection['rate'] <= 0:
+                    raise ValueError('The reduced rate must be positive')
+            elif mode == 'zone_only':
+                detection['model_key'] = period.get(
+                    'model_key', DEFAULT_ZONE_MODEL,
+                )
+            self.periods.append((
+                parse_hours(period.get('hours', '00:00-00:00')),
+                {WEEKDAYS.index(day) for day in days},
+                detection,
+            ))
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> DutySchedule:
+        """
+        Build the schedule of a stream configuration.
+
+        Args:
+            config (dict | None): The ``schedule`` of the stream.
+
+        Returns:
+            DutySchedule: The schedule, the default one if not configured.
+        """
+        config = config or {}
+        return cls(
+            config.get('working_hours', DEFAULT_WORKING_HOURS),
+            config.get('periods'),
+            config.get('timezone'),
+        )
+
+    def local_time(self, timestamp: float) -> datetime:
+        """
+        Convert a UNIX timestamp to the time of the site.
+
+        Args:
+            timestamp (float): The UNIX timestamp.
+
+        Returns:
+            datetime: The time in the site's time zone.
+        """
+        return datetime.fromtimestamp(timestamp, self.timezone)
+
+    @staticmethod
+    def contains(
+        hours: tuple[dtime, dtime],
+        days: set[int],
+        moment: datetime,
+    ) -> bool:
+        """
+        Check whether a moment falls within a range of hours.
+
+        Args:
+            hours (tuple[dtime, dtime]): The start and end times.
+            days (set[int]): The weekdays the range starts on.
+            moment (datetime): The moment to check.
+
+        Returns:
+            bool: True if the moment is within the range.
+        """
+        start, end = hours
+        now = moment.time()
+        weekday = moment.weekday()
+        if start == end:
+            return weekday in days
+        if start < end:
+            return start <= now < end and weekday in days
+        # The range wraps past midnight: after midnight, it started the
+        # day before
+        if now >= start:
+            return weekday in days
+        return now < end and (weekday - 1) % 7 in days
+
+    def is_working_hours(self, timestamp: float) -> bool:
+        """
+        Check whether a frame was captured during working hours.
+
+        Args:
+            timestamp (float): The capture time of the frame.
+
+        Returns:
+            bool: True during working hours.
+        """
+        return self.contains(
+            self.working_hours, set(range(7)), self.local_time(timestamp),
+        )
+
+    def period_at(self, timestamp: float) -> Period:
+        """
+        Get the detection mode at a time.
+
+        Args:
+            timestamp (float): The UNIX timestamp.
+
+        Returns:
+            Period: The detection mode and its settings.
+        """
+        moment = self.local_time(timestamp)
+        for hours, days, period in self.periods:
+            if self.contains(hours, days, moment):
+                return period
+        return {'mode': 'full'}
+
+    def seconds_to_next_minute(self, timestamp: float) -> float:
+        """
+        Get the time until the schedule may change, as periods start on
+        whole minutes.
+
+        Args:
+            timestamp (float): The UNIX timestamp.
+
+        Returns:
+            float: Seconds until the next minute starts.
+        """
+        moment = self.local_time(timestamp)
+        next_minute = moment.replace(second=0, microsecond=0)
+        next_minute += timedelta(minutes=1)
+        return (next_minute - moment).total_seconds()
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .frame_pool import FramePool
+
+# Default encoding per consumer of annotated frames. JPEG/WebP keep the
+# live view and notifications small, PNG is kept for lossless archives.
+# The live view can skip rendering with ``overlay: client``, publishing
+# the raw frame for the browser to draw the detections on. Frames wider
+# than ``max_width`` are downscaled, e.g. for the Redis thumbnail tier.
+DEFAULT_ENCODING_PROFILES: dict[str, dict] = {
+    'live': {'format': 'jpeg', 'quality': 80, 'overlay': 'server'},
+    'notification': {'format': 'jpeg', 'quality': 90},
+    'archive': {'format': 'png', 'compression': 3},
+    'thumbnail': {'format': 'jpeg', 'quality': 70, 'max_width': 320},
+}
+
+# File extension and cv2 quality flag of each supported format
+FORMATS: dict[str, tuple[str, int]] = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION),
+}
+
+# Profile key and valid range of the quality setting of each format
+SETTINGS: dict[str, tuple[str, int, int]] = {
+    'jpeg': ('quality', 0, 100),
+    'webp': ('quality', 1, 100),
+    'png': ('compression', 0, 9),
+}
+
+# Where the detections are drawn: on the frame, or by the viewer
+OVERLAYS: tuple[str, ...] = ('server', 'client')
+
+# MIME types of the supported formats, keyed by file extension
+MIME_TYPES: dict[str, str] = {
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+    '.png': 'image/png',
+}
+
+
+# Encoder thread pool of this process, shared by every FrameEncoder, and
+# the PID it was created in, as forked workers need their own
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Get the encoder thread pool of this process, creating it on first use.
+
+    Returns:
+        ThreadPoolExecutor: The pool, with ENCODER_THREADS threads, or 2.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('ENCODER_THREADS', 2)),
+                thread_name_prefix='frame-encoder',
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """
+    Shut down the encoder thread pool of this process, if any; the next
+    encode creates a new one.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def guess_extension(image: bytes) -> str:
+    """
+    Guess the file extension of encoded image bytes from their signature.
+
+    Args:
+        image (bytes): The encoded image.
+
+    Returns:
+        str: '.png', '.jpg' or '.webp'; '.png' if the format is unknown.
+    """
+    if image[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if image[:4] == b'RIFF' and image[8:12] == b'WEBP':
+        return '.webp'
+    return '.png'
+
+
+class FrameEncoder:
+    """
+    Encodes frames for each consumer in the thread pool of the process,
+    shared by every encoder, so the streams of a worker use
+    ENCODER_THREADS encoder threads in total.
+
+    cv2.imencode releases the GIL, so encodes run in parallel with the
+    event loop and with each other.
+    """
+
+    def __init__(
+        self,
+        profiles: dict[str, dict] | None = None,
+    ) -> None:
+        """
+        Initialise the encoder.
+
+        Args:
+            profiles (dict[str, dict] | None): Overrides of the encoding
+                profile per consumer, e.g. ``{'live': {'format': 'webp'}}``.
+                An override setting ``format`` replaces the whole default
+                profile; others are merged into it.
+
+        Raises:
+            ValueError: If a profile uses an unsupported format or overlay,
+                or a quality setting out of the range of its format.
+        """
+        self.profiles: dict[str, dict] = {
+            consumer: dict(profile)
+            for consumer, profile in DEFAULT_ENCODING_PROFILES.items()
+        }
+        for consumer, profile in (profiles or {}).items():
+            # The settings of another format do not carry over
+            if 'format' in profile:
+                self.profiles[consumer] = dict(profile)
+            else:
+                self.profiles.setdefault(consumer, {}).update(profile)
+
+        for consumer, profile in self.profiles.items():
+            if profile.get('format') not in FORMATS:
+                raise ValueError(
+                    f"Unsupported format for {consumer}: "
+                    f"{profile.get('format')}",
+                )
+            key, low, high = SETTINGS[profile['format']]
+            value = profile.get(key)
+            if value is not None and not low <= int(value) <= high:
+                raise ValueError(
+                    f"{key} of {consumer} must be from {low} to {high} for "
+                    f"{profile['format']}: {value}",
+                )
+            if profile.get('overlay', 'server') not in OVERLAYS:
+                raise ValueError(
+                    f"Unsupported overlay for {consumer}: "
+                    f"{profile.get('overlay')}",
+                )
+
+        # Buffers of downscaled frames, released once encoded
+        self.frame_pool = FramePool()
+
+    def get_params(self, consumer: str) -> tuple[str, tuple[int, ...]]:
+        """
+        Get the cv2.imencode arguments of a consumer.
+
+        Args:
+            consumer (str): The consumer, e.g. 'live' or 'notification'.
+
+        Returns:
+            tuple[str, tuple[int, ...]]: The file extension and the
+            encoding parameters.
+        """
+        profile = self.profiles[consumer]
+        ext, flag = FORMATS[profile['format']]
+        # Only the setting of the format, e.g. not a quality for PNG
+        value = profile.get(SETTINGS[profile['format']][0])
+        return ext, (flag, int(value)) if value is not None else ()
+
+    def renders_overlay(self, consumer: str) -> bool:
+        """
+        Check whether a consumer gets frames with the detections drawn on.
+
+        Args:
+            consumer (str): The consumer, e.g. 'live'.
+
+        Returns:
+            bool: False if the consumer draws the detections itself.
+        """
+        return self.profiles[consumer].get('overlay', 'server') == 'server'
+
+    def resize(self, frame: np.ndarray, consumer: str) -> np.ndarray:
+        """
+        Downscale a frame to the maximum width of a consumer, if any.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            consumer (str): The consumer of the frame.
+
+        Returns:
+            np.ndarray: The frame, downscaled into a pooled array if it was
+            too wide; pass it to ``release`` once encoded.
+        """
+        max_width = self.profiles[consumer].get('max_width')
+        height, width = frame.shape[:2]
+        if not max_width or width <= max_width:
+            return frame
+        size = (int(max_width), max(1, round(height * max_width / width)))
+        resized = self.frame_pool.acquire(
+            (size[1], size[0], *frame.shape[2:]), frame.dtype,
+        )
+        return cv2.resize(
+            frame, size, dst=resized, interpolation=cv2.INTER_AREA,
+        )
+
+    def release(self, resized: np.ndarray, frame: np.ndarray) -> None:
+        """
+        Return a frame downscaled by ``resize`` to the pool.
+
+        Args:
+            resized (np.ndarray): The result of ``resize``.
+            frame (np.ndarray): The frame passed to ``resize``, which is
+                left alone.
+        """
+        if resized is not frame:
+            self.frame_pool.release(resized)
+
+    def encode(self, frame: np.ndarray, consumer: str) -> bytes:
+        """
+        Encode a frame for a consumer in the calling thread.
+
+        Args:
+            frame (np.ndarray): The BGR frame to encode.
+            consumer (str): The consumer of the encoded frame.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        ext, params = self.get_params(consumer)
+        resized = self.resize(frame, consumer)
+        encoded = self.imencode(resized, ext, params)
+        self.release(resized, frame)
+        return encoded
+
+    async def encode_async(self, frame: np.ndarray, consumer: str) -> bytes:
+        """
+        Encode a frame for a consumer in the thread pool.
+
+        Args:
+            frame (np.ndarray): The BGR frame to encode.
+            consumer (str): The consumer of the encoded frame.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        ext, params = self.get_params(consumer)
+        resized = self.resize(frame, consumer)
+        # Not released on failure, as a cancelled encode may still be
+        # reading it in the thread pool
+        encoded = await self.run(resized, ext, params)
+        self.release(resized, frame)
+        return encoded
+
+    async def run(
+        self,
+        frame: np.ndarray,
+        ext: str,
+        params: tuple[int, ...] = (),
+    ) -> bytes:
+        """
+        Run cv2.imencode in the thread pool.
+
+        Args:
+            frame (np.ndarray): The BGR frame to encode.
+            ext (str): The file extension selecting the format.
+            params (tuple[int, ...]): The encoding parameters.
+
+        Returns:
+            bytes: The encoded image.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), self.imencode, frame, ext, params,
+        )
+
+    @staticmethod
+    def imencode(
+        frame: np.ndarray,
+        ext: str,
+        params: tuple[int, ...] = (),
+    ) -> bytes:
+        """
+        Encode a frame with OpenCV.
+
+        Args:
+            frame (np.ndarray): The BGR frame to encode.
+            ext (str): The file extension selecting the format.
+            params (tuple[int, ...]): The encoding parameters.
+
+        Returns:
+            bytes: The encoded image.
+
+        Raises:
+            ValueError: If OpenCV fails to encode the frame.
+        """
+        success, buffer = cv2.imencode(ext, frame, list(params))
+        if not success:
+            raise ValueError(f"Failed to encode frame as {ext}")
+        return buffer.tobytes()
+
+    def shutdown(self) -> None:
+        """
+        Release the encoder. The shared thread pool is kept for the other
+        encoders of the process; see ``shutdown_executor``.
+        """
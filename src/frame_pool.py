@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import time
+from collections.abc import Callable
+
+import cv2
+import numpy as np
+
+
+class FramePool:
+    """
+    Reuses NumPy arrays of the same shape and type, such as frames,
+    instead of allocating megabytes per frame.
+
+    Arrays must only be released once nothing references them anymore,
+    as they are handed out again as is.
+    """
+
+    def __init__(self, max_per_shape: int = 4) -> None:
+        """
+        Initialise an empty pool.
+
+        Args:
+            max_per_shape (int): The free arrays kept per shape and type.
+        """
+        self.max_per_shape = max_per_shape
+        self.free: dict[tuple, list[np.ndarray]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(
+        self,
+        shape: tuple[int, ...],
+        dtype: np.dtype | type = np.uint8,
+    ) -> np.ndarray:
+        """
+        Get an array, with undefined content.
+
+        Args:
+            shape (tuple[int, ...]): The shape of the array.
+            dtype (np.dtype | type): The type of the array.
+
+        Returns:
+            np.ndarray: A released array, or a new one.
+        """
+        free = self.free.get((tuple(shape), np.dtype(dtype)))
+        if free:
+            self.hits += 1
+            return free.pop()
+        self.misses += 1
+        return np.empty(shape, dtype)
+
+    def copy(self, array: np.ndarray) -> np.ndarray:
+        """
+        Copy an array into a pooled one.
+
+        Args:
+            array (np.ndarray): The array to copy.
+
+        Returns:
+            np.ndarray: The copy.
+        """
+        copy = self.acquire(array.shape, array.dtype)
+        np.copyto(copy, array)
+        return copy
+
+    def release(self, array: np.ndarray | None) -> None:
+        """
+        Return an array for reuse.
+
+        Views and non-contiguous arrays are ignored, as their memory
+        belongs to another array.
+
+        Args:
+            array (np.ndarray | None): The array, no longer used.
+        """
+        if (
+            not isinstance(array, np.ndarray)
+            or array.base is not None
+            or not array.flags.c_contiguous
+        ):
+            return
+        free = self.free.setdefault((array.shape, array.dtype), [])
+        if len(free) < self.max_per_shape and all(
+            item is not array for item in free
+        ):
+            free.append(array)
+
+
+def resident_memory() -> int | None:
+    """
+    Get the resident set size of this process.
+
+    Returns:
+        int | None: The RSS in bytes, or None where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+class MemoryPolicy:
+    """
+    Runs a full garbage collection only under memory pressure, instead
+    of after every frame.
+
+    Reference counting frees frames as soon as they are dropped; only
+    reference cycles need the collector, which also runs on its own.
+    """
+
+    def __init__(
+        self,
+        threshold_mb: float | None = None,
+        check_interval: float = 1.0,
+        min_interval: float = 10.0,
+    ) -> None:
+        """
+        Initialise the policy.
+
+        Args:
+            threshold_mb (float | None): The RSS above which to collect.
+                Defaults to GC_RSS_THRESHOLD_MB, or 0 to never force a
+                collection.
+            check_interval (float): Seconds between RSS checks.
+            min_interval (float): Seconds between forced collections, as
+                the RSS may remain above the threshold.
+        """
+        self.threshold = (
+            threshold_mb if threshold_mb is not None
+            else float(os.getenv('GC_RSS_THRESHOLD_MB', 0))
+        ) * 1024 * 1024
+        self.check_interval = check_interval
+        self.min_interval = min_interval
+        self.last_check = -float('inf')
+        self.last_collect = -float('inf')
+
+    def maybe_collect(self) -> bool:
+        """
+        Collect garbage if the RSS is above the threshold.
+
+        Returns:
+            bool: True if a collection ran.
+        """
+        if self.threshold <= 0:
+            return False
+        now = time.monotonic()
+        if (
+            now - self.last_check < self.check_interval
+            or now - self.last_collect < self.min_interval
+        ):
+            return False
+        self.last_check = now
+        rss = resident_memory()
+        if rss is None or rss < self.threshold:
+            return False
+        self.last_collect = now
+        collected = gc.collect()
+        logging.info(
+            f"RSS {rss / 1024 / 1024:.0f} MiB over the threshold: "
+            f"collected {collected} objects",
+        )
+        return True
+
+
+def frame_latencies(
+    process: Callable[[np.ndarray], None],
+    source: np.ndarray,
+    frames: int,
+) -> list[float]:
+    """
+    Time the memory handling of each frame.
+
+    Args:
+        process (Callable[[np.ndarray], None]): Handles one frame.
+        source (np.ndarray): The frame decoded each time.
+        frames (int): The number of frames.
+
+    Returns:
+        list[float]: The seconds taken by each frame.
+    """
+    latencies = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        process(source)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> None:
+    """
+    Compare the per-frame latency of the buffer handling of a stream:
+    new arrays and a full collection per frame and per compared pair of
+    detections (the former behaviour), against pooled arrays collected
+    only under memory pressure.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument(
+        '--pairs',
+        type=int,
+        default=10,
+        help='Pairs of detections compared by the overlap filter',
+    )
+    parser.add_argument(
+        '--heap-objects',
+        type=int,
+        default=1_000_000,
+        help='Live objects tracked by the collector, as with a model',
+    )
+    args = parser.parse_args()
+
+    # Stands for the objects of the model and libraries, traversed by
+    # every full collection
+    heap = [{'index': i} for i in range(args.heap_objects)]
+    source = np.random.default_rng(0).integers(
+        0, 255, (args.height, args.width, 3), dtype=np.uint8,
+    )
+    thumbnail = (320, max(1, round(args.height * 320 / args.width)))
+    collections = 3 + args.pairs
+
+    def allocating(frame: np.ndarray) -> None:
+        decoded = frame.copy()
+        base = decoded.copy()
+        rendered = base.copy()
+        cv2.resize(rendered, thumbnail, interpolation=cv2.INTER_AREA)
+        # Capture, overlap filter, each pair and publish
+        for _ in range(collections):
+            gc.collect()
+
+    pool = FramePool()
+    policy = MemoryPolicy()
+
+    def pooled(frame: np.ndarray) -> None:
+        decoded = pool.copy(frame)
+        base = pool.copy(decoded)
+        rendered = pool.copy(base)
+        resized = pool.acquire((thumbnail[1], thumbnail[0], 3))
+        cv2.resize(
+            rendered, thumbnail, dst=resized, interpolation=cv2.INTER_AREA,
+        )
+        for array in (resized, rendered, base, decoded):
+            pool.release(array)
+        policy.maybe_collect()
+
+    results = {
+        'new arrays, gc per frame': frame_latencies(
+            allocating, source, args.frames,
+        ),
+        'pooled, gc under pressure': frame_latencies(
+            pooled, source, args.frames,
+        ),
+    }
+    del heap
+
+    print(
+        f"{args.frames} frames, {args.width}x{args.height}, "
+        f"{collections} collections per former frame, "
+        f"{args.heap_objects} heap objects",
+    )
+    print(f"{'mode':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, latencies in results.items():
+        milliseconds = np.array(latencies) * 1000
+        p50, p95 = np.percentile(milliseconds, (50, 95))
+        print(
+            f"{name:<28}{milliseconds.mean():>10.2f}"
+            f"{p50:>10.2f}{p95:>10.2f}",
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+
+
+@dataclass
+class FrameTrace:
+    """
+    The spans of one frame through the stages of a stream.
+
+    Span offsets are relative to when the frame entered the pipeline, so
+    the capture wait and decode spans, which precede it, are negative.
+    """
+    site: str | None
+    stream: str
+    # Capture time of the frame, as a UNIX timestamp
+    timestamp: float
+    # Monotonic time the frame entered the pipeline
+    start: float = field(default_factory=time.monotonic)
+    # Name, start offset and duration of each span, in seconds
+    spans: list[tuple[str, float, float]] = field(default_factory=list)
+    # The stage that dropped the frame, if it did not reach the end
+    dropped: str | None = None
+
+    def add(
+        self,
+        name: str,
+        seconds: float,
+        end: float | None = None,
+    ) -> None:
+        """
+        Add a span.
+
+        Args:
+            name (str): The stage of the span.
+            seconds (float): The duration of the span.
+            end (float | None): The offset the span ended at. Defaults
+                to now.
+        """
+        if end is None:
+            end = time.monotonic() - self.start
+        self.spans.append((name, end - seconds, seconds))
+
+    def record(self, total: float) -> dict:
+        """
+        Get the compact record written to the trace file.
+
+        Args:
+            total (float): Seconds from entering the pipeline to the end.
+
+        Returns:
+            dict: The record.
+        """
+        record = {
+            'site': self.site,
+            'stream': self.stream,
+            'ts': round(self.timestamp, 3),
+            'total': round(total, 6),
+            'spans': [
+                [name, round(offset, 6), round(seconds, 6)]
+                for name, offset, seconds in self.spans
+            ],
+        }
+        if self.dropped is not None:
+            record['dropped'] = self.dropped
+        return record
+
+
+class TraceRecorder:
+    """
+    Writes a sample of the frame traces of a worker to a JSONL file.
+
+    Frames are traced in memory and only written when sampled or slower
+    than the slow threshold, so rare slow frames are always kept. Kept
+    records are buffered and appended in batches to a file held open, so
+    the event loop of the worker is not stalled by a file write per
+    frame.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float | None = None,
+        slow_seconds: float | None = None,
+        directory: str | None = None,
+        rng: Callable[[], float] = random.random,
+        batch_size: int = 64,
+        flush_interval: float = 5.0,
+    ) -> None:
+        """
+        Initialise the recorder.
+
+        Args:
+            sample_rate (float | None): The share of frames written.
+                Defaults to TRACE_SAMPLE_RATE, or 0.
+            slow_seconds (float | None): Frames slower than this are
+                always written. Defaults to TRACE_SLOW_SECONDS, or 0 to
+                disable.
+            directory (str | None): The folder of the trace files.
+                Defaults to TRACE_DIR, or 'logs/traces'.
+            rng (Callable[[], float]): Draws the samples.
+            batch_size (int): The buffered records that trigger a write.
+            flush_interval (float): Seconds after which buffered records
+                are written even if the batch is not full.
+        """
+        self.sample_rate = (
+            sample_rate if sample_rate is not None
+            else float(os.getenv('TRACE_SAMPLE_RATE', 0))
+        )
+        self.slow_seconds = (
+            slow_seconds if slow_seconds is not None
+            else float(os.getenv('TRACE_SLOW_SECONDS', 0))
+        )
+        self.directory = Path(
+            directory or os.getenv('TRACE_DIR', 'logs/traces'),
+        )
+        self.rng = rng
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer: list[str] = []
+        self.last_flush = time.monotonic()
+        self.fd: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Check whether any frame may be written.
+
+        Returns:
+            bool: False if neither sampling nor the slow threshold is set.
+        """
+        return self.sample_rate > 0 or self.slow_seconds > 0
+
+    @property
+    def path(self) -> Path:
+        """
+        The trace file of this worker process.
+        """
+        return self.directory / f"trace-{os.getpid()}.jsonl"
+
+    def start(
+        self,
+        site: str | None,
+        stream: str,
+        timestamp: float,
+    ) -> FrameTrace | None:
+        """
+        Start tracing a frame.
+
+        Args:
+            site (str | None): The site of the stream.
+            stream (str): The stream name.
+            timestamp (float): The capture time of the frame.
+
+        Returns:
+            FrameTrace | None: The trace, or None if tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+        return FrameTrace(site, stream, timestamp)
+
+    def finish(self, trace: FrameTrace | None) -> bool:
+        """
+        Keep the trace of a processed or dropped frame if sampled or slow.
+
+        Args:
+            trace (FrameTrace | None): The trace of the frame.
+
+        Returns:
+            bool: True if the trace was kept for writing.
+        """
+        if trace is None:
+            return False
+        total = time.monotonic() - trace.start
+        slow = 0 < self.slow_seconds <= total
+        if not slow and self.rng() >= self.sample_rate:
+            return False
+        self.buffer.append(
+            json.dumps(trace.record(total), separators=(',', ':')) + '\n',
+        )
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """
+        Append the buffered records to the trace file.
+        """
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        if self.fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.fd = os.open(
+                self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644,
+            )
+        # One appending write per batch, as the streams of a worker share
+        # the file
+        os.write(self.fd, ''.join(self.buffer).encode('utf-8'))
+        self.buffer.clear()
+
+    def close(self) -> None:
+        """
+        Write the buffered records and close the trace file.
+        """
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def load_traces(paths: Iterable[str]) -> list[dict]:
+    """
+    Read the records of trace files, skipping truncated lines.
+
+    Args:
+        paths (Iterable[str]): The trace files.
+
+    Returns:
+        list[dict]: The records.
+    """
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Get a percentile by linear interpolation.
+
+    Args:
+        values (list[float]): The values, sorted in ascending order.
+        q (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The percentile, or 0 without values.
+    """
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarise(values: list[float]) -> dict[str, float]:
+    """
+    Summarise latencies.
+
+    Args:
+        values (list[float]): The latencies in seconds.
+
+    Returns:
+        dict[str, float]: The count, mean, p50, p95, p99 and max.
+    """
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1] if values else 0.0,
+    }
+
+
+def breakdown(records: list[dict]) -> dict[str, dict[str, float]]:
+    """
+    Summarise the latency of each stage and of whole frames.
+
+    Time within the pipeline not covered by a span is reported as
+    'queueing', the time frames waited between stages.
+
+    Args:
+        records (list[dict]): The trace records.
+
+    Returns:
+        dict[str, dict[str, float]]: The summary of each stage, then of
+        'queueing' and 'total'.
+    """
+    stages: dict[str, list[float]] = {}
+    queueing: list[float] = []
+    for record in records:
+        in_pipeline = 0.0
+        for name, offset, seconds in record['spans']:
+            stages.setdefault(name, []).append(seconds)
+            if offset >= 0:
+                in_pipeline += seconds
+        queueing.append(max(0.0, record['total'] - in_pipeline))
+    result = {name: summarise(values) for name, values in stages.items()}
+    result['queueing'] = summarise(queueing)
+    result['total'] = summarise([record['total'] for record in records])
+    return result
+
+
+def per_camera(records: list[dict]) -> dict[str, dict[str, float]]:
+    """
+    Summarise the total latency of the frames of each camera.
+
+    Args:
+        records (list[dict]): The trace records.
+
+    Returns:
+        dict[str, dict[str, float]]: The summary, keyed by
+        '{site}/{stream}'.
+    """
+    totals: dict[str, list[float]] = {}
+    for record in records:
+        camera = f"{record['site']}/{record['stream']}"
+        totals.setdefault(camera, []).append(record['total'])
+    return {camera: summarise(values) for camera, values in totals.items()}
+
+
+def outliers(
+    records: list[dict],
+    top: int = 10,
+    factor: float = 3.0,
+) -> list[dict]:
+    """
+    Find the frames much slower than the usual frames of their camera.
+
+    Args:
+        records (list[dict]): The trace records.
+        top (int): The maximum number of frames returned.
+        factor (float): How many times the median of its camera a frame
+            must take.
+
+    Returns:
+        list[dict]: The slowest such records, slowest first.
+    """
+    medians = {
+        camera: summary['p50']
+        for camera, summary in per_camera(records).items()
+    }
+    slow = [
+        record for record in records
+        if record['total']
+        > factor * medians[f"{record['site']}/{record['stream']}"]
+    ]
+    return sorted(slow, key=lambda record: record['total'], reverse=True)[
+        :top
+    ]
+
+
+def format_table(summaries: dict[str, dict[str, float]], title: str) -> str:
+    """
+    Format summaries as a text table.
+
+    Args:
+        summaries (dict[str, dict[str, float]]): The summary of each row.
+        title (str): The header of the first column.
+
+    Returns:
+        str: The table.
+    """
+    width = max([len(title), *(len(name) for name in summaries)])
+    lines = [
+        f"{title:<{width}} {'count':>7} {'mean':>8} {'p50':>8} "
+        f"{'p95':>8} {'p99':>8} {'max':>8}",
+    ]
+    for name, summary in summaries.items():
+        lines.append(
+            f"{name:<{width}} {summary['count']:>7} "
+            + ' '.join(
+                f"{summary[key]:>8.3f}"
+                for key in ('mean', 'p50', 'p95', 'p99', 'max')
+            ),
+        )
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Analyse the frame traces written by the workers.',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        help='Trace files, e.g. logs/traces/*.jsonl',
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='Number of outlier frames to list',
+    )
+    parser.add_argument(
+        '--factor',
+        type=float,
+        default=3.0,
+        help='Outliers take this many times the median of their camera',
+    )
+    args = parser.parse_args()
+
+    records = load_traces(args.paths)
+    if not records:
+        print('No traces found.')
+        return
+
+    print(format_table(breakdown(records), 'stage'))
+    print()
+    print(format_table(per_camera(records), 'camera'))
+    print()
+    print(f"Outliers (over {args.factor:g}x the camera median):")
+    for record in outliers(records, args.top, args.factor):
+        name, _, seconds = max(
+            record['spans'], key=lambda span: span[2], default=('-', 0, 0),
+        )
+        print(
+            f"{record['site']}/{record['stream']} at {record['ts']}: "
+            f"{record['total']:.3f}s, longest span {name} {seconds:.3f}s",
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import argparse
 import datetime
-import gc
 import os
+import threading
 import time
+import weakref
 from pathlib import Path
 from typing import TypedDict
 
@@ -22,6 +23,9 @@ from tenacity import wait_fixed
 
 load_dotenv()
 
+# Inference lock of each loaded model, shared by the streams using it
+INFERENCE_LOCKS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
 
 class InputData(TypedDict):
     frame: np.ndarray
@@ -50,6 +54,7 @@ class LiveStreamDetector:
         model_key: str = 'yolo11n',
         output_folder: str | None = None,
         detect_with_server: bool = False,
+        models: dict[str, AutoDetectionModel] | None = None,
     ):
         """
         Initialises the LiveStreamDetector.
@@ -58,6 +63,8 @@ class LiveStreamDetector:
             api_url (str): The URL of the API for detection.
             model_key (str): The model key for detection.
             output_folder (Optional[str]): Folder for detected frames.
+            models (Optional[dict]): Loaded models keyed by model key,
+                shared by the detectors of the streams of one process.
         """
         self.api_url: str = (
             api_url if api_url.startswith('http') else f"http://{api_url}"
@@ -65,9 +72,12 @@ class LiveStreamDetector:
         self.model_key: str = model_key
         self.output_folder: str | None = output_folder
         self.detect_with_server: bool = detect_with_server
+        self.models: dict[str, AutoDetectionModel] | None = models
         self.model: AutoDetectionModel | None = None
         self.access_token: str | None = None
         self.token_expiry: float = 0
+        # Inference and post-processing time of the last frame, in seconds
+        self.timings: dict[str, float] = {}
 
     @retry(
         stop=stop_after_attempt(3),
@@ -170,6 +180,9 @@ class LiveStreamDetector:
         Returns:
             List[List[float]]: The detection data.
         """
+        if self.model is None and self.models is not None:
+            # Reuse the model loaded by another stream of this process
+            self.model = self.models.get(self.model_key)
         if self.model is None:
             model_path = Path('models/pt/') / f"best_{self.model_key}.pt"
             self.model = AutoDetectionModel.from_pretrained(
@@ -177,15 +190,27 @@ class LiveStreamDetector:
                 model_path=model_path,
                 device='cuda:0',
             )
+            if self.models is not None:
+                self.models[self.model_key] = self.model
+
+        # Infer in a thread so the other stages of the stream keep running.
+        # Streams sharing a model take turns, as it is not thread-safe.
+        lock = INFERENCE_LOCKS.setdefault(self.model, threading.Lock())
+
+        def predict():
+            with lock:
+                return get_sliced_prediction(
+                    frame,
+                    self.model,
+                    slice_height=376,
+                    slice_width=376,
+                    overlap_height_ratio=0.3,
+                    overlap_width_ratio=0.3,
+                )
 
-        result = get_sliced_prediction(
-            frame,
-            self.model,
-            slice_height=376,
-            slice_width=376,
-            overlap_height_ratio=0.3,
-            overlap_width_ratio=0.3,
-        )
+        start = time.perf_counter()
+        result = await anyio.to_thread.run_sync(predict)
+        inference_time = time.perf_counter() - start
 
         # Compile detection data in YOLO format
         datas = []
@@ -204,6 +229,10 @@ class LiveStreamDetector:
         # Remove fully contained Hardhat and Safety Vest labels
         datas = self.remove_completely_contained_labels(datas)
 
+        self.timings = {
+            'inference': inference_time,
+            'postprocess': time.perf_counter() - start - inference_time,
+        }
         return datas
 
     def remove_overlapping_labels(self, datas):
@@ -249,7 +278,6 @@ class LiveStreamDetector:
         for index in sorted(to_remove, reverse=True):
             datas.pop(index)
 
-        gc.collect()
         return datas
 
     def overlap_percentage(self, bbox1, bbox2):
@@ -275,7 +303,6 @@ class LiveStreamDetector:
         overlap_percentage = intersection_area / float(
             bbox1_area + bbox2_area - intersection_area,
         )
-        gc.collect()
 
         return overlap_percentage
 
@@ -372,7 +399,9 @@ class LiveStreamDetector:
                 Detections and original frame.
         """
         if self.detect_with_server:
+            start = time.perf_counter()
             datas = await self.generate_detections_cloud(frame)
+            self.timings = {'inference': time.perf_counter() - start}
         else:
             datas = await self.generate_detections_local(frame)
         return datas, frame
@@ -83,6 +83,15 @@ class LineNotifier:
             dict: The files dictionary for the request.
         """
         if isinstance(image, bytes):
+            # Send already encoded PNG/JPEG images without re-encoding
+            if image[:8] == b'\x89PNG\r\n\x1a\n':
+                return {
+                    'imageFile': ('image.png', BytesIO(image), 'image/png'),
+                }
+            if image[:3] == b'\xff\xd8\xff':
+                return {
+                    'imageFile': ('image.jpg', BytesIO(image), 'image/jpeg'),
+                }
             image = np.array(Image.open(BytesIO(image)))
         image_pil = Image.fromarray(image)
         buffer = BytesIO()
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+# What a stage does with a new item while its input queue is full:
+# 'block' makes the previous stage wait (backpressure), 'drop_oldest'
+# discards the oldest queued item, so live frames never go stale.
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+POLICIES: tuple[str, ...] = (BLOCK, DROP_OLDEST)
+
+# Marks the end of the source, passed through every stage
+END = object()
+
+# Called with the stage name and the item when a stage drops a stale
+# item or fails on one, e.g. to release the buffers of the item
+DropCallback = Callable[[str, Any], None]
+
+
+@dataclass
+class Stage:
+    """
+    One stage of a pipeline, run as its own task.
+
+    The handler returns the item for the next stage, or None to stop
+    processing the item. An item the handler fails on is dropped and
+    the stage carries on with the next one.
+    """
+    name: str
+    handler: Callable[[Any], Awaitable[Any]]
+    maxsize: int = 1
+    policy: str = BLOCK
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    # Moving average of the seconds spent in the handler per item
+    latency: float = 0.0
+
+    def __post_init__(self) -> None:
+        """
+        Validate the input queue settings.
+
+        Raises:
+            ValueError: If the policy is unknown or the queue unbounded.
+        """
+        if self.policy not in POLICIES:
+            raise ValueError(
+                f"Unsupported policy for {self.name}: {self.policy}",
+            )
+        if self.maxsize < 1:
+            raise ValueError(f"Stage {self.name} needs a bounded queue")
+
+    def record(self, seconds: float, smoothing: float = 0.2) -> None:
+        """
+        Record the time spent processing one item.
+
+        Args:
+            seconds (float): The time spent in the handler.
+            smoothing (float): The weight of the newest measurement.
+        """
+        self.processed += 1
+        if self.processed == 1:
+            self.latency = seconds
+        else:
+            self.latency += smoothing * (seconds - self.latency)
+
+
+async def put(
+    queue: asyncio.Queue,
+    item: Any,
+    stage: Stage,
+    on_drop: DropCallback | None = None,
+) -> None:
+    """
+    Queue an item for a stage according to its policy.
+
+    Args:
+        queue (asyncio.Queue): The input queue of the stage.
+        item (Any): The item to queue.
+        stage (Stage): The stage consuming the queue.
+        on_drop (DropCallback | None): Called with the items discarded
+            to make room.
+    """
+    if stage.policy == DROP_OLDEST and item is not END:
+        while queue.full():
+            stale = queue.get_nowait()
+            stage.dropped += 1
+            if on_drop is not None:
+                on_drop(stage.name, stale)
+        queue.put_nowait(item)
+    else:
+        await queue.put(item)
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues, each running as a task.
+
+    Stages overlap, so the throughput approaches that of the slowest
+    stage rather than the sum of all stages.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        on_drop: DropCallback | None = None,
+    ) -> None:
+        """
+        Initialise the pipeline.
+
+        Args:
+            stages (list[Stage]): The stages, in processing order.
+            on_drop (DropCallback | None): Called with each item dropped
+                as stale or failed, which never reaches the last stage.
+        """
+        self.stages = stages
+        self.on_drop = on_drop
+
+    def bottleneck(self) -> float:
+        """
+        Get the latency of the slowest stage.
+
+        Returns:
+            float: The moving average latency in seconds, 0 before any
+            item was processed.
+        """
+        return max((stage.latency for stage in self.stages), default=0.0)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Get the counters of each stage.
+
+        Returns:
+            dict[str, dict[str, float]]: The processed, dropped and
+            failed items and the latency of each stage, keyed by stage
+            name.
+        """
+        return {
+            stage.name: {
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'failed': stage.failed,
+                'latency': stage.latency,
+            }
+            for stage in self.stages
+        }
+
+    async def run(self, source: AsyncIterator[Any]) -> None:
+        """
+        Feed the items of a source through the stages until it ends.
+
+        Errors of a stage on an item are logged and the item dropped. If
+        the source fails, the stages are cancelled and the error raised.
+
+        Args:
+            source (AsyncIterator[Any]): The items for the first stage.
+        """
+        queues: list[asyncio.Queue] = [
+            asyncio.Queue(maxsize=stage.maxsize) for stage in self.stages
+        ]
+
+        async def feed() -> None:
+            async for item in source:
+                await put(queues[0], item, self.stages[0], self.on_drop)
+            await put(queues[0], END, self.stages[0])
+
+        async def work(index: int) -> None:
+            stage = self.stages[index]
+            has_next = index + 1 < len(self.stages)
+            while True:
+                item = await queues[index].get()
+                if item is not END:
+                    start = time.perf_counter()
+                    try:
+                        result = await stage.handler(item)
+                    except Exception as e:
+                        logging.error(f"Stage {stage.name} failed: {e!r}")
+                        stage.failed += 1
+                        if self.on_drop is not None:
+                            self.on_drop(stage.name, item)
+                        continue
+                    stage.record(time.perf_counter() - start)
+                    item = result
+                if item is not None and has_next:
+                    await put(
+                        queues[index + 1], item, self.stages[index + 1],
+                        self.on_drop,
+                    )
+                if item is END:
+                    return
+
+        tasks = [asyncio.create_task(feed())] + [
+            asyncio.create_task(work(index))
+            for index in range(len(self.stages))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import copy
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPoint
+from shapely.geometry import Polygon
+from sklearn.cluster import HDBSCAN
+
+# Class indices produced by the detection models
+HARDHAT, MASK, NO_HARDHAT, NO_MASK, NO_SAFETY_VEST = 0, 1, 2, 3, 4
+PERSON, SAFETY_CONE, SAFETY_VEST, MACHINERY, VEHICLE = 5, 6, 7, 8, 9
+
+# Default rule declarations, equivalent to the historical hard-coded checks.
+# Rules are evaluated in this order, so the driver filter runs before the
+# PPE and proximity checks that depend on the filtered set of persons.
+DEFAULT_SAFETY_RULES: dict[str, dict] = {
+    'controlled_area': {
+        'enabled': True,
+        'min_cones': 3,
+        'min_samples': 3,
+        'min_cluster_size': 2,
+    },
+    'driver_exclusion': {
+        'enabled': True,
+    },
+    'no_hardhat': {
+        'enabled': True,
+        'overlap_threshold': 0.5,
+    },
+    'no_safety_vest': {
+        'enabled': True,
+        'overlap_threshold': 0.5,
+    },
+    'close_to_machinery': {
+        'enabled': True,
+        'vehicle_area_ratio': 0.1,
+        'machinery_area_ratio': 0.05,
+        'horizontal_factor': 5.0,
+        'vertical_factor': 1.5,
+    },
+}
+
+
+@dataclass
+class RuleContext:
+    """
+    Vectorised view of one frame's detections shared by all rules.
+    """
+    boxes: np.ndarray
+    classes: np.ndarray
+    persons: np.ndarray
+    machinery_vehicles: np.ndarray
+    polygons: list[Polygon] = field(default_factory=list)
+
+    @classmethod
+    def from_datas(cls, datas: list[list[float]]) -> RuleContext:
+        """
+        Build the context from normalised detection data.
+
+        Args:
+            datas (list[list[float]]): Normalised detection data.
+
+        Returns:
+            RuleContext: The vectorised context.
+        """
+        array = np.asarray(
+            [data[:6] for data in datas], dtype=np.float64,
+        ).reshape(-1, 6)
+        boxes = array[:, :4]
+        classes = array[:, 5].astype(np.int64)
+        return cls(
+            boxes=boxes,
+            classes=classes,
+            persons=boxes[classes == PERSON],
+            machinery_vehicles=array[
+                np.isin(classes, (MACHINERY, VEHICLE))
+            ][:, [0, 1, 2, 3, 5]],
+        )
+
+
+@dataclass
+class CompiledRule:
+    """
+    A safety rule compiled into a predicate over a :class:`RuleContext`.
+    """
+    name: str
+    evaluate: Callable[[RuleContext], list[str]]
+
+
+def pairwise_overlap(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Calculate the overlap (IoU) matrix between two sets of boxes.
+
+    Args:
+        boxes1 (np.ndarray): An (N, 4) array of boxes.
+        boxes2 (np.ndarray): An (M, 4) array of boxes.
+
+    Returns:
+        np.ndarray: An (N, M) array of overlap percentages.
+    """
+    a = boxes1[:, None, :]
+    b = boxes2[None, :, :]
+    inter_w = np.clip(
+        np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]),
+        0, None,
+    )
+    inter_h = np.clip(
+        np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]),
+        0, None,
+    )
+    overlap_area = inter_w * inter_h
+    area1 = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area2 = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return overlap_area / (area1 + area2 - overlap_area)
+
+
+def driver_matrix(persons: np.ndarray, vehicles: np.ndarray) -> np.ndarray:
+    """
+    Check which persons are likely driving which vehicles, by their
+    position within the vehicle.
+
+    Args:
+        persons (np.ndarray): An (P, 4) array of person boxes.
+        vehicles (np.ndarray): An (M, 4) array of machinery/vehicle boxes.
+
+    Returns:
+        np.ndarray: A (P, M) boolean matrix, True where the person
+            is likely driving the vehicle.
+    """
+    p = persons[:, None, :]
+    v = vehicles[None, :, :]
+    person_width = p[..., 2] - p[..., 0]
+    person_height = p[..., 3] - p[..., 1]
+    vehicle_height = v[..., 3] - v[..., 1]
+    return (
+        (p[..., 3] < v[..., 3])
+        & (v[..., 3] - p[..., 3] >= person_height / 2)
+        & (p[..., 0] >= v[..., 0] - person_width / 2)
+        & (p[..., 2] <= v[..., 2] + person_width / 2)
+        & (p[..., 1] > v[..., 1])
+        & (person_height <= vehicle_height / 2)
+    )
+
+
+def proximity_matrix(
+    persons: np.ndarray,
+    vehicles: np.ndarray,
+    acceptable_ratios: np.ndarray,
+    horizontal_factor: float,
+    vertical_factor: float,
+) -> np.ndarray:
+    """
+    Check which persons are dangerously close to which vehicles.
+
+    Args:
+        persons (np.ndarray): An (P, 4) array of person boxes.
+        vehicles (np.ndarray): An (M, 4) array of machinery/vehicle boxes.
+        acceptable_ratios (np.ndarray): An (M,) array of maximum
+            person/vehicle area ratios.
+        horizontal_factor (float): Danger distance in person widths.
+        vertical_factor (float): Danger distance in person heights.
+
+    Returns:
+        np.ndarray: A (P, M) boolean matrix, True where the person
+            is dangerously close to the vehicle.
+    """
+    p = persons[:, None, :]
+    v = vehicles[None, :, :]
+    person_width = p[..., 2] - p[..., 0]
+    person_height = p[..., 3] - p[..., 1]
+    vehicle_area = (v[..., 2] - v[..., 0]) * (v[..., 3] - v[..., 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        small_enough = (
+            person_width * person_height / vehicle_area
+        ) <= acceptable_ratios[None, :]
+    horizontal_distance = np.minimum(
+        np.abs(p[..., 2] - v[..., 0]), np.abs(p[..., 0] - v[..., 2]),
+    )
+    vertical_distance = np.minimum(
+        np.abs(p[..., 3] - v[..., 1]), np.abs(p[..., 1] - v[..., 3]),
+    )
+    return (
+        small_enough
+        & (horizontal_distance <= horizontal_factor * person_width)
+        & (vertical_distance <= vertical_factor * person_height)
+    )
+
+
+def cone_clusterer(params: dict) -> HDBSCAN:
+    """
+    Create the clusterer grouping safety cones into controlled areas.
+
+    Args:
+        params (dict): The parameters of the ``controlled_area`` rule.
+
+    Returns:
+        HDBSCAN: The clusterer.
+    """
+    return HDBSCAN(
+        min_samples=params['min_samples'],
+        min_cluster_size=params['min_cluster_size'],
+    )
+
+
+def cone_polygons(
+    cones: np.ndarray,
+    clusterer: HDBSCAN,
+    min_cones: int,
+) -> list[Polygon]:
+    """
+    Form the controlled areas enclosed by clusters of safety cones.
+
+    Args:
+        cones (np.ndarray): An (N, 4) array of safety cone boxes.
+        clusterer (HDBSCAN): Groups the cone centres.
+        min_cones (int): The cones needed to look for areas at all.
+
+    Returns:
+        list[Polygon]: The convex hull of each cluster of three or more
+        cones.
+    """
+    if len(cones) < min_cones:
+        return []
+    centres = np.column_stack((
+        (cones[:, 0] + cones[:, 2]) / 2,
+        (cones[:, 1] + cones[:, 3]) / 2,
+    ))
+    labels = clusterer.fit_predict(centres)
+    polygons = []
+    for label in np.unique(labels[labels != -1]):
+        cluster_points = centres[labels == label]
+        if len(cluster_points) >= 3:
+            polygons.append(MultiPoint(cluster_points).convex_hull)
+    return polygons
+
+
+def count_people_inside(
+    persons: np.ndarray,
+    polygons: list[Polygon],
+) -> int:
+    """
+    Count the unique person centres inside any of the polygons.
+
+    Args:
+        persons (np.ndarray): A (P, 4) array of person boxes.
+        polygons (list[Polygon]): The controlled areas.
+
+    Returns:
+        int: The number of people inside the controlled areas.
+    """
+    if not polygons or not len(persons):
+        return 0
+    centres = np.column_stack((
+        (persons[:, 0] + persons[:, 2]) / 2,
+        (persons[:, 1] + persons[:, 3]) / 2,
+    ))
+    inside = np.zeros(len(centres), dtype=bool)
+    for polygon in polygons:
+        inside |= shapely.contains_xy(polygon, centres[:, 0], centres[:, 1])
+    return len(np.unique(centres[inside], axis=0))
+
+
+def _compile_controlled_area(params: dict) -> CompiledRule:
+    clusterer = cone_clusterer(params)
+    min_cones = params['min_cones']
+
+    def evaluate(ctx: RuleContext) -> list[str]:
+        ctx.polygons.extend(
+            cone_polygons(
+                ctx.boxes[ctx.classes == SAFETY_CONE], clusterer, min_cones,
+            ),
+        )
+        people_count = count_people_inside(ctx.persons, ctx.polygons)
+        if people_count > 0:
+            return [
+                f"Warning: {people_count} people "
+                'have entered the controlled area!',
+            ]
+        return []
+
+    return CompiledRule('controlled_area', evaluate)
+
+
+def _compile_driver_exclusion(params: dict) -> CompiledRule:
+    def evaluate(ctx: RuleContext) -> list[str]:
+        if len(ctx.machinery_vehicles) and len(ctx.persons):
+            drivers = driver_matrix(
+                ctx.persons, ctx.machinery_vehicles[:, :4],
+            ).any(axis=1)
+            ctx.persons = ctx.persons[~drivers]
+        return []
+
+    return CompiledRule('driver_exclusion', evaluate)
+
+
+def _compile_ppe(
+    name: str,
+    violation_class: int,
+    message: str,
+) -> Callable[[dict], CompiledRule]:
+    def compile_rule(params: dict) -> CompiledRule:
+        threshold = params['overlap_threshold']
+
+        def evaluate(ctx: RuleContext) -> list[str]:
+            violations = ctx.boxes[ctx.classes == violation_class]
+            if not len(violations):
+                return []
+            if not len(ctx.persons):
+                return [message]
+            overlaps = pairwise_overlap(violations, ctx.persons)
+            # A violation is reported if no person overlaps it enough
+            if not (overlaps > threshold).any(axis=1).all():
+                return [message]
+            return []
+
+        return CompiledRule(name, evaluate)
+
+    return compile_rule
+
+
+def _compile_close_to_machinery(params: dict) -> CompiledRule:
+    ratios = {
+        MACHINERY: params['machinery_area_ratio'],
+        VEHICLE: params['vehicle_area_ratio'],
+    }
+    horizontal_factor = params['horizontal_factor']
+    vertical_factor = params['vertical_factor']
+
+    def evaluate(ctx: RuleContext) -> list[str]:
+        if not len(ctx.persons) or not len(ctx.machinery_vehicles):
+            return []
+        vehicle_classes = ctx.machinery_vehicles[:, 4].astype(np.int64)
+        acceptable_ratios = np.where(
+            vehicle_classes == VEHICLE, ratios[VEHICLE], ratios[MACHINERY],
+        )
+        close = proximity_matrix(
+            ctx.persons,
+            ctx.machinery_vehicles[:, :4],
+            acceptable_ratios,
+            horizontal_factor,
+            vertical_factor,
+        )
+        # Each person reports the first machinery/vehicle they are close to
+        hits = close.any(axis=1)
+        first = close.argmax(axis=1)[hits]
+        warnings = []
+        for cls in np.unique(vehicle_classes[first]):
+            label = 'machinery' if cls == MACHINERY else 'vehicle'
+            warnings.append(f"Warning: Someone is too close to {label}!")
+        return warnings
+
+    return CompiledRule('close_to_machinery', evaluate)
+
+
+RULE_COMPILERS: dict[str, Callable[[dict], CompiledRule]] = {
+    'controlled_area': _compile_controlled_area,
+    'driver_exclusion': _compile_driver_exclusion,
+    'no_hardhat': _compile_ppe(
+        'no_hardhat', NO_HARDHAT,
+        'Warning: Someone is not wearing a hardhat!',
+    ),
+    'no_safety_vest': _compile_ppe(
+        'no_safety_vest', NO_SAFETY_VEST,
+        'Warning: Someone is not wearing a safety vest!',
+    ),
+    'close_to_machinery': _compile_close_to_machinery,
+}
+
+
+def merge_rule_config(rules_config: dict | None) -> dict[str, dict]:
+    """
+    Merge a (partial) rule declaration with the default rules.
+
+    A rule may be declared either as a mapping of parameters or as a
+    bare boolean to toggle it, e.g. ``close_to_machinery: false``.
+
+    Args:
+        rules_config (dict | None): The rule declarations from the
+            configuration file.
+
+    Returns:
+        dict[str, dict]: The full set of rule parameters.
+
+    Raises:
+        ValueError: If an unknown rule or parameter is declared, or a
+            rule is neither a mapping nor a boolean.
+    """
+    merged = copy.deepcopy(DEFAULT_SAFETY_RULES)
+    for name, params in (rules_config or {}).items():
+        if name not in merged:
+            raise ValueError(f"Unknown safety rule: {name}")
+        if isinstance(params, bool):
+            params = {'enabled': params}
+        elif not isinstance(params, dict):
+            raise ValueError(
+                f"Safety rule {name} must be a mapping of parameters or "
+                f"a boolean, got {params!r}",
+            )
+        unknown = set(params) - set(merged[name])
+        if unknown:
+            raise ValueError(
+                f"Unknown parameters for safety rule {name}: "
+                f"{sorted(unknown)}",
+            )
+        merged[name].update(params)
+    return merged
+
+
+def compile_rules(rules_config: dict | None = None) -> list[CompiledRule]:
+    """
+    Compile rule declarations into an ordered list of evaluators.
+
+    Disabled rules are dropped entirely so they cost nothing per frame.
+
+    Args:
+        rules_config (dict | None): The rule declarations from the
+            configuration file.
+
+    Returns:
+        list[CompiledRule]: The enabled rules in evaluation order.
+    """
+    merged = merge_rule_config(rules_config)
+    return [
+        RULE_COMPILERS[name](params)
+        for name, params in merged.items()
+        if params['enabled']
+    ]
+
+
+def evaluate_rules(
+    rules: list[CompiledRule],
+    datas: list[list[float]],
+    timings: dict[str, float] | None = None,
+) -> tuple[list[str], list[Polygon]]:
+    """
+    Evaluate compiled rules against normalised detection data.
+
+    Args:
+        rules (list[CompiledRule]): The compiled rules.
+        datas (list[list[float]]): Normalised detection data.
+        timings (dict[str, float] | None): If given, filled with the
+            evaluation time of each rule in seconds.
+
+    Returns:
+        tuple[list[str], list[Polygon]]: Warnings and polygons list.
+    """
+    ctx = RuleContext.from_datas(datas)
+    warnings: list[str] = []
+    for rule in rules:
+        start = time.perf_counter()
+        for warning in rule.evaluate(ctx):
+            if warning not in warnings:
+                warnings.append(warning)
+        if timings is not None:
+            timings[rule.name] = time.perf_counter() - start
+    return warnings, ctx.polygons
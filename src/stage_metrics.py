@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Stages of the detection of a frame, in processing order
+STAGES: tuple[str, ...] = (
+    'capture_wait',
+    'decode',
+    'inference',
+    'postprocess',
+    'danger_analysis',
+    'drawing',
+    'encoding',
+    'redis_publish',
+    'notification_send',
+)
+
+# Prefix of the exported metric names
+NAMESPACE = 'hazard_detection'
+
+
+def escape(value: str) -> str:
+    """
+    Escape a label value of the Prometheus text format.
+
+    Args:
+        value (str): The label value.
+
+    Returns:
+        str: The escaped value.
+    """
+    return (
+        value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    )
+
+
+def labels(**values: object) -> str:
+    """
+    Format the labels of a sample.
+
+    Args:
+        **values (object): The label values by name.
+
+    Returns:
+        str: The labels, e.g. '{site="a",stream="b"}'.
+    """
+    return '{' + ','.join(
+        f'{name}="{escape(str(value))}"' for name, value in values.items()
+    ) + '}'
+
+
+class StageMetrics:
+    """
+    Latency histograms and counters of the stages, by site and stream.
+
+    Each worker process aggregates its streams in the module's
+    ``metrics`` and sends snapshots to the main process, which merges
+    the snapshots of all workers into the Prometheus text format.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        """
+        Initialise empty metrics.
+
+        Args:
+            buckets (tuple[float, ...]): The histogram bucket bounds.
+        """
+        self.buckets = buckets
+        # Per (site, stream, stage): the count of each bucket, then the
+        # count above the last bound, the sum and the count of samples
+        self.histograms: dict[tuple[str, str, str], list[float]] = {}
+        # Per (site, stream, name, status): the running total
+        self.counters: dict[tuple[str, str, str, str], float] = {}
+        self.last_flush = time.monotonic()
+
+    def observe(
+        self,
+        site: str | None,
+        stream: str,
+        stage: str,
+        seconds: float,
+    ) -> None:
+        """
+        Record the time a stage took for one frame.
+
+        Args:
+            site (str | None): The site of the stream.
+            stream (str): The stream name.
+            stage (str): The stage, one of ``STAGES``.
+            seconds (float): The time taken.
+        """
+        key = (str(site), stream, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = [0.0] * (len(self.buckets) + 3)
+            self.histograms[key] = histogram
+        index = next(
+            (
+                i for i, bound in enumerate(self.buckets)
+                if seconds <= bound
+            ),
+            len(self.buckets),
+        )
+        histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def count(
+        self,
+        site: str | None,
+        stream: str,
+        name: str,
+        status: str,
+        value: float = 1,
+    ) -> None:
+        """
+        Increment a counter of a stream.
+
+        Args:
+            site (str | None): The site of the stream.
+            stream (str): The stream name.
+            name (str): The counter, e.g. 'notifications'.
+            status (str): The outcome, e.g. 'sent' or 'failed'.
+            value (float): The increment.
+        """
+        key = (str(site), stream, name, status)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        Get a picklable copy of the metrics.
+
+        Returns:
+            dict: The buckets, histograms and counters.
+        """
+        return {
+            'buckets': self.buckets,
+            'histograms': {
+                key: list(values) for key, values in self.histograms.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def flush(
+        self,
+        send: Callable[[dict], None],
+        interval: float | None = None,
+    ) -> bool:
+        """
+        Send a snapshot if the report interval has elapsed.
+
+        Args:
+            send (Callable[[dict], None]): Sends the report, e.g.
+                ``worker_pool.send_report``.
+            interval (float | None): Seconds between snapshots. Defaults
+                to METRICS_REPORT_INTERVAL, or 5.
+
+        Returns:
+            bool: True if a snapshot was sent.
+        """
+        interval = (
+            interval if interval is not None
+            else float(os.getenv('METRICS_REPORT_INTERVAL', 5))
+        )
+        now = time.monotonic()
+        if now - self.last_flush < interval:
+            return False
+        self.last_flush = now
+        send({
+            'type': 'metrics',
+            'pid': os.getpid(),
+            'snapshot': self.snapshot(),
+        })
+        return True
+
+
+def render(snapshots: Iterable[dict]) -> str:
+    """
+    Merge snapshots into the Prometheus text exposition format.
+
+    Args:
+        snapshots (Iterable[dict]): The snapshots of the workers.
+
+    Returns:
+        str: The metrics, ending with a newline.
+    """
+    buckets: tuple[float, ...] = BUCKETS
+    histograms: dict[tuple[str, str, str], list[float]] = {}
+    counters: dict[tuple[str, str, str, str], float] = {}
+    for snapshot in snapshots:
+        buckets = snapshot['buckets']
+        for key, values in snapshot['histograms'].items():
+            merged = histograms.setdefault(key, [0.0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0) + value
+
+    name = f"{NAMESPACE}_stage_duration_seconds"
+    lines = [
+        f"# HELP {name} Time spent in each stage of the detection of a "
+        'frame.',
+        f"# TYPE {name} histogram",
+    ]
+    for (site, stream, stage), values in sorted(histograms.items()):
+        cumulative = 0.0
+        for bound, value in zip(
+            [*(str(bound) for bound in buckets), '+Inf'], values,
+        ):
+            cumulative += value
+            sample = labels(site=site, stream=stream, stage=stage, le=bound)
+            lines.append(f"{name}_bucket{sample} {int(cumulative)}")
+        sample = labels(site=site, stream=stream, stage=stage)
+        lines.append(f"{name}_sum{sample} {values[-2]:.6f}")
+        lines.append(f"{name}_count{sample} {int(values[-1])}")
+
+    for counter in sorted({key[2] for key in counters}):
+        name = f"{NAMESPACE}_{counter}_total"
+        lines.append(f"# TYPE {name} counter")
+        for (site, stream, _, status), value in sorted(
+            (key, value) for key, value in counters.items()
+            if key[2] == counter
+        ):
+            sample = labels(site=site, stream=stream, status=status)
+            lines.append(f"{name}{sample} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics of the streams of this process
+metrics = StageMetrics()
@@ -4,6 +4,7 @@ import argparse
 import asyncio
 import datetime
 import gc
+import time
 from collections.abc import AsyncGenerator
 from typing import TypedDict
 
@@ -12,6 +13,8 @@ import numpy as np
 import speedtest
 import streamlink
 
+from .frame_pool import FramePool
+
 
 class InputData(TypedDict):
     stream_url: str
@@ -45,6 +48,11 @@ class StreamCapture:
         self.capture_interval = capture_interval
         # Flag to indicate successful capture
         self.successfully_captured = False
+        # Seconds taken to read and decode the last frame
+        self.read_time = 0.0
+        # Buffers frames are decoded into, reused once released
+        self.frame_pool = FramePool()
+        self.frame_shape: tuple[int, ...] | None = None
 
     async def initialise_stream(self, stream_url: str) -> None:
         """
@@ -70,6 +78,39 @@ class StreamCapture:
             self.cap = None
         gc.collect()
 
+    def read_frame(self) -> tuple[bool, np.ndarray | None]:
+        """
+        Reads and decodes the next frame, timing the read.
+
+        Returns:
+            Tuple[bool, Optional[np.ndarray]]: Whether a frame was read,
+                and the frame.
+        """
+        if self.cap is None:
+            return False, None
+        # Decode into a released buffer of the last frame size, if any
+        buffer = (
+            self.frame_pool.acquire(self.frame_shape)
+            if self.frame_shape else None
+        )
+        start = time.perf_counter()
+        ret, frame = self.cap.read(buffer)
+        self.read_time = time.perf_counter() - start
+        if frame is not buffer:
+            self.frame_pool.release(buffer)
+        if isinstance(frame, np.ndarray):
+            self.frame_shape = frame.shape
+        return ret, frame
+
+    def release_frame(self, frame: np.ndarray) -> None:
+        """
+        Returns the buffer of a yielded frame for reuse.
+
+        Args:
+            frame (np.ndarray): The frame, no longer referenced anywhere.
+        """
+        self.frame_pool.release(frame)
+
     async def execute_capture(
         self,
     ) -> AsyncGenerator[tuple[np.ndarray, float]]:
@@ -89,9 +130,7 @@ class StreamCapture:
             if self.cap is None:
                 await self.initialise_stream(self.stream_url)
 
-            ret, frame = (
-                self.cap.read() if self.cap is not None else (False, None)
-            )
+            ret, frame = self.read_frame()
 
             if not ret or frame is None:
                 fail_count += 1
@@ -126,10 +165,9 @@ class StreamCapture:
                 last_process_time = current_time
                 timestamp = current_time.timestamp()
                 yield frame, timestamp
-
-                # Clear memory
-                del frame, timestamp
-                gc.collect()
+            else:
+                # Decode the next frame into the buffer of this one
+                self.release_frame(frame)
 
             await asyncio.sleep(0.01)  # Adjust the sleep time as needed
 
@@ -213,9 +251,7 @@ class StreamCapture:
 
         while True:
             # Read the frame from the stream
-            ret, frame = (
-                self.cap.read() if self.cap is not None else (False, None)
-            )
+            ret, frame = self.read_frame()
 
             # Handle failed frame reads
             if not ret or frame is None:
@@ -255,19 +291,18 @@ class StreamCapture:
                 last_process_time = current_time
                 timestamp = current_time.timestamp()
                 yield frame, timestamp
-
-                # Clear memory
-                del frame, timestamp
-                gc.collect()
+            else:
+                # Decode the next frame into the buffer of this one
+                self.release_frame(frame)
 
             await asyncio.sleep(0.01)  # Adjust the sleep time as needed
 
-    def update_capture_interval(self, new_interval: int) -> None:
+    def update_capture_interval(self, new_interval: float) -> None:
         """
         Updates the capture interval.
 
         Args:
-            new_interval (int): Frame capture interval in seconds.
+            new_interval (float): Frame capture interval in seconds.
         """
         self.capture_interval = new_interval
 
@@ -288,9 +323,8 @@ async def main():
     async for frame, timestamp in stream_capture.execute_capture():
         # Process the frame here
         print(f"Frame at {timestamp} displayed")
-        # Release the frame resources
-        del frame
-        gc.collect()
+        # Reuse the buffer of the frame
+        stream_capture.release_frame(frame)
 
 
 if __name__ == '__main__':
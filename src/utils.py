@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import logging
 import os
 from datetime import datetime
+from typing import Any
+from typing import TypedDict
 
 import redis.asyncio as redis
 from watchdog.events import FileSystemEventHandler
@@ -31,22 +35,89 @@ class Utils:
             return datetime.now() > expire_date
         return False
 
+    @staticmethod
+    def diff_configs(
+        old: dict[str, dict],
+        new: dict[str, dict],
+    ) -> ConfigDiff:
+        """
+        Compare the stream configurations before and after a reload.
+
+        Args:
+            old (dict[str, dict]): The previous configs by video URL.
+            new (dict[str, dict]): The new configs by video URL.
+
+        Returns:
+            ConfigDiff: The added, removed and changed video URLs.
+        """
+        return {
+            'added': [url for url in new if url not in old],
+            'removed': [url for url in old if url not in new],
+            'changed': [
+                url for url in new if url in old and old[url] != new[url]
+            ],
+        }
+
+
+class ConfigDiff(TypedDict):
+    """
+    Typed dictionary of the streams changed by a configuration reload.
+    """
+    added: list[str]
+    removed: list[str]
+    changed: list[str]
+
 
 class FileEventHandler(FileSystemEventHandler):
     """
     A class to handle file events.
+
+    Events arrive on the watchdog thread. They are debounced on the event
+    loop, and the callback only runs when the content of the file changed.
     """
 
-    def __init__(self, file_path: str, callback):
+    def __init__(
+        self,
+        file_path: str,
+        callback,
+        loop: asyncio.AbstractEventLoop | None = None,
+        debounce: float = 0.5,
+    ):
         """
         Initialises the FileEventHandler instance.
 
         Args:
             file_path (str): The path of the file to watch.
-            callback (Callable): The function to call when file is modified.
+            callback (Callable): The coroutine function to call when the
+                file is modified.
+            loop (asyncio.AbstractEventLoop | None): The loop to run the
+                callback on. Defaults to the running loop.
+            debounce (float): Seconds without events to wait for before
+                reloading, as editors write a file in several events.
         """
         self.file_path = file_path
         self.callback = callback
+        self.loop = loop or asyncio.get_running_loop()
+        self.debounce = debounce
+        self.timer: asyncio.TimerHandle | None = None
+        self.digest: str | None = self.file_digest(file_path)
+
+    @staticmethod
+    def file_digest(file_path: str) -> str | None:
+        """
+        Hash the content of a file.
+
+        Args:
+            file_path (str): The path of the file.
+
+        Returns:
+            str | None: The SHA-256 digest, or None if it cannot be read.
+        """
+        try:
+            with open(file_path, 'rb') as file:
+                return hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return None
 
     def on_modified(self, event):
         """
@@ -56,8 +127,65 @@ class FileEventHandler(FileSystemEventHandler):
             event (FileSystemEvent): The event object.
         """
         if event.src_path == self.file_path:
-            # Run the callback function
-            asyncio.run(self.callback())
+            self.loop.call_soon_threadsafe(self.schedule)
+
+    def on_created(self, event):
+        """
+        Called when a file is created, e.g. saved by replacing it.
+
+        Args:
+            event (FileSystemEvent): The event object.
+        """
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        """
+        Called when a file is moved, e.g. saved by renaming a temp file.
+
+        Args:
+            event (FileSystemEvent): The event object.
+        """
+        if event.dest_path == self.file_path:
+            self.loop.call_soon_threadsafe(self.schedule)
+
+    def schedule(self) -> None:
+        """
+        (Re)start the debounce timer. Runs on the event loop.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.loop.call_later(self.debounce, self.reload)
+
+    def reload(self) -> asyncio.Task | None:
+        """
+        Run the callback if the content of the file changed.
+
+        Returns:
+            asyncio.Task | None: The task running the callback, if any.
+        """
+        self.timer = None
+        digest = self.file_digest(self.file_path)
+        if digest is None or digest == self.digest:
+            return None
+        self.digest = digest
+        return self.loop.create_task(self.callback())
+
+
+class FramePayload(TypedDict, total=False):
+    """
+    Typed dictionary of one frame to publish to Redis.
+    """
+    stream_name: str
+    # Site and camera of the stream, to list it in the camera index
+    site: str
+    camera: str
+    frame: bytes
+    datas: list[list[float]]
+    warnings: list[str]
+    polygons: list[Any]
+    timestamp: float
+    # False if the detections are left for the viewer to draw
+    annotated: bool
 
 
 class RedisManager:
@@ -65,21 +193,142 @@ class RedisManager:
     A class to manage Redis operations.
     """
 
-    def __init__(self):
+    # Prefix of the heartbeat keys refreshed by the streaming web app
+    # while a stream is being viewed (see examples/streaming_web/utils.py)
+    viewer_heartbeat_prefix: str = '_viewers:'
+
+    # Hash of site -> last frame timestamp, and per-site hashes
+    # (prefix + site) of camera -> JSON with its stream key and last
+    # frame timestamp, so cameras are listed without scanning keys
+    # (see examples/streaming_web/utils.py)
+    camera_index_key: str = '_cameras'
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        health_check_interval: int | None = None,
+        socket_timeout: float | None = None,
+        socket_connect_timeout: float | None = None,
+        stream_budget_bytes: int | None = None,
+        stream_ttl: int | None = None,
+    ) -> None:
         """
-        Initialise the RedisManager by connecting to Redis.
+        Initialise the RedisManager. Connections are made lazily, from a
+        connection pool created per process on first use.
+
+        Args:
+            pool_size (int | None): The maximum number of connections per
+                process. Defaults to REDIS_POOL_SIZE, or 10.
+            health_check_interval (int | None): Seconds a connection may
+                be idle before it is checked with a PING on reuse.
+                Defaults to REDIS_HEALTH_CHECK_INTERVAL, or 30.
+            socket_timeout (float | None): Seconds to wait for a reply.
+                Defaults to REDIS_SOCKET_TIMEOUT, or 5.
+            socket_connect_timeout (float | None): Seconds to wait for a
+                connection. Defaults to REDIS_SOCKET_CONNECT_TIMEOUT, or 5.
+            stream_budget_bytes (int | None): The memory budget of each
+                frame stream; streams are trimmed to the number of frames
+                that fit. Defaults to REDIS_STREAM_BUDGET_MB, or 4 MiB.
+            stream_ttl (int | None): Seconds a stream and its camera index
+                entry live after the last write, 0 to keep them forever.
+                Defaults to REDIS_STREAM_TTL, or 300.
         """
         self.redis_host: str = os.getenv('redis_host', 'localhost')
         self.redis_port: int = int(os.getenv('redis_port', 6379))
         self.redis_password: str | None = os.getenv('redis_password')
 
-        # Create Redis connection
-        self.redis = redis.Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            password=self.redis_password,
-            decode_responses=False,
+        self.pool_size: int = pool_size or int(
+            os.getenv('REDIS_POOL_SIZE', 10),
+        )
+        self.health_check_interval: int = (
+            health_check_interval
+            if health_check_interval is not None
+            else int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+        )
+        self.socket_timeout: float = socket_timeout or float(
+            os.getenv('REDIS_SOCKET_TIMEOUT', 5),
         )
+        self.socket_connect_timeout: float = socket_connect_timeout or float(
+            os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 5),
+        )
+
+        self.stream_budget_bytes: int = stream_budget_bytes or int(
+            float(os.getenv('REDIS_STREAM_BUDGET_MB', 4)) * 1024 * 1024,
+        )
+        self.stream_ttl: int = (
+            stream_ttl
+            if stream_ttl is not None
+            else int(os.getenv('REDIS_STREAM_TTL', 300))
+        )
+
+        # Redis clients keyed by the PID of the process that created them,
+        # so forked stream processes never share the parent's sockets
+        self._clients: dict[int, redis.Redis] = {}
+
+    @property
+    def redis(self) -> redis.Redis:
+        """
+        Get the Redis client of the current process, creating it and its
+        connection pool on first use.
+
+        Returns:
+            redis.Redis: The Redis client of the current process.
+        """
+        pid = os.getpid()
+        client = self._clients.get(pid)
+        if client is None:
+            # Forget clients inherited across fork without closing them,
+            # their sockets still belong to the parent process
+            self._clients.clear()
+            pool = redis.BlockingConnectionPool(
+                host=self.redis_host,
+                port=self.redis_port,
+                password=self.redis_password,
+                max_connections=self.pool_size,
+                # Wait for a free connection rather than failing
+                timeout=self.socket_connect_timeout,
+                health_check_interval=self.health_check_interval,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_connect_timeout,
+                decode_responses=False,
+            )
+            client = redis.Redis(connection_pool=pool)
+            self._clients[pid] = client
+        return client
+
+    @redis.setter
+    def redis(self, client: redis.Redis) -> None:
+        """
+        Use the given client in the current process.
+
+        Args:
+            client (redis.Redis): The Redis client.
+        """
+        self._clients = {os.getpid(): client}
+
+    def pipeline(self, transaction: bool = False) -> Any:
+        """
+        Create a pipeline on the connection pool of the current process.
+
+        Args:
+            transaction (bool): Wrap the queued commands in MULTI/EXEC.
+
+        Returns:
+            Any: The pipeline, to be used as an async context manager.
+        """
+        return self.redis.pipeline(transaction=transaction)
+
+    async def close(self) -> None:
+        """
+        Close the connection pool of the current process.
+        """
+        client = self._clients.pop(os.getpid(), None)
+        if client is None:
+            return
+        try:
+            await client.aclose()
+        except Exception as e:
+            logging.error(f"Error closing Redis connections: {str(e)}")
 
     async def set(self, key: str, value: bytes) -> None:
         """
@@ -122,6 +371,29 @@ class RedisManager:
         except Exception as e:
             logging.error(f"Error deleting Redis key {key}: {str(e)}")
 
+    async def has_viewers(self, stream_name: str) -> bool:
+        """
+        Check whether anyone is currently viewing a stream.
+
+        Args:
+            stream_name (str): The name of the Redis stream.
+
+        Returns:
+            bool: True if the viewer heartbeat of the stream is alive.
+        """
+        try:
+            return bool(
+                await self.redis.exists(
+                    f"{self.viewer_heartbeat_prefix}{stream_name}",
+                ),
+            )
+        except Exception as e:
+            logging.error(
+                f"Error checking viewers of {stream_name}: {str(e)}",
+            )
+            # Assume someone is watching rather than hiding the stream
+            return True
+
     async def add_to_stream(
         self,
         stream_name: str,
@@ -143,6 +415,194 @@ class RedisManager:
                 f"Error adding to Redis stream {stream_name}: {str(e)}",
             )
 
+    @staticmethod
+    def build_stream_entry(payload: FramePayload) -> dict[str, bytes | str]:
+        """
+        Build the fields of a stream entry from a frame payload.
+
+        Detections are serialised as compact JSON: each box is
+        ``[x1, y1, x2, y2, confidence, class]`` and each controlled-area
+        polygon is a list of ``[x, y]`` points.
+
+        Args:
+            payload (FramePayload): The frame and its detections.
+
+        Returns:
+            dict[str, bytes | str]: The fields of the stream entry.
+        """
+        detections = [
+            [round(float(v), 1) for v in data[:4]]
+            + [round(float(data[4]), 2), int(data[5])]
+            for data in payload.get('datas', [])
+        ]
+        polygons = [
+            [
+                [round(float(x), 1), round(float(y), 1)]
+                for x, y in getattr(polygon, 'exterior', polygon).coords
+            ]
+            for polygon in payload.get('polygons', [])
+        ]
+        compact = {'separators': (',', ':'), 'ensure_ascii': False}
+        return {
+            'frame': payload['frame'],
+            'detections': json.dumps(detections, **compact),
+            'warnings': json.dumps(payload.get('warnings', []), **compact),
+            'polygons': json.dumps(polygons, **compact),
+            'timestamp': str(payload.get('timestamp', 0.0)),
+            'annotated': '1' if payload.get('annotated', True) else '0',
+        }
+
+    def index_camera(self, pipe: Any, payload: FramePayload) -> None:
+        """
+        Queue the camera index update of a published frame.
+
+        Args:
+            pipe (Any): The pipeline publishing the frame.
+            payload (FramePayload): The published frame. Frames without
+                a site and camera are not indexed.
+        """
+        site = payload.get('site')
+        camera = payload.get('camera')
+        if site is None or camera is None:
+            return
+        timestamp = float(payload.get('timestamp', 0.0))
+        pipe.hset(self.camera_index_key, site, str(timestamp))
+        pipe.hset(
+            f"{self.camera_index_key}:{site}",
+            camera,
+            json.dumps(
+                {'stream': payload['stream_name'], 'timestamp': timestamp},
+                separators=(',', ':'),
+                ensure_ascii=False,
+            ),
+        )
+        if self.stream_ttl:
+            # Sites whose cameras all stopped publishing drop out. Their
+            # field in the top-level hash has no TTL of its own and is
+            # pruned by the readers of the index.
+            pipe.expire(f"{self.camera_index_key}:{site}", self.stream_ttl)
+
+    def budget_maxlen(self, entry_size: int, maxlen: int) -> int:
+        """
+        Get the stream length that keeps a stream within its byte budget.
+
+        Args:
+            entry_size (int): The size of the newest entry in bytes.
+            maxlen (int): The maximum length requested by the caller.
+
+        Returns:
+            int: The number of entries to keep, at least 1.
+        """
+        fitting = self.stream_budget_bytes // max(entry_size, 1)
+        return max(1, min(maxlen, fitting))
+
+    async def publish_frame(
+        self,
+        payload: FramePayload,
+        maxlen: int = 10,
+    ) -> None:
+        """
+        Publish an annotated frame and its detections to its stream.
+
+        Args:
+            payload (FramePayload): The frame and its detections.
+            maxlen (int): The approximate maximum length of the stream.
+        """
+        await self.publish_frames([payload], maxlen=maxlen)
+
+    async def publish_frames(
+        self,
+        payloads: list[FramePayload],
+        maxlen: int = 10,
+    ) -> None:
+        """
+        Publish frames of several streams in one round trip, updating the
+        camera index in the same transaction.
+
+        Streams are trimmed approximately (``MAXLEN ~``), which lets Redis
+        drop whole macro nodes instead of trimming on every write, to at
+        most ``maxlen`` entries and to the per-stream byte budget. Their
+        TTL is refreshed on every write.
+
+        Args:
+            payloads (list[FramePayload]): The frames to publish.
+            maxlen (int): The approximate maximum length of each stream.
+        """
+        if not payloads:
+            return
+        try:
+            async with self.pipeline(transaction=True) as pipe:
+                for payload in payloads:
+                    entry = self.build_stream_entry(payload)
+                    entry_size = sum(len(value) for value in entry.values())
+                    pipe.xadd(
+                        payload['stream_name'],
+                        entry,
+                        maxlen=self.budget_maxlen(entry_size, maxlen),
+                        approximate=True,
+                    )
+                    if self.stream_ttl:
+                        pipe.expire(payload['stream_name'], self.stream_ttl)
+                    self.index_camera(pipe, payload)
+                await pipe.execute()
+        except Exception as e:
+            names = ', '.join(payload['stream_name'] for payload in payloads)
+            logging.error(f"Error publishing frames to {names}: {str(e)}")
+
+    async def remove_stream(self, site: str, camera: str) -> None:
+        """
+        Delete the frame stream of a camera and its camera index entry.
+
+        Args:
+            site (str): The site of the camera.
+            camera (str): The name of the camera.
+        """
+        site_key = f"{self.camera_index_key}:{site}"
+        try:
+            async with self.pipeline(transaction=True) as pipe:
+                pipe.delete(f"{site}_{camera}")
+                pipe.hdel(site_key, camera)
+                pipe.hlen(site_key)
+                *_, remaining = await pipe.execute()
+            if not remaining:
+                await self.redis.hdel(self.camera_index_key, site)
+        except Exception as e:
+            logging.error(
+                f"Error removing stream {site}_{camera}: {str(e)}",
+            )
+
+    async def memory_report(self) -> dict[str, int]:
+        """
+        Measure the Redis memory used by the stream of each indexed camera.
+
+        Returns:
+            dict[str, int]: Bytes used per stream key, largest first.
+        """
+        try:
+            sites = await self.redis.hkeys(self.camera_index_key)
+            async with self.pipeline() as pipe:
+                for site in sites:
+                    pipe.hgetall(
+                        f"{self.camera_index_key}:{site.decode('utf-8')}",
+                    )
+                cameras = await pipe.execute()
+            keys = [
+                json.loads(value)['stream']
+                for entries in cameras
+                for value in entries.values()
+            ]
+            async with self.pipeline() as pipe:
+                for key in keys:
+                    pipe.memory_usage(key, samples=0)
+                usages = await pipe.execute()
+        except Exception as e:
+            logging.error(f"Error measuring Redis memory: {str(e)}")
+            return {}
+        report = {key: int(usage or 0) for key, usage in zip(keys, usages)}
+        return dict(
+            sorted(report.items(), key=lambda item: item[1], reverse=True),
+        )
+
     async def read_from_stream(
         self,
         stream_name: str,
@@ -0,0 +1,512 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterable
+from multiprocessing import Process
+from multiprocessing import Queue
+
+# Coroutine function processing one stream, given its configuration and
+# a queue of ('config', config) and ('rate', fps) messages to apply while
+# it runs
+StreamTarget = Callable[[dict, asyncio.Queue], Awaitable[None]]
+
+# Coroutine function run by each worker before it exits
+WorkerCleanup = Callable[[], Awaitable[None]]
+
+# Function run by each worker as it starts, given its index. Its result,
+# if any, is sent to the pool as a 'layout' report.
+WorkerInitializer = Callable[[int], dict | None]
+
+# Queue of the reports sent by the streams of this worker to the pool
+reports: Queue | None = None
+
+
+def send_report(report: dict) -> None:
+    """
+    Send a report from a stream to the pool, e.g. its recent activity.
+
+    Does nothing outside of a worker process.
+
+    Args:
+        report (dict): The report; must be picklable.
+    """
+    if reports is not None:
+        reports.put_nowait(report)
+
+
+def worker_count(
+    max_workers: int | None = None,
+    memory_per_worker_mb: int | None = None,
+) -> int:
+    """
+    Get the number of worker processes the machine can run.
+
+    Args:
+        max_workers (int | None): A fixed number of workers. Defaults to
+            the WORKER_PROCESSES environment variable, or 0 to size the
+            pool by the number of cores and the memory of the machine.
+        memory_per_worker_mb (int | None): The memory one worker needs
+            for its models and frames. Defaults to WORKER_MEMORY_MB,
+            or 2048.
+
+    Returns:
+        int: The number of workers, at least 1.
+    """
+    max_workers = max_workers or int(os.getenv('WORKER_PROCESSES', 0))
+    if max_workers > 0:
+        return max_workers
+
+    cpus = os.cpu_count() or 1
+    memory_per_worker_mb = memory_per_worker_mb or int(
+        os.getenv('WORKER_MEMORY_MB', 2048),
+    )
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        # Physical memory is unknown, e.g. on Windows
+        return cpus
+    return max(1, min(cpus, memory // (memory_per_worker_mb * 1024 * 1024)))
+
+
+def assign_streams(
+    streams: Iterable[str],
+    assignments: dict[str, int],
+    workers: int,
+) -> dict[str, int]:
+    """
+    Balance streams over workers, moving as few streams as possible.
+
+    Each worker gets the same number of streams, give or take one.
+    Streams keep their current worker unless it has more than its share.
+
+    Args:
+        streams (Iterable[str]): The streams to run.
+        assignments (dict[str, int]): The current worker of each stream.
+        workers (int): The number of workers available.
+
+    Returns:
+        dict[str, int]: The worker of each stream.
+    """
+    streams = list(streams)
+    if not streams:
+        return {}
+    workers = max(1, min(workers, len(streams)))
+
+    # Streams that may stay on their current worker, grouped by worker
+    kept: dict[int, list[str]] = {worker: [] for worker in range(workers)}
+    for stream in streams:
+        worker = assignments.get(stream)
+        if worker is not None and worker < workers:
+            kept[worker].append(stream)
+
+    # The workers running the most streams get the larger shares
+    share, extra = divmod(len(streams), workers)
+    by_load = sorted(kept, key=lambda worker: len(kept[worker]), reverse=True)
+    capacity = {
+        worker: share + (1 if rank < extra else 0)
+        for rank, worker in enumerate(by_load)
+    }
+
+    result: dict[str, int] = {}
+    for worker, worker_streams in kept.items():
+        for stream in worker_streams[:capacity[worker]]:
+            result[stream] = worker
+
+    # Move the remaining streams to the least loaded workers
+    loads = {worker: 0 for worker in range(workers)}
+    for worker in result.values():
+        loads[worker] += 1
+    for stream in streams:
+        if stream in result:
+            continue
+        worker = min(
+            (w for w in range(workers) if loads[w] < capacity[w]),
+            key=lambda w: loads[w],
+        )
+        result[stream] = worker
+        loads[worker] += 1
+    return result
+
+
+async def stop_task(tasks: dict[str, asyncio.Task], name: str) -> None:
+    """
+    Cancel a stream task and wait for its cleanup to finish.
+
+    Args:
+        tasks (dict[str, asyncio.Task]): The running tasks by stream.
+        name (str): The stream of the task to stop.
+    """
+    task = tasks.pop(name, None)
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def log_task_result(task: asyncio.Task) -> None:
+    """
+    Log why a stream task ended, unless it was stopped.
+
+    Args:
+        task (asyncio.Task): The finished task.
+    """
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logging.error(
+            f"Stream {task.get_name()} failed: {task.exception()!r}",
+        )
+    else:
+        logging.info(f"Stream {task.get_name()} ended")
+
+
+async def serve(
+    commands: Queue,
+    target: StreamTarget,
+    cleanup: WorkerCleanup | None = None,
+    restart_delay: float | None = None,
+) -> None:
+    """
+    Run the streams sent to a worker as coroutines of one event loop.
+
+    Commands are ``('start', config)``, which (re)starts the stream of
+    ``config['video_url']``, ``('update', config)``, which passes the
+    changed config to the running stream, ``('rate', {video_url: fps})``,
+    which sets the detection rate of running streams,
+    ``('stop', video_url)`` and ``('shutdown', None)``.
+
+    A stream that fails is restarted after ``restart_delay`` seconds with
+    its latest config and rate, unless it is started or stopped again in
+    the meantime.
+
+    Args:
+        commands (Queue): The commands sent by the pool.
+        target (StreamTarget): Processes one stream.
+        cleanup (WorkerCleanup | None): Run once all streams stopped.
+        restart_delay (float | None): The seconds to wait before
+            restarting a failed stream. Defaults to the
+            STREAM_RESTART_DELAY environment variable, or 10.
+    """
+    if restart_delay is None:
+        restart_delay = float(os.getenv('STREAM_RESTART_DELAY', 10))
+    loop = asyncio.get_running_loop()
+    tasks: dict[str, asyncio.Task] = {}
+    updates: dict[str, asyncio.Queue] = {}
+    configs: dict[str, dict] = {}
+    rates: dict[str, float] = {}
+    restarts: dict[str, asyncio.TimerHandle] = {}
+
+    def start(config: dict) -> None:
+        video_url = config['video_url']
+        restarts.pop(video_url, None)
+        updates[video_url] = asyncio.Queue()
+        if video_url in rates:
+            updates[video_url].put_nowait(('rate', rates[video_url]))
+        task = loop.create_task(
+            target(config, updates[video_url]), name=video_url,
+        )
+        task.add_done_callback(log_task_result)
+        task.add_done_callback(ended)
+        tasks[video_url] = task
+
+    def ended(task: asyncio.Task) -> None:
+        # Stopped and restarted tasks were already replaced
+        video_url = task.get_name()
+        if task.cancelled() or tasks.get(video_url) is not task:
+            return
+        # Commands for the stream are dropped until it is restarted
+        del tasks[video_url]
+        del updates[video_url]
+        if task.exception() is not None:
+            logging.info(
+                f"Restarting stream {video_url} in {restart_delay:g}s",
+            )
+            # Restart with the config of the latest update, if any
+            restarts[video_url] = loop.call_later(
+                restart_delay, lambda: start(configs[video_url]),
+            )
+
+    def forget(video_url: str) -> None:
+        handle = restarts.pop(video_url, None)
+        if handle is not None:
+            handle.cancel()
+
+    try:
+        while True:
+            command, payload = await loop.run_in_executor(
+                None, commands.get,
+            )
+            if command == 'start':
+                video_url = payload['video_url']
+                forget(video_url)
+                await stop_task(tasks, video_url)
+                configs[video_url] = payload
+                start(payload)
+            elif command == 'update':
+                video_url = payload['video_url']
+                if video_url in tasks:
+                    updates[video_url].put_nowait(('config', payload))
+                if video_url in configs:
+                    configs[video_url] = payload
+            elif command == 'rate':
+                for video_url, rate in payload.items():
+                    if video_url in tasks:
+                        updates[video_url].put_nowait(('rate', rate))
+                    if video_url in configs:
+                        rates[video_url] = rate
+            elif command == 'stop':
+                forget(payload)
+                await stop_task(tasks, payload)
+                updates.pop(payload, None)
+                configs.pop(payload, None)
+                rates.pop(payload, None)
+            else:
+                break
+    finally:
+        for video_url in list(restarts):
+            forget(video_url)
+        for video_url in list(tasks):
+            await stop_task(tasks, video_url)
+        if cleanup is not None:
+            await cleanup()
+
+
+def run_worker(
+    commands: Queue,
+    target: StreamTarget,
+    cleanup: WorkerCleanup | None = None,
+    report_queue: Queue | None = None,
+    initializer: WorkerInitializer | None = None,
+    worker: int = 0,
+) -> None:
+    """
+    Entry point of a worker process.
+
+    Args:
+        commands (Queue): The commands sent by the pool.
+        target (StreamTarget): Processes one stream.
+        cleanup (WorkerCleanup | None): Run once all streams stopped.
+        report_queue (Queue | None): The queue of ``send_report``.
+        initializer (WorkerInitializer | None): Run before any stream.
+        worker (int): The index of the worker.
+    """
+    global reports
+    reports = report_queue
+    if initializer is not None:
+        layout = initializer(worker)
+        if layout is not None:
+            send_report({'type': 'layout', **layout})
+    asyncio.run(serve(commands, target, cleanup))
+
+
+class WorkerPool:
+    """
+    A fixed pool of worker processes, each running many streams.
+
+    Streams are assigned to workers by their video URL and rebalanced
+    when the configuration changes. Workers are started on first use.
+    """
+
+    def __init__(
+        self,
+        target: StreamTarget,
+        max_workers: int | None = None,
+        cleanup: WorkerCleanup | None = None,
+        initializer: WorkerInitializer | None = None,
+    ) -> None:
+        """
+        Initialise the pool.
+
+        Args:
+            target (StreamTarget): Processes one stream in a worker.
+            max_workers (int | None): The number of workers; see
+                ``worker_count`` for the default.
+            cleanup (WorkerCleanup | None): Run by each worker before
+                it exits, e.g. to close its connections.
+            initializer (WorkerInitializer | None): Run by each worker
+                as it starts, e.g. to set its CPU affinity.
+        """
+        self.target = target
+        self.cleanup = cleanup
+        self.initializer = initializer
+        self.max_workers: int = worker_count(max_workers)
+        self.workers: dict[int, tuple[Process, Queue]] = {}
+        self.assignments: dict[str, int] = {}
+        self.configs: dict[str, dict] = {}
+        # Detection rate of each stream, in frames per second
+        self.rates: dict[str, float] = {}
+        # Reports sent by the streams with send_report
+        self.reports: Queue = Queue()
+
+    def spawn(self, worker: int) -> Queue:
+        """
+        Start a worker process.
+
+        Args:
+            worker (int): The index of the worker.
+
+        Returns:
+            Queue: The command queue of the worker.
+        """
+        commands: Queue = Queue()
+        process = Process(
+            target=run_worker,
+            args=(
+                commands, self.target, self.cleanup, self.reports,
+                self.initializer, worker,
+            ),
+            name=f"stream-worker-{worker}",
+        )
+        process.start()
+        self.workers[worker] = (process, commands)
+        return commands
+
+    def send(self, worker: int, command: str, payload: object) -> None:
+        """
+        Send a command to a worker, starting the worker if needed.
+
+        Args:
+            worker (int): The index of the worker.
+            command (str): 'start', 'update', 'rate', 'stop' or
+                'shutdown'.
+            payload (object): The config or video URL of the stream.
+        """
+        if worker in self.workers:
+            commands = self.workers[worker][1]
+        else:
+            commands = self.spawn(worker)
+        commands.put((command, payload))
+        if command == 'start' and payload['video_url'] in self.rates:
+            # Restarted streams keep their detection rate
+            video_url = payload['video_url']
+            commands.put(('rate', {video_url: self.rates[video_url]}))
+
+    def set_rates(self, rates: dict[str, float]) -> None:
+        """
+        Send the changed detection rates to the workers of the streams.
+
+        Args:
+            rates (dict[str, float]): Frames per second of each stream.
+        """
+        by_worker: dict[int, dict[str, float]] = {}
+        for video_url, rate in rates.items():
+            worker = self.assignments.get(video_url)
+            if worker is None or self.rates.get(video_url) == rate:
+                continue
+            self.rates[video_url] = rate
+            by_worker.setdefault(worker, {})[video_url] = rate
+        for worker, worker_rates in by_worker.items():
+            self.send(worker, 'rate', worker_rates)
+
+    def drain_reports(self) -> list[dict]:
+        """
+        Get the reports the streams sent since the last call.
+
+        Returns:
+            list[dict]: The reports, oldest first.
+        """
+        drained = []
+        while True:
+            try:
+                drained.append(self.reports.get_nowait())
+            except queue.Empty:
+                return drained
+
+    def update(
+        self,
+        configs: dict[str, dict],
+        changed: Iterable[str] = (),
+        updated: Iterable[str] = (),
+    ) -> None:
+        """
+        Run the given streams, rebalancing them over the workers.
+
+        Args:
+            configs (dict[str, dict]): The config of each stream to run,
+                keyed by video URL.
+            changed (Iterable[str]): Running streams whose config changed
+                and must be restarted.
+            updated (Iterable[str]): Running streams whose config changed
+                and can be applied without a restart.
+        """
+        changed = set(changed)
+        updated = set(updated)
+        assignments = assign_streams(
+            configs, self.assignments, self.max_workers,
+        )
+
+        # Stop removed streams and streams moving to another worker
+        for video_url, worker in self.assignments.items():
+            if assignments.get(video_url) != worker:
+                self.send(worker, 'stop', video_url)
+
+        # Start new, moved and changed streams
+        for video_url, worker in assignments.items():
+            if (
+                self.assignments.get(video_url) != worker
+                or video_url in changed
+            ):
+                self.send(worker, 'start', configs[video_url])
+            elif video_url in updated:
+                self.send(worker, 'update', configs[video_url])
+
+        self.assignments = assignments
+        self.configs = dict(configs)
+        self.rates = {
+            video_url: rate
+            for video_url, rate in self.rates.items()
+            if video_url in configs
+        }
+
+    def respawn(self) -> list[int]:
+        """
+        Restart dead workers along with the streams assigned to them.
+
+        Returns:
+            list[int]: The indices of the restarted workers.
+        """
+        restarted = []
+        for worker, (process, _) in list(self.workers.items()):
+            if process.is_alive():
+                continue
+            logging.error(
+                f"Worker {worker} exited with code {process.exitcode}",
+            )
+            del self.workers[worker]
+            streams = [
+                video_url
+                for video_url, assigned in self.assignments.items()
+                if assigned == worker
+            ]
+            if not streams:
+                continue
+            for video_url in streams:
+                self.send(worker, 'start', self.configs[video_url])
+            restarted.append(worker)
+        return restarted
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """
+        Stop all streams and workers.
+
+        Args:
+            timeout (float): Seconds to wait for each worker to clean up
+                before it is terminated.
+        """
+        for process, commands in self.workers.values():
+            if process.is_alive():
+                commands.put(('shutdown', None))
+        for process, _ in self.workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.workers.clear()
+        self.assignments.clear()
+        self.configs.clear()
+        self.rates.clear()
@@ -90,32 +90,93 @@ class TestRoutes(unittest.TestCase):
         )
         self.assertEqual(response.data.decode(), 'rendered_template')
 
-    def test_image_not_found(self) -> None:
+    @patch('examples.streaming_web.routes.get_latest_frames')
+    def test_image_not_found(self, mock_get_latest_frames: MagicMock) -> None:
         """
         Test the image route to ensure it returns a 404 error
         if the image is not found in Redis.
         """
-        self.mock_redis_instance.get.return_value = None
+        mock_get_latest_frames.return_value = {}
 
         response = self.client.get('/image/test_label/test_image.png')
 
         self.assertEqual(response.status_code, 404)
 
-    def test_image_found(self) -> None:
+    @patch('examples.streaming_web.routes.get_latest_frames')
+    def test_image_found(self, mock_get_latest_frames: MagicMock) -> None:
         """
         Test the image route to ensure it returns
-        the correct image data when found in Redis.
+        the latest frame of the stream when found in Redis.
         """
-        self.mock_redis_instance.get.return_value = b'image_data'
+        mock_get_latest_frames.return_value = {
+            'test_label_test_image': ('1-0', {b'frame': b'image_data'}),
+        }
 
         response = self.client.get('/image/test_label/test_image.png')
 
-        self.mock_redis_instance.get.assert_called_once_with(
-            'test_label_test_image',
+        mock_get_latest_frames.assert_called_once_with(
+            self.mock_redis_instance, ['test_label_test_image'],
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data, b'image_data')
         self.assertEqual(response.headers['Content-Type'], 'image/png')
+        self.assertEqual(response.headers['ETag'], '"1-0"')
+        self.assertEqual(
+            response.headers['Last-Modified'],
+            'Thu, 01 Jan 1970 00:00:00 GMT',
+        )
+
+    @patch('examples.streaming_web.routes.get_latest_frames')
+    def test_image_not_modified(
+        self, mock_get_latest_frames: MagicMock,
+    ) -> None:
+        """
+        Test that unchanged frames are answered with 304 Not Modified.
+        """
+        mock_get_latest_frames.return_value = {
+            'test_label_test_image': (
+                '1700000000000-0', {b'frame': b'image_data'},
+            ),
+        }
+
+        response = self.client.get(
+            '/image/test_label/test_image.png',
+            headers={'If-None-Match': '"1700000000000-0"'},
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        response = self.client.get(
+            '/image/test_label/test_image.png',
+            headers={'If-Modified-Since': 'Tue, 14 Nov 2023 22:13:20 GMT'},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # A newer frame is sent in full
+        response = self.client.get(
+            '/image/test_label/test_image.png',
+            headers={'If-None-Match': '"1699999999000-0"'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'image_data')
+
+    @patch('examples.streaming_web.routes.generate_mjpeg')
+    def test_mjpeg_stream(self, mock_generate_mjpeg: MagicMock) -> None:
+        """
+        Test the MJPEG route streams the multipart parts of the camera.
+        """
+        mock_generate_mjpeg.return_value = iter([b'part1', b'part2'])
+
+        response = self.client.get('/stream/test_label/test_camera.mjpg')
+
+        mock_generate_mjpeg.assert_called_once_with(
+            self.mock_redis_instance, 'test_label_test_camera',
+        )
+        self.assertEqual(
+            response.headers['Content-Type'],
+            'multipart/x-mixed-replace; boundary=frame',
+        )
+        self.assertEqual(response.data, b'part1part2')
 
     @patch('examples.streaming_web.routes.render_template')
     def test_camera_page(self, mock_render_template: MagicMock) -> None:
@@ -132,6 +193,17 @@ class TestRoutes(unittest.TestCase):
         )
         self.assertEqual(response.data.decode(), 'rendered_template')
 
+    @patch('examples.streaming_web.routes.frame_cache')
+    def test_frame_cache_stats(self, mock_frame_cache: MagicMock) -> None:
+        """
+        Test the frame cache statistics route.
+        """
+        mock_frame_cache.stats.return_value = {'hits': 3, 'hit_rate': 0.75}
+
+        response = self.client.get('/stats/frame-cache')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'hits': 3, 'hit_rate': 0.75})
 
 if __name__ == '__main__':
     unittest.main()
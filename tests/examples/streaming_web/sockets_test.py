@@ -7,6 +7,7 @@ from unittest.mock import patch
 from flask import Flask
 from flask_socketio import SocketIO
 
+from examples.streaming_web.sockets import refresh_stream_ids
 from examples.streaming_web.sockets import register_sockets
 from examples.streaming_web.sockets import update_images
 
@@ -26,7 +27,9 @@ class TestSockets(TestCase):
 
         # Register sockets to the SocketIO instance with mock Redis
         with self.app.app_context():
-            register_sockets(self.socketio, self.redis_mock)
+            self.broadcaster = register_sockets(
+                self.socketio, self.redis_mock,
+            )
 
     @patch('examples.streaming_web.sockets.emit')
     def test_handle_connect(self, mock_emit: MagicMock) -> None:
@@ -72,56 +75,227 @@ class TestSockets(TestCase):
             f"Error: {{'data': '{error_message}'}}",
         )
 
+    @patch('builtins.print')
+    @patch('examples.streaming_web.sockets.mark_viewed')
+    @patch('examples.streaming_web.sockets.read_new_frames')
+    @patch('examples.streaming_web.sockets.get_latest_frames')
+    @patch('examples.streaming_web.sockets.get_cameras')
     @patch('examples.streaming_web.sockets.get_labels')
-    @patch('examples.streaming_web.sockets.get_image_data')
     @patch('examples.streaming_web.sockets.SocketIO.emit')
     @patch('examples.streaming_web.sockets.SocketIO.sleep')
     def test_update_images(
-        self, mock_sleep: MagicMock, mock_emit: MagicMock,
-        mock_get_image_data: MagicMock, mock_get_labels: MagicMock,
+        self,
+        mock_sleep: MagicMock,
+        mock_emit: MagicMock,
+        mock_get_labels: MagicMock,
+        mock_get_cameras: MagicMock,
+        mock_get_latest_frames: MagicMock,
+        mock_read_new_frames: MagicMock,
+        mock_mark_viewed: MagicMock,
+        mock_print: MagicMock,
     ) -> None:
         """
-        Test the 'update_images' function to
-        ensure labels and images are emitted correctly.
+        Test the 'update_images' function to ensure new frames are
+        emitted per label as binary attachments as they arrive.
         """
-        # Mock the behavior of get_labels and get_image_data
-        mock_get_labels.return_value = ['label1', 'label2']
-        mock_get_image_data.side_effect = [
-            [(b'image_data1', 'image1.png')],
-            [(b'image_data2', 'image2.png')],
+        mock_get_labels.return_value = ['Factory_1', 'label2']
+        mock_get_cameras.return_value = {
+            'Factory_1_camera_1': ('Factory_1', 'camera_1'),
+            'label2_image2': ('label2', 'image2'),
+        }
+        mock_get_latest_frames.return_value = {
+            'Factory_1_camera_1': ('1-0', {b'frame': b'old'}),
+        }
+        # One batch of new frames, then stop the loop
+        mock_read_new_frames.side_effect = [
+            {
+                'Factory_1_camera_1': (
+                    '2-0', {b'frame': b'\xff\xd8\xffjpeg'},
+                ),
+                'label2_image2': ('3-0', {
+                    b'frame': b'\x89PNG',
+                    b'detections': b'[[1.0,2.0,3.0,4.0,0.9,5]]',
+                    b'polygons': b'[]',
+                    b'annotated': b'0',
+                }),
+            },
+            RuntimeError('stop'),
         ]
 
-        # Limit loop iterations for test
-        with patch(
-            'examples.streaming_web.sockets.update_images',
-            side_effect=StopIteration,
-        ):
-            try:
-                update_images(self.socketio, self.redis_mock)
-            except StopIteration:
-                pass
-
-        # Ensure sleep is called with 10 seconds
-        self.assertEqual(mock_sleep.call_count, 2)
-        mock_sleep.assert_called_with(10)
-
-        # Check that emit was called correctly for each label
+        update_images(self.socketio, self.redis_mock, block=500)
+
+        # New streams start from their latest entry, empty ones from 0-0
+        last_ids = mock_read_new_frames.call_args_list[0].args[1]
+        self.assertEqual(
+            mock_read_new_frames.call_args_list[0].args[2], 500,
+        )
+        self.assertEqual(
+            set(last_ids), {'Factory_1_camera_1', 'label2_image2'},
+        )
+        mock_get_cameras.assert_called_once_with(
+            self.redis_mock, ['Factory_1', 'label2'],
+        )
+        mock_mark_viewed.assert_called_once_with(
+            self.redis_mock, ['Factory_1_camera_1', 'label2_image2'],
+        )
+
         mock_emit.assert_any_call(
             'update',
             {
-                'label': 'label1',
-                'images': [b'image_data1'],
-                'image_names': ['image1.png'],
+                'label': 'Factory_1',
+                'images': [b'\xff\xd8\xffjpeg'],
+                'image_names': ['camera_1'],
+                'mime_types': ['image/jpeg'],
+                'metadata': [
+                    {'annotated': True, 'detections': [], 'polygons': []},
+                ],
             },
+            to='Factory_1',
         )
         mock_emit.assert_any_call(
             'update',
             {
                 'label': 'label2',
-                'images': [b'image_data2'],
-                'image_names': ['image2.png'],
+                'images': [b'\x89PNG'],
+                'image_names': ['image2'],
+                'mime_types': ['image/png'],
+                'metadata': [
+                    {
+                        'annotated': False,
+                        'detections': [[1.0, 2.0, 3.0, 4.0, 0.9, 5]],
+                        'polygons': [],
+                    },
+                ],
             },
+            to='label2',
+        )
+        mock_print.assert_called_once_with('Error updating images: stop')
+
+    @patch('examples.streaming_web.sockets.get_latest_frames')
+    def test_refresh_stream_ids(
+        self,
+        mock_get_latest_frames: MagicMock,
+    ) -> None:
+        """
+        Test that known streams keep their position, new streams start
+        from their latest entry and removed streams are dropped.
+        """
+        mock_get_latest_frames.return_value = {'a_2': ('7-0', {})}
+
+        result = refresh_stream_ids(
+            self.redis_mock,
+            {'a_1': '5-0', 'a_gone': '1-0'},
+            ['a_1', 'a_2', 'a_3'],
+        )
+
+        mock_get_latest_frames.assert_called_once_with(
+            self.redis_mock, ['a_2', 'a_3'],
+        )
+        self.assertEqual(result, {'a_1': '5-0', 'a_2': '7-0', 'a_3': '0-0'})
+
+    @patch('examples.streaming_web.sockets.mark_viewed')
+    @patch('examples.streaming_web.sockets.read_new_frames')
+    @patch('examples.streaming_web.sockets.get_latest_frames')
+    @patch('examples.streaming_web.sockets.get_cameras')
+    @patch('examples.streaming_web.sockets.get_labels')
+    @patch('examples.streaming_web.sockets.SocketIO.sleep')
+    def test_update_images_active_labels(
+        self,
+        mock_sleep: MagicMock,
+        mock_get_labels: MagicMock,
+        mock_get_cameras: MagicMock,
+        mock_get_latest_frames: MagicMock,
+        mock_read_new_frames: MagicMock,
+        mock_mark_viewed: MagicMock,
+    ) -> None:
+        """
+        Test that only the streams of subscribed labels are read.
+        """
+        mock_get_cameras.return_value = {'label2_image2': ('label2', 'image2')}
+        mock_get_latest_frames.return_value = {}
+        mock_read_new_frames.side_effect = RuntimeError('stop')
+
+        with patch('builtins.print'):
+            update_images(
+                self.socketio, self.redis_mock,
+                active_labels=lambda: {'label2'},
+            )
+
+        # Only the subscribed site is looked up in the index
+        mock_get_labels.assert_not_called()
+        mock_get_cameras.assert_called_once_with(self.redis_mock, ['label2'])
+        last_ids = mock_read_new_frames.call_args.args[1]
+        self.assertEqual(last_ids, {'label2_image2': '0-0'})
+        mock_mark_viewed.assert_called_once_with(
+            self.redis_mock, ['label2_image2'],
+        )
+
+    @patch('examples.streaming_web.sockets.SocketIO.start_background_task')
+    def test_broadcaster_subscriptions(
+        self, mock_start_background_task: MagicMock,
+    ) -> None:
+        """
+        Test that one background task serves all subscribed clients.
+        """
+        self.broadcaster.subscribe('sid1', 'label1')
+        self.broadcaster.subscribe('sid2', 'label1')
+        self.broadcaster.subscribe('sid2', 'label2')
+
+        mock_start_background_task.assert_called_once_with(
+            self.broadcaster.run,
         )
+        self.assertEqual(
+            self.broadcaster.active_labels(), {'label1', 'label2'},
+        )
+
+        self.broadcaster.unsubscribe('sid2', 'label2')
+        self.assertEqual(self.broadcaster.active_labels(), {'label1'})
+        self.broadcaster.unsubscribe('sid1')
+        self.broadcaster.unsubscribe('sid2')
+        self.assertEqual(self.broadcaster.active_labels(), set())
+
+    @patch('examples.streaming_web.sockets.update_images')
+    def test_broadcaster_restarts_after_failure(
+        self, mock_update_images: MagicMock,
+    ) -> None:
+        """
+        Test that the broadcaster can be restarted once its task ends.
+        """
+        mock_update_images.side_effect = RuntimeError('Redis down')
+        self.broadcaster.task = object()
+
+        with self.assertRaises(RuntimeError):
+            self.broadcaster.run()
+
+        self.assertIsNone(self.broadcaster.task)
+
+    @patch('examples.streaming_web.sockets.FrameBroadcaster.start')
+    def test_handle_subscribe(self, mock_start: MagicMock) -> None:
+        """
+        Test that subscribing joins the label room and tracks the client.
+        """
+        client = self.socketio.test_client(self.app)
+        client.emit('subscribe', {'label': 'label1'})
+
+        self.assertEqual(self.broadcaster.active_labels(), {'label1'})
+        mock_start.assert_called_once()
+
+        # Room broadcasts reach the subscribed client
+        client.get_received()
+        self.socketio.emit('update', {'label': 'label1'}, to='label1')
+        self.socketio.emit('update', {'label': 'label2'}, to='label2')
+        received = client.get_received()
+        self.assertEqual(
+            [msg['args'][0]['label'] for msg in received], ['label1'],
+        )
+
+        client.emit('unsubscribe', {'label': 'label1'})
+        self.assertEqual(self.broadcaster.active_labels(), set())
+
+        client.emit('subscribe', {'label': 'label2'})
+        with patch('builtins.print'):
+            client.disconnect()
+        self.assertEqual(self.broadcaster.active_labels(), set())
 
     def tearDown(self) -> None:
         """
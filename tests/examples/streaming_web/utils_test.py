@@ -1,14 +1,31 @@
 from __future__ import annotations
 
 import unittest
+from datetime import datetime
+from datetime import timezone
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import cv2
+import numpy as np
 import redis
 
+from examples.streaming_web.utils import build_multipart_frame
 from examples.streaming_web.utils import encode_image
+from examples.streaming_web.utils import entry_timestamp
+from examples.streaming_web.utils import frame_cache
+from examples.streaming_web.utils import FrameCache
+from examples.streaming_web.utils import generate_mjpeg
+from examples.streaming_web.utils import get_cameras
+from examples.streaming_web.utils import get_frame_metadata
 from examples.streaming_web.utils import get_image_data
 from examples.streaming_web.utils import get_labels
+from examples.streaming_web.utils import get_latest_frames
+from examples.streaming_web.utils import get_mimetype
+from examples.streaming_web.utils import mark_viewed
+from examples.streaming_web.utils import read_new_frames
+from examples.streaming_web.utils import to_jpeg
+from examples.streaming_web.utils import VIEWER_HEARTBEAT_TTL
 
 
 class TestUtils(unittest.TestCase):
@@ -21,6 +38,7 @@ class TestUtils(unittest.TestCase):
         Set up the test environment before each test.
         """
         self.redis_mock = MagicMock(spec=redis.Redis)
+        frame_cache.clear()
 
     def tearDown(self) -> None:
         """
@@ -30,47 +48,134 @@ class TestUtils(unittest.TestCase):
 
     def test_get_labels(self) -> None:
         """
-        Test the get_labels function to ensure it returns expected labels.
-        """
-        # Mock the Redis scan method to return some keys
-        self.redis_mock.scan.return_value = (
-            0, [
-                b'label1_image1',
-                b'label1_image2',
-                b'label2_image1',
-                b'test_image',
-                b'__invalid_key',
-                b'_another_invalid_key',
-                b'label3_image1',
-            ],
-        )
+        Test the get_labels function to ensure it lists the indexed sites.
+        """
+        self.redis_mock.hkeys.return_value = [
+            b'Factory_1', b'label2', b'test', b'label1',
+        ]
+        pipe = self.redis_mock.pipeline.return_value
+        pipe.execute.return_value = [1, 1, 1]
 
-        # Call the function
         result = get_labels(self.redis_mock)
 
-        # Check the expected result
-        expected_result = ['label1', 'label2', 'label3']
-        self.assertEqual(result, expected_result)
+        self.redis_mock.hkeys.assert_called_once_with('_cameras')
+        self.redis_mock.scan.assert_not_called()
+        self.redis_mock.hdel.assert_not_called()
+        self.assertEqual(result, ['Factory_1', 'label1', 'label2'])
 
-    def test_get_image_data(self) -> None:
+    def test_get_labels_prunes_expired_sites(self) -> None:
         """
-        Test the get_image_data function
-        to ensure it returns correct image data.
+        Test that sites whose camera hash expired are dropped.
         """
-        # Mock the Redis scan method to return keys matching the label
-        label = 'label1'
-        self.redis_mock.scan.return_value = (
-            0, [
-                b'label1_image1',
-                b'label1_image2',
-            ],
+        self.redis_mock.hkeys.return_value = [b'Factory_1', b'idle']
+        pipe = self.redis_mock.pipeline.return_value
+        pipe.execute.return_value = [1, 0]
+
+        result = get_labels(self.redis_mock)
+
+        pipe.exists.assert_any_call('_cameras:idle')
+        self.redis_mock.hdel.assert_called_once_with('_cameras', 'idle')
+        self.assertEqual(result, ['Factory_1'])
+
+    def test_get_cameras(self) -> None:
+        """
+        Test looking up the camera streams of sites in the index.
+        """
+        pipe = self.redis_mock.pipeline.return_value
+        pipe.execute.return_value = [
+            {
+                b'camera_1': (
+                    b'{"stream":"Factory_1_camera_1","timestamp":1.0}'
+                ),
+            },
+            {},
+        ]
+
+        result = get_cameras(self.redis_mock, ['Factory_1', 'empty'])
+
+        pipe.hgetall.assert_any_call('_cameras:Factory_1')
+        pipe.hgetall.assert_any_call('_cameras:empty')
+        self.assertEqual(
+            result, {'Factory_1_camera_1': ('Factory_1', 'camera_1')},
+        )
+        self.assertEqual(get_cameras(self.redis_mock, []), {})
+
+    def test_get_latest_frames(self) -> None:
+        """
+        Test that the latest entry of each stream is read in one pipeline.
+        """
+        pipe = self.redis_mock.pipeline.return_value
+        pipe.execute.return_value = [
+            [(b'2-0', {b'frame': b'image_data_1'})],
+            [],
+        ]
+
+        result = get_latest_frames(
+            self.redis_mock, ['label1_image1', 'label1_image2'],
         )
 
-        # Mock the Redis get method to return image data
-        self.redis_mock.get.side_effect = [
-            b'image_data_1',
-            b'image_data_2',
+        pipe.xrevrange.assert_any_call('label1_image1', count=1)
+        pipe.xrevrange.assert_any_call('label1_image2', count=1)
+        self.assertEqual(
+            result, {'label1_image1': ('2-0', {b'frame': b'image_data_1'})},
+        )
+
+    def test_read_new_frames(self) -> None:
+        """
+        Test that only the newest new entry of each stream is returned.
+        """
+        self.redis_mock.xread.return_value = [
+            [
+                b'label1_image1', [
+                    (b'3-0', {b'frame': b'old'}),
+                    (b'4-0', {b'frame': b'new'}),
+                ],
+            ],
         ]
+        last_ids = {'label1_image1': '2-0', 'label1_image2': '1-0'}
+
+        result = read_new_frames(self.redis_mock, last_ids, 500)
+
+        # last_ids is passed to XREAD and then advanced in place
+        self.redis_mock.xread.assert_called_once_with(
+            streams=last_ids, block=500,
+        )
+        self.assertEqual(
+            result, {'label1_image1': ('4-0', {b'frame': b'new'})},
+        )
+        self.assertEqual(last_ids['label1_image1'], '4-0')
+        self.assertEqual(last_ids['label1_image2'], '1-0')
+
+    def test_read_new_frames_timeout(self) -> None:
+        """
+        Test that a timed out read returns no frames.
+        """
+        self.redis_mock.xread.return_value = None
+        self.assertEqual(
+            read_new_frames(self.redis_mock, {'label1_image1': '1-0'}), {},
+        )
+        self.assertEqual(read_new_frames(self.redis_mock, {}), {})
+
+    @patch('examples.streaming_web.utils.get_latest_frames')
+    @patch('examples.streaming_web.utils.get_cameras')
+    def test_get_image_data(
+        self,
+        mock_get_cameras: MagicMock,
+        mock_get_latest_frames: MagicMock,
+    ) -> None:
+        """
+        Test the get_image_data function
+        to ensure it returns the latest frame of each stream.
+        """
+        label = 'label1'
+        mock_get_cameras.return_value = {
+            'label1_image1': (label, 'image1'),
+            'label1_image2': (label, 'image2'),
+        }
+        mock_get_latest_frames.return_value = {
+            'label1_image2': ('2-0', {b'frame': b'image_data_2'}),
+            'label1_image1': ('1-0', {b'frame': b'image_data_1'}),
+        }
 
         # Call the function
         result = get_image_data(self.redis_mock, label)
@@ -81,29 +186,29 @@ class TestUtils(unittest.TestCase):
             (encode_image(b'image_data_2'), 'image2'),
         ]
         self.assertEqual(result, expected_result)
+        mock_get_cameras.assert_called_once_with(self.redis_mock, [label])
 
     @patch('examples.streaming_web.utils.encode_image', wraps=encode_image)
+    @patch('examples.streaming_web.utils.get_latest_frames')
+    @patch('examples.streaming_web.utils.get_cameras')
     def test_get_image_data_no_image(
         self,
+        mock_get_cameras: MagicMock,
+        mock_get_latest_frames: MagicMock,
         mock_encode_image: MagicMock,
     ) -> None:
         """
-        Test get_image_data function when some images are missing.
+        Test get_image_data function when some streams have no frame.
         """
-        # Mock the Redis scan method to return keys matching the label
         label = 'label1'
-        self.redis_mock.scan.return_value = (
-            0, [
-                b'label1_image1',
-                b'label1_image2',
-            ],
-        )
-
-        # Mock the Redis get method to return None for an image
-        self.redis_mock.get.side_effect = [
-            None,  # Simulate missing image
-            b'image_data_2',
-        ]
+        mock_get_cameras.return_value = {
+            'label1_image1': (label, 'image1'),
+            'label1_image2': (label, 'image2'),
+        }
+        mock_get_latest_frames.return_value = {
+            'label1_image1': ('1-0', {b'timestamp': b'0'}),
+            'label1_image2': ('2-0', {b'frame': b'image_data_2'}),
+        }
 
         # Call the function
         result = get_image_data(self.redis_mock, label)
@@ -117,6 +222,206 @@ class TestUtils(unittest.TestCase):
         # Ensure encode_image was called exactly once for the valid image
         mock_encode_image.assert_called_once_with(b'image_data_2')
 
+    def test_get_frame_metadata(self) -> None:
+        """
+        Test decoding the detections of a stream entry.
+        """
+        metadata = get_frame_metadata({
+            b'frame': b'image',
+            b'detections': b'[[1.0,2.0,3.0,4.0,0.9,5]]',
+            b'polygons': b'[[[0.0,0.0],[1.0,0.0],[1.0,1.0]]]',
+            b'annotated': b'0',
+        })
+        self.assertEqual(
+            metadata,
+            {
+                'annotated': False,
+                'detections': [[1.0, 2.0, 3.0, 4.0, 0.9, 5]],
+                'polygons': [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]]],
+            },
+        )
+
+        # Entries published before the metadata existed are annotated
+        self.assertEqual(
+            get_frame_metadata({b'frame': b'image'}),
+            {'annotated': True, 'detections': [], 'polygons': []},
+        )
+
+    def test_get_mimetype(self) -> None:
+        """
+        Test detecting the MIME type of encoded frames.
+        """
+        self.assertEqual(get_mimetype(b'\xff\xd8\xff\xe0'), 'image/jpeg')
+        self.assertEqual(
+            get_mimetype(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp',
+        )
+        self.assertEqual(get_mimetype(b'\x89PNG\r\n\x1a\n'), 'image/png')
+
+    def test_mark_viewed(self) -> None:
+        """
+        Test that viewer heartbeats are refreshed in one pipeline.
+        """
+        pipe = self.redis_mock.pipeline.return_value
+
+        mark_viewed(self.redis_mock, [b'label1_image1', 'label1_image2'])
+
+        self.redis_mock.pipeline.assert_called_once_with(transaction=False)
+        pipe.set.assert_any_call(
+            '_viewers:label1_image1', 1, ex=VIEWER_HEARTBEAT_TTL,
+        )
+        pipe.set.assert_any_call(
+            '_viewers:label1_image2', 1, ex=VIEWER_HEARTBEAT_TTL,
+        )
+        pipe.execute.assert_called_once()
+
+    def test_mark_viewed_no_keys(self) -> None:
+        """
+        Test that no round trip is made without keys.
+        """
+        mark_viewed(self.redis_mock, [])
+        self.redis_mock.pipeline.assert_not_called()
+
+    def test_entry_timestamp(self) -> None:
+        """
+        Test converting a stream entry ID to the time it was added.
+        """
+        self.assertEqual(
+            entry_timestamp('1700000000500-3'),
+            datetime(2023, 11, 14, 22, 13, 20, 500000, tzinfo=timezone.utc),
+        )
+
+    def test_build_multipart_frame(self) -> None:
+        """
+        Test the headers of a multipart MJPEG part.
+        """
+        self.assertEqual(
+            build_multipart_frame(b'\xff\xd8\xffjpeg'),
+            b'--frame\r\nContent-Type: image/jpeg\r\n'
+            b'Content-Length: 7\r\n\r\n\xff\xd8\xffjpeg\r\n',
+        )
+
+    def test_to_jpeg(self) -> None:
+        """
+        Test that WebP and PNG frames are converted for MJPEG clients.
+        """
+        frame = np.full((8, 8, 3), 128, dtype=np.uint8)
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        self.assertIs(to_jpeg(jpeg), jpeg)
+        for ext in ('.webp', '.png'):
+            image = cv2.imencode(ext, frame)[1].tobytes()
+            self.assertEqual(get_mimetype(to_jpeg(image)), 'image/jpeg')
+        self.assertIsNone(to_jpeg(b'RIFF\x00\x00\x00\x00WEBPbroken'))
+
+    @patch('examples.streaming_web.utils.mark_viewed')
+    @patch('examples.streaming_web.utils.read_new_frames')
+    @patch('examples.streaming_web.utils.get_latest_frames')
+    def test_generate_mjpeg(
+        self,
+        mock_get_latest_frames: MagicMock,
+        mock_read_new_frames: MagicMock,
+        mock_mark_viewed: MagicMock,
+    ) -> None:
+        """
+        Test that the latest frame is sent first, then new frames.
+        """
+        first, second = b'\xff\xd8\xfffirst', b'\xff\xd8\xffsecond'
+        mock_get_latest_frames.return_value = {
+            'label1_image1': ('1-0', {b'frame': first}),
+        }
+        mock_read_new_frames.side_effect = [
+            {},
+            {'label1_image1': ('2-0', {b'frame': second})},
+        ]
+
+        stream = generate_mjpeg(self.redis_mock, 'label1_image1', block=10)
+
+        self.assertEqual(next(stream), build_multipart_frame(first))
+        self.assertEqual(next(stream), build_multipart_frame(second))
+        self.assertEqual(
+            mock_read_new_frames.call_args_list[0].args[2], 10,
+        )
+        mock_mark_viewed.assert_called_with(
+            self.redis_mock, ['label1_image1'],
+        )
+
+    @patch('examples.streaming_web.utils.encode_image', wraps=encode_image)
+    @patch('examples.streaming_web.utils.get_latest_frames')
+    @patch('examples.streaming_web.utils.get_cameras')
+    def test_get_image_data_cached(
+        self,
+        mock_get_cameras: MagicMock,
+        mock_get_latest_frames: MagicMock,
+        mock_encode_image: MagicMock,
+    ) -> None:
+        """
+        Test that frames are only encoded once per stream entry.
+        """
+        mock_get_cameras.return_value = {'label1_image1': ('label1', 'a')}
+        mock_get_latest_frames.return_value = {
+            'label1_image1': ('1-0', {b'frame': b'image_data_1'}),
+        }
+
+        first = get_image_data(self.redis_mock, 'label1')
+        second = get_image_data(self.redis_mock, 'label1')
+
+        self.assertEqual(first, second)
+        mock_encode_image.assert_called_once_with(b'image_data_1')
+        self.assertEqual(frame_cache.stats()['hits'], 1)
+
+
+class TestFrameCache(unittest.TestCase):
+    """
+    Test suite for the memory-budgeted frame cache.
+    """
+
+    def test_hit_and_miss(self) -> None:
+        """
+        Test lookups and the hit rate.
+        """
+        cache = FrameCache(max_bytes=100)
+        self.assertIsNone(cache.get('a_1', '1-0'))
+        cache.put('a_1', '1-0', 'x' * 10)
+        self.assertEqual(cache.get('a_1', '1-0'), 'x' * 10)
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['bytes'], 10)
+
+    def test_newer_entry_replaces_older(self) -> None:
+        """
+        Test that only the newest entry of a stream is kept.
+        """
+        cache = FrameCache(max_bytes=100)
+        cache.put('a_1', '1-0', 'x' * 10)
+        cache.put('a_1', '2-0', 'y' * 20)
+
+        self.assertIsNone(cache.get('a_1', '1-0'))
+        self.assertEqual(cache.get('a_1', '2-0'), 'y' * 20)
+        self.assertEqual(cache.stats()['bytes'], 20)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_evicts_by_bytes(self) -> None:
+        """
+        Test that the least recently used frames are evicted over budget.
+        """
+        cache = FrameCache(max_bytes=25)
+        cache.put('a_1', '1-0', 'x' * 10)
+        cache.put('a_2', '1-0', 'y' * 10)
+        # Touch a_1 so a_2 is the least recently used
+        cache.get('a_1', '1-0')
+        cache.put('a_3', '1-0', 'z' * 10)
+
+        self.assertIsNone(cache.get('a_2', '1-0'))
+        self.assertIsNotNone(cache.get('a_1', '1-0'))
+        self.assertIsNotNone(cache.get('a_3', '1-0'))
+        self.assertEqual(cache.stats()['bytes'], 20)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        # Payloads larger than the whole budget are not cached
+        cache.put('a_4', '1-0', 'w' * 30)
+        self.assertIsNone(cache.get('a_4', '1-0'))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import unittest
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import numpy as np
+
+from main import MainApp
+from main import StreamWorkflow
+
+
+class TestStreamWorkflow(unittest.IsolatedAsyncioTestCase):
+    """
+    Unit tests for applying changed configurations to a running stream.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a workflow without a camera, detector or notifier.
+        """
+        for name in (
+            'StreamCapture', 'LiveStreamDetector', 'LineNotifier',
+            'TraceRecorder',
+        ):
+            patcher = patch(f"main.{name}", MagicMock())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('main.redis_manager', AsyncMock())
+        self.redis_manager = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.config = {
+            'video_url': 'rtsp://camera',
+            'site': 'site1',
+            'stream_name': 'gate',
+            'safety_rules': {'no_hardhat': False},
+            'encoding': {'live': {'format': 'jpeg', 'quality': 80}},
+        }
+        self.workflow = StreamWorkflow(
+            logging.getLogger('test'),
+            video_url='rtsp://camera',
+            site='site1',
+            stream_name='gate',
+            safety_rules=self.config['safety_rules'],
+            encoding=self.config['encoding'],
+        )
+
+    async def test_apply_update(self) -> None:
+        """
+        Test that valid rules and encodings replace the current ones.
+        """
+        config = dict(
+            self.config,
+            safety_rules={'no_safety_vest': False},
+            encoding={'live': {'format': 'webp', 'quality': 70}},
+        )
+        await self.workflow.apply_update(config)
+
+        self.assertEqual(self.workflow.safety_rules, {'no_safety_vest': False})
+        rules = self.workflow.danger_detector.safety_rules
+        self.assertTrue(rules['no_hardhat']['enabled'])
+        self.assertFalse(rules['no_safety_vest']['enabled'])
+        self.assertEqual(
+            self.workflow.frame_encoder.get_params('live')[0], '.webp',
+        )
+
+    async def test_invalid_update_keeps_current(self) -> None:
+        """
+        Test that invalid rules or encodings are logged and the current
+        ones kept.
+        """
+        danger_detector = self.workflow.danger_detector
+        zone_danger_detector = self.workflow.zone_danger_detector
+        frame_encoder = self.workflow.frame_encoder
+        config = dict(
+            self.config,
+            safety_rules={'no_hardhat': {'unknown': 1}},
+            encoding={'live': {'format': 'webp', 'quality': 0}},
+            stream_name='exit',
+        )
+        with self.assertLogs('test', level='ERROR') as logs:
+            await self.workflow.apply_update(config)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertIs(self.workflow.danger_detector, danger_detector)
+        self.assertIs(self.workflow.zone_danger_detector, zone_danger_detector)
+        self.assertIs(self.workflow.frame_encoder, frame_encoder)
+        self.assertEqual(
+            self.workflow.safety_rules, self.config['safety_rules'],
+        )
+        self.assertEqual(self.workflow.encoding, self.config['encoding'])
+        # The valid fields of the update are still applied
+        self.assertEqual(self.workflow.stream_name, 'exit')
+        self.redis_manager.remove_stream.assert_awaited_once_with(
+            'site1', 'gate',
+        )
+
+        # Fixing the configuration applies it
+        await self.workflow.apply_update(self.config)
+        await self.workflow.apply_update(dict(self.config, encoding=None))
+        self.assertIsNot(self.workflow.frame_encoder, frame_encoder)
+
+    async def test_updates_reach_running_stream(self) -> None:
+        """
+        Test that queued rates and configs apply before the next frame.
+        """
+        async def execute_capture():
+            for timestamp in (1.0, 2.0):
+                yield np.zeros((4, 4, 3), dtype=np.uint8), timestamp
+
+        capture = self.workflow.streaming_capture
+        capture.execute_capture = execute_capture
+        capture.read_time = 0.0
+        updates: asyncio.Queue = asyncio.Queue()
+        frames = self.workflow.frames(updates)
+
+        await anext(frames)
+        self.assertIsNone(self.workflow.rate)
+        updates.put_nowait(('rate', 0.5))
+        updates.put_nowait(('config', dict(self.config, stream_name='exit')))
+        job = await anext(frames)
+
+        self.assertEqual(job['timestamp'], 2.0)
+        self.assertEqual(self.workflow.rate, 0.5)
+        self.assertEqual(self.workflow.stream_name, 'exit')
+        capture.update_capture_interval.assert_called_with(2.0)
+        await frames.aclose()
+
+
+    def test_drop(self) -> None:
+        """
+        Test that dropped frames are counted, traced and released.
+        """
+        frame = np.zeros((4, 4, 3), dtype=np.uint8)
+        annotated_frame = MagicMock()
+        trace = MagicMock(dropped=None)
+        with patch('main.metrics') as mock_metrics:
+            self.workflow.drop('publish', {
+                'frame': frame,
+                'trace': trace,
+                'annotated_frame': annotated_frame,
+            })
+
+        mock_metrics.count.assert_called_once_with(
+            'site1', 'gate', 'dropped_frames', 'publish',
+        )
+        self.assertEqual(trace.dropped, 'publish')
+        self.workflow.tracer.finish.assert_called_once_with(trace)
+        annotated_frame.release.assert_called_once()
+        self.workflow.streaming_capture.release_frame.assert_called_once_with(
+            frame,
+        )
+
+
+class TestMainApp(unittest.TestCase):
+    """
+    Unit tests for running the streams in the worker pool.
+    """
+
+    @patch('main.LoggerConfig')
+    @patch('main.CpuGovernor')
+    @patch('main.WorkerPool')
+    @patch('main.worker_count', return_value=2)
+    def setUp(self, _, mock_pool, mock_governor, __) -> None:
+        """
+        Set up the application with a mocked pool and governor.
+        """
+        self.mock_pool = mock_pool
+        self.mock_governor = mock_governor
+        self.app = MainApp('config/configuration.yaml')
+        self.app.scheduler = MagicMock()
+
+    def test_workers_are_governed(self) -> None:
+        """
+        Test that every worker, including respawned ones, applies the
+        CPU layout of the governor as it starts.
+        """
+        self.mock_governor.assert_called_once_with(2)
+        self.mock_pool.assert_called_once_with(
+            self.app.process_streams,
+            max_workers=2,
+            cleanup=self.app.close_worker,
+            initializer=self.mock_governor.return_value.apply,
+        )
+
+    def test_handle_reports(self) -> None:
+        """
+        Test that layouts are logged, metrics kept by worker and activity
+        sent to the scheduler.
+        """
+        self.app.pool.drain_reports.return_value = [
+            {
+                'type': 'layout', 'worker': 1, 'pid': 42, 'cpus': [2, 3],
+                'torch': 2, 'opencv': 2, 'blas': 2,
+            },
+            {'type': 'metrics', 'pid': 42, 'snapshot': {'frames': 1}},
+            {
+                'type': 'activity', 'video_url': 'a', 'timestamp': 1.0,
+                'people': 3, 'warnings': 1,
+            },
+        ]
+        self.app.handle_reports()
+
+        self.app.logger.info.assert_called_once()
+        self.assertIn('CPUs [2, 3]', self.app.logger.info.call_args.args[0])
+        self.assertEqual(self.app.worker_metrics, {42: {'frames': 1}})
+        self.app.scheduler.report.assert_called_once_with('a', 1.0, 3, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import cv2
+import torch
+
+from src.cpu_governor import CpuGovernor
+from src.cpu_governor import split_cpus
+
+
+class TestSplitCpus(unittest.TestCase):
+    """
+    Unit tests for splitting the CPUs between workers.
+    """
+
+    def test_balanced(self) -> None:
+        """
+        Test that CPU sets are contiguous and differ by at most one CPU.
+        """
+        self.assertEqual(
+            split_cpus(list(range(10)), 4),
+            [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]],
+        )
+
+    def test_more_workers_than_cpus(self) -> None:
+        """
+        Test that workers share single CPUs in turn.
+        """
+        self.assertEqual(split_cpus([4, 5], 3), [[4], [5], [4]])
+
+
+class TestCpuGovernor(unittest.TestCase):
+    """
+    Unit tests for pinning workers and sizing their thread pools.
+    """
+
+    def setUp(self) -> None:
+        """
+        Save the thread counts of this process to restore them.
+        """
+        torch_threads = torch.get_num_threads()
+        opencv_threads = cv2.getNumThreads()
+        self.addCleanup(torch.set_num_threads, torch_threads)
+        self.addCleanup(cv2.setNumThreads, opencv_threads)
+        patcher = patch.dict('os.environ')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_defaults_from_env(self) -> None:
+        """
+        Test that pinning can be disabled by the environment.
+        """
+        with patch.dict('os.environ', {'WORKER_CPU_AFFINITY': '0'}):
+            self.assertFalse(CpuGovernor(2, cpus=[0, 1]).pin)
+        self.assertTrue(CpuGovernor(2, cpus=[0, 1], pin=True).pin)
+
+    @patch('src.cpu_governor.threadpool_limits')
+    @patch('src.cpu_governor.os.sched_setaffinity', create=True)
+    def test_apply(
+        self,
+        mock_setaffinity: MagicMock,
+        mock_limits: MagicMock,
+    ) -> None:
+        """
+        Test that a worker is pinned to its set, with matching threads.
+        """
+        governor = CpuGovernor(2, cpus=[0, 1, 2, 3], pin=True)
+        layout = governor.apply(1)
+
+        mock_setaffinity.assert_called_once_with(0, [2, 3])
+        mock_limits.assert_called_once_with(limits=2)
+        self.assertEqual(layout['worker'], 1)
+        self.assertEqual(layout['torch'], 2)
+        self.assertEqual(layout['opencv'], cv2.getNumThreads())
+        self.assertEqual(
+            [line.split(',')[0] for line in governor.describe()],
+            ['Worker 0: 2 threads', 'Worker 1: 2 threads'],
+        )
+        self.assertEqual(os.environ['OMP_NUM_THREADS'], '2')
+
+    @patch('src.cpu_governor.threadpool_limits')
+    @patch('src.cpu_governor.os.sched_setaffinity', create=True)
+    def test_apply_without_pinning(
+        self,
+        mock_setaffinity: MagicMock,
+        _: MagicMock,
+    ) -> None:
+        """
+        Test that thread pools are sized even when pinning is disabled.
+        """
+        layout = CpuGovernor(4, cpus=[0, 1, 2, 3], pin=False).apply(0)
+        mock_setaffinity.assert_not_called()
+        self.assertEqual(layout['torch'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
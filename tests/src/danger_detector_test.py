@@ -76,6 +76,29 @@ class TestDangerDetector(unittest.TestCase):
             ),
         )
 
+    def test_helpers_use_rule_thresholds(self) -> None:
+        """
+        Test that the helpers follow the thresholds of the declared rules.
+        """
+        person_bbox: list[float] = [100, 100, 120, 120]
+        vehicle_bbox: list[float] = [100, 100, 200, 200]
+        detector = DangerDetector(
+            {'close_to_machinery': {'horizontal_factor': 0.1}},
+        )
+        self.assertFalse(
+            detector.is_dangerously_close(
+                person_bbox, vehicle_bbox, 'vehicle',
+            ),
+        )
+
+        cones = [
+            [0, 0, 10, 10, 0.9, 6],
+            [100, 0, 110, 10, 0.9, 6],
+            [0, 100, 10, 110, 0.9, 6],
+        ]
+        detector = DangerDetector({'controlled_area': {'min_cones': 4}})
+        self.assertEqual(detector.detect_polygon_from_cones(cones), [])
+
     def test_calculate_people_in_controlled_area(self) -> None:
         """
         Test case for calculating the number of people in the controlled area.
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from src.detection_scheduler import DetectionScheduler
+
+
+class TestDetectionScheduler(unittest.TestCase):
+    """
+    Unit tests for sharing the inference budget between cameras.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a scheduler of 4 frames per second for three cameras.
+        """
+        self.scheduler = DetectionScheduler(
+            budget=4, floor=0.1, ceiling=2,
+            hazard_hold=300, idle_after=600,
+        )
+        for video_url in ('gate', 'crane', 'yard'):
+            self.scheduler.register(video_url, now=0)
+
+    def test_defaults_from_env(self) -> None:
+        """
+        Test that the budget and limits default to the environment.
+        """
+        with patch.dict('os.environ', {
+            'DETECTION_BUDGET_FPS': '30',
+            'DETECTION_FLOOR_FPS': '0.5',
+            'DETECTION_CEILING_FPS': '5',
+        }):
+            scheduler = DetectionScheduler()
+        self.assertTrue(scheduler.enabled)
+        self.assertEqual(
+            (scheduler.budget, scheduler.floor, scheduler.ceiling),
+            (30, 0.5, 5),
+        )
+        self.assertFalse(DetectionScheduler(budget=0).enabled)
+
+    def test_equal_shares_without_activity(self) -> None:
+        """
+        Test that new cameras share the budget equally.
+        """
+        rates = self.scheduler.allocate(now=10)
+        for rate in rates.values():
+            self.assertAlmostEqual(rate, 4 / 3)
+
+    def test_priority(self) -> None:
+        """
+        Test that hazards and people get the larger shares.
+        """
+        self.scheduler.report('gate', 100, people=2, warnings=1)
+        self.scheduler.report('crane', 100, people=1, warnings=0)
+        rates = self.scheduler.allocate(now=200)
+
+        # The camera with a warning is capped at its ceiling, and the
+        # rest of its share goes to the others
+        self.assertAlmostEqual(rates['gate'], 2)
+        self.assertGreater(rates['crane'], rates['yard'])
+        self.assertAlmostEqual(sum(rates.values()), 4)
+
+    def test_idle_cameras_get_their_floor(self) -> None:
+        """
+        Test that cameras empty for a while only get their floor rate.
+        """
+        self.scheduler.report('gate', 500, people=1, warnings=0)
+        rates = self.scheduler.allocate(now=700)
+        self.assertAlmostEqual(rates['crane'], 0.1)
+        self.assertAlmostEqual(rates['yard'], 0.1)
+        self.assertAlmostEqual(rates['gate'], 2)
+
+    def test_floors_are_guaranteed(self) -> None:
+        """
+        Test that floors are granted even beyond the budget.
+        """
+        self.scheduler.register('gate', {'floor': 3, 'ceiling': 3})
+        self.scheduler.register('crane', {'floor': 2})
+        rates = self.scheduler.allocate(now=10)
+        self.assertEqual(rates['gate'], 3)
+        self.assertEqual(rates['crane'], 2)
+        self.assertAlmostEqual(rates['yard'], 0.1)
+
+    def test_invalid_limits(self) -> None:
+        """
+        Test that a floor above the ceiling is rejected.
+        """
+        with self.assertRaises(ValueError):
+            self.scheduler.register('gate', {'floor': 3, 'ceiling': 1})
+
+    def test_unregister(self) -> None:
+        """
+        Test that removed cameras no longer get a rate or reports.
+        """
+        self.scheduler.unregister('yard')
+        self.scheduler.report('yard', 100, people=1, warnings=1)
+        self.assertEqual(
+            set(self.scheduler.allocate(now=10)), {'gate', 'crane'},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
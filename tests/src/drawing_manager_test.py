@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import shutil
 import unittest
 from pathlib import Path
 from unittest.mock import patch
 
+import cv2
 import numpy as np
 from shapely.geometry import Polygon
 
 from src.drawing_manager import DrawingManager
+from src.drawing_manager import get_label_sprite
+from src.drawing_manager import GlyphAtlas
 from src.drawing_manager import main
+from src.frame_encoder import FrameEncoder
 
 
 class TestDrawingManager(unittest.TestCase):
@@ -58,44 +63,20 @@ class TestDrawingManager(unittest.TestCase):
         if root_dir.exists() and root_dir.is_dir():
             shutil.rmtree(root_dir)
 
-    def test_get_font_cache(self) -> None:
+    def test_glyph_atlas_fallback_to_default(self) -> None:
         """
-        Test the font caching mechanism in the get_font method.
-        """
-        # First call to get_font should load and cache the font
-        font_first_call = self.drawer.get_font('en')
-
-        # Second call to get_font with the same language
-        # should use the cached font
-        font_second_call = self.drawer.get_font('en')
-
-        # Assert that the returned font objects are the same,
-        # indicating caching
-        self.assertIs(
-            font_first_call, font_second_call,
-            'Font should be retrieved from cache',
-        )
-
-        # Check if the font is indeed cached
-        font_path = 'assets/fonts/NotoSansTC-VariableFont_wght.ttf'
-        self.assertIn(
-            font_path, self.drawer.font_cache,
-            'Font should be cached after first retrieval',
-        )
-
-    def test_get_font_fallback_to_default(self) -> None:
-        """
-        Test the get_font method when loading a custom font fails,
+        Test the glyph atlas when loading a custom font fails,
         falling back to the default font.
         """
-        # Mock ImageFont.truetype to raise an OSError
-        with patch('PIL.ImageFont.truetype', side_effect=OSError):
-            # Call get_font, which should fall back to the default font
-            fallback_font = self.drawer.get_font('en')
+        # Mock ImageFont.truetype to raise an OSError, on a fresh cache
+        with patch(
+            'PIL.ImageFont.truetype', side_effect=OSError,
+        ), patch.dict(DrawingManager.glyph_atlases, clear=True):
+            atlas = self.drawer.get_glyph_atlas('en')
 
-            # Check that the returned font is the default font
+            # Check that the atlas uses the default font
             self.assertIs(
-                fallback_font, DrawingManager.default_font,
+                atlas.font, DrawingManager.default_font,
                 'Should fall back to the default font when loading fails',
             )
 
@@ -199,6 +180,222 @@ class TestDrawingManager(unittest.TestCase):
         # Check if the frame dimensions are the same
         self.assertEqual(frame_with_polygons.shape, self.frame.shape)
 
+    def test_draw_polygons_blends_within_bounding_rect(self) -> None:
+        """
+        Test that polygon blending leaves pixels outside the polygon's
+        bounding rectangle untouched.
+        """
+        frame = np.full((480, 640, 3), 50, dtype=np.uint8)
+        polygon = Polygon([(100, 100), (200, 100), (150, 200)])
+        result = self.drawer.draw_polygons(frame.copy(), [polygon])
+
+        # Inside the polygon the fill colour is blended in
+        self.assertFalse(np.array_equal(result[140, 150], frame[140, 150]))
+
+        # Outside the bounding rectangle nothing changes
+        np.testing.assert_array_equal(result[:95], frame[:95])
+        np.testing.assert_array_equal(result[:, 205:], frame[:, 205:])
+
+    def test_draw_detections_does_not_modify_input(self) -> None:
+        """
+        Test that drawing detections leaves the input frame unchanged.
+        """
+        frame = self.frame.copy()
+        self.drawer.draw_detections_on_frame(frame, self.polygons, self.datas)
+        np.testing.assert_array_equal(frame, self.frame)
+
+    def test_glyph_atlas_render(self) -> None:
+        """
+        Test composing text from the glyph atlas.
+        """
+        atlas = GlyphAtlas(self.drawer.get_glyph_atlas('th').font, 'abc')
+        self.assertIn('a', atlas.glyphs)
+
+        mask = atlas.render('abc')
+        self.assertEqual(mask.dtype, np.uint8)
+        self.assertGreater(mask.shape[1], atlas.render('a').shape[1])
+        self.assertGreater(mask.max(), 0)
+
+        # Characters outside the pre-rendered set are added on demand
+        atlas.render('d')
+        self.assertIn('d', atlas.glyphs)
+
+        self.assertEqual(atlas.render('').shape, (0, 0))
+
+    def test_get_glyph_atlas_is_shared(self) -> None:
+        """
+        Test that glyph atlases are shared across instances.
+        """
+        atlas = self.drawer.get_glyph_atlas('th')
+        self.assertIs(DrawingManager().get_glyph_atlas('th', 20), atlas)
+
+    def test_get_label_sprite_cache(self) -> None:
+        """
+        Test that label sprites are rendered once and shared.
+        """
+        get_label_sprite.cache_clear()
+        patch_first = get_label_sprite(
+            'th', 'บุคคล', (0, 165, 255), 20,
+        )
+        patch_second = get_label_sprite(
+            'th', 'บุคคล', (0, 165, 255), 20,
+        )
+        self.assertIs(patch_first, patch_second)
+        self.assertEqual(get_label_sprite.cache_info().hits, 1)
+
+        self.assertFalse(patch_first.flags.writeable)
+
+        # The background uses the requested colour
+        np.testing.assert_array_equal(patch_first[-1, 0], (0, 165, 255))
+
+    def test_draw_label_clipped(self) -> None:
+        """
+        Test drawing a label partially outside the frame.
+        """
+        frame = self.frame.copy()
+        self.drawer.draw_label(frame, 'person', -5, 10, (0, 165, 255))
+        self.assertTrue(frame[:10].any())
+        self.assertFalse(frame[10:].any())
+
+        # A label entirely outside the frame draws nothing
+        frame = self.frame.copy()
+        self.drawer.draw_label(frame, 'person', 700, 10, (0, 165, 255))
+        self.assertFalse(frame.any())
+
+    def test_draw_detections_matches_layers(self) -> None:
+        """
+        Test that the base layer plus labels equals a full render.
+        """
+        full = self.drawer.draw_detections_on_frame(
+            self.frame, self.polygons, self.datas, language='th',
+        )
+        base = self.drawer.draw_base_layer(
+            self.frame, self.polygons, self.datas,
+        )
+        layered = self.drawer.draw_labels(base, self.datas, language='th')
+        np.testing.assert_array_equal(full, layered)
+
+    def test_annotated_frame_memoises(self) -> None:
+        """
+        Test that an annotated frame renders and encodes once per language.
+        """
+        annotated = self.drawer.annotate(self.frame, self.polygons, self.datas)
+
+        with patch.object(
+            self.drawer, 'draw_base_layer',
+            wraps=self.drawer.draw_base_layer,
+        ) as mock_base, patch.object(
+            self.drawer, 'draw_labels', wraps=self.drawer.draw_labels,
+        ) as mock_labels, patch(
+            'src.drawing_manager.cv2.imencode',
+            wraps=cv2.imencode,
+        ) as mock_encode:
+            en_bytes = annotated.encode('en')
+            self.assertEqual(annotated.encode('en'), en_bytes)
+            annotated.encode('th')
+            annotated.render('th')
+
+            mock_base.assert_called_once()
+            self.assertEqual(mock_labels.call_count, 2)
+            self.assertEqual(mock_encode.call_count, 2)
+
+        # Drawing and encoding times are accumulated for the metrics
+        self.assertGreater(annotated.timings['drawing'], 0)
+        self.assertGreater(annotated.timings['encoding'], 0)
+
+        # The rendered frame equals a direct draw
+        np.testing.assert_array_equal(
+            annotated.render('en'),
+            self.drawer.draw_detections_on_frame(
+                self.frame, self.polygons, self.datas, language='en',
+            ),
+        )
+
+    def test_annotated_frame_release(self) -> None:
+        """
+        Test that released layers are reused by the next frame.
+        """
+        annotated = self.drawer.annotate(self.frame, self.polygons, self.datas)
+        encoded = annotated.encode('en')
+        rendered = annotated.render('en')
+        annotated.release()
+        self.assertEqual(annotated.encode('en'), encoded)
+
+        # Both the base layer and the labels layer come from the pool
+        hits = self.drawer.frame_pool.hits
+        other = self.drawer.annotate(self.frame, [], [])
+        self.assertIs(other.render('en'), rendered)
+        self.assertEqual(self.drawer.frame_pool.hits, hits + 2)
+        np.testing.assert_array_equal(other.render('en'), self.frame)
+
+    def test_annotated_frame_encode_for_reuses_profiles(self) -> None:
+        """
+        Test that consumers with the same profile share one encode.
+        """
+        encoder = FrameEncoder({
+            'live': {'format': 'jpeg', 'quality': 90},
+            'notification': {'format': 'jpeg', 'quality': 90},
+        })
+        annotated = self.drawer.annotate(self.frame, self.polygons, self.datas)
+
+        async def encode_all() -> tuple[bytes, bytes, bytes]:
+            return (
+                await annotated.encode_for(encoder, 'notification', 'en'),
+                await annotated.encode_for(encoder, 'live', 'en'),
+                await annotated.encode_for(encoder, 'archive', 'en'),
+            )
+
+        try:
+            with patch.object(
+                encoder, 'run', wraps=encoder.run,
+            ) as mock_run:
+                notification, live, archive = asyncio.run(encode_all())
+        finally:
+            encoder.shutdown()
+
+        self.assertIs(notification, live)
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertTrue(live.startswith(b'\xff\xd8\xff'))
+        self.assertTrue(archive.startswith(b'\x89PNG'))
+
+    def test_annotated_frame_encode_for_thumbnail(self) -> None:
+        """
+        Test that the thumbnail is downscaled and encoded separately.
+        """
+        encoder = FrameEncoder({
+            'live': {'format': 'jpeg', 'quality': 70},
+            'thumbnail': {'max_width': 100},
+        })
+        annotated = self.drawer.annotate(self.frame, self.polygons, self.datas)
+
+        async def encode_all() -> tuple[bytes, bytes]:
+            return (
+                await annotated.encode_for(encoder, 'live', 'en'),
+                await annotated.encode_for(encoder, 'thumbnail', 'en'),
+            )
+
+        try:
+            live, thumbnail = asyncio.run(encode_all())
+        finally:
+            encoder.shutdown()
+
+        self.assertIsNot(live, thumbnail)
+        decoded = cv2.imdecode(
+            np.frombuffer(thumbnail, np.uint8), cv2.IMREAD_COLOR,
+        )
+        self.assertEqual(decoded.shape[1], 100)
+
+    def test_save_frame_extension(self) -> None:
+        """
+        Test that saved frames use the extension of their format.
+        """
+        frame_bytes = bytearray(b'\xff\xd8\xff\xe0' + bytes(16))
+        with patch('builtins.open', unittest.mock.mock_open()) as mock_file:
+            self.drawer.save_frame(frame_bytes, 'test_frame')
+            mock_file.assert_called_once_with(
+                Path('detected_frames/test_frame.jpg'), 'wb',
+            )
+
     def test_save_frame(self) -> None:
         """
         Test saving a frame to disk.
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import unittest
+from datetime import datetime
+from datetime import timezone
+
+from src.duty_schedule import DutySchedule
+from src.duty_schedule import parse_hours
+from src.duty_schedule import zone_only_rules
+
+
+def utc(day: int, hour: int, minute: int = 0, second: int = 0) -> float:
+    """
+    Get the UNIX timestamp of a time in October 2026, in UTC.
+
+    Args:
+        day (int): The day of the month. The 19th is a Monday.
+        hour (int): The hour.
+        minute (int): The minute.
+        second (int): The second.
+
+    Returns:
+        float: The UNIX timestamp.
+    """
+    return datetime(
+        2026, 10, day, hour, minute, second, tzinfo=timezone.utc,
+    ).timestamp()
+
+
+class TestDutySchedule(unittest.TestCase):
+    """
+    Unit tests for the working hours and detection modes of a site.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a schedule with reduced evenings, zone-only nights and
+        weekends off.
+        """
+        self.schedule = DutySchedule.from_config({
+            'working_hours': '07:00-18:00',
+            'timezone': 'UTC',
+            'periods': [
+                {'days': ['sat', 'sun'], 'mode': 'off'},
+                {'hours': '18:00-22:00', 'mode': 'reduced', 'rate': 0.2},
+                {
+                    'hours': '22:00-07:00',
+                    'mode': 'zone_only',
+                    'model_key': 'yolo11n',
+                },
+            ],
+        })
+
+    def test_default_schedule(self) -> None:
+        """
+        Test that streams without a schedule keep the historical working
+        hours and detect at full rate around the clock.
+        """
+        schedule = DutySchedule.from_config(None)
+        self.assertEqual(schedule.period_at(0), {'mode': 'full'})
+        self.assertEqual(
+            schedule.working_hours, parse_hours('07:00-18:00'),
+        )
+
+    def test_working_hours(self) -> None:
+        """
+        Test the working hours check.
+        """
+        self.assertTrue(self.schedule.is_working_hours(utc(19, 7)))
+        self.assertTrue(self.schedule.is_working_hours(utc(19, 17, 59)))
+        self.assertFalse(self.schedule.is_working_hours(utc(19, 18)))
+        self.assertFalse(self.schedule.is_working_hours(utc(19, 3)))
+
+    def test_period_at(self) -> None:
+        """
+        Test that the first matching period applies.
+        """
+        self.assertEqual(
+            self.schedule.period_at(utc(19, 12)), {'mode': 'full'},
+        )
+        self.assertEqual(
+            self.schedule.period_at(utc(19, 19)),
+            {'mode': 'reduced', 'rate': 0.2},
+        )
+        self.assertEqual(
+            self.schedule.period_at(utc(19, 23)),
+            {'mode': 'zone_only', 'model_key': 'yolo11n'},
+        )
+        # Periods may wrap past midnight
+        self.assertEqual(
+            self.schedule.period_at(utc(20, 6, 59))['mode'], 'zone_only',
+        )
+        # Weekends are off all day
+        self.assertEqual(self.schedule.period_at(utc(24, 12))['mode'], 'off')
+        self.assertEqual(self.schedule.period_at(utc(25, 23))['mode'], 'off')
+
+    def test_days_of_wrapping_period(self) -> None:
+        """
+        Test that a period wrapping past midnight belongs to the day it
+        started on.
+        """
+        schedule = DutySchedule(periods=[
+            {'hours': '22:00-06:00', 'days': ['fri'], 'mode': 'off'},
+        ])
+        friday_night = datetime(2026, 10, 23, 23).timestamp()
+        saturday_morning = datetime(2026, 10, 24, 5).timestamp()
+        saturday_night = datetime(2026, 10, 24, 23).timestamp()
+        self.assertEqual(schedule.period_at(friday_night)['mode'], 'off')
+        self.assertEqual(schedule.period_at(saturday_morning)['mode'], 'off')
+        self.assertEqual(schedule.period_at(saturday_night)['mode'], 'full')
+
+    def test_invalid_schedule(self) -> None:
+        """
+        Test that unknown modes, days and malformed hours are rejected.
+        """
+        with self.assertRaises(ValueError):
+            DutySchedule(periods=[{'hours': '00:00-06:00', 'mode': 'nap'}])
+        with self.assertRaises(ValueError):
+            DutySchedule(periods=[{'hours': '00:00-06:00', 'days': ['mo']}])
+        with self.assertRaises(ValueError):
+            DutySchedule(periods=[{'mode': 'reduced', 'rate': 0}])
+        with self.assertRaises(ValueError):
+            DutySchedule(working_hours='7-18')
+
+    def test_seconds_to_next_minute(self) -> None:
+        """
+        Test the wait until the schedule may change.
+        """
+        self.assertEqual(
+            self.schedule.seconds_to_next_minute(utc(19, 21, 59, 45)), 15,
+        )
+
+    def test_zone_only_rules(self) -> None:
+        """
+        Test that only the controlled area rules stay enabled.
+        """
+        rules = zone_only_rules({'controlled_area': {'min_cones': 4}})
+        self.assertTrue(rules['controlled_area']['enabled'])
+        self.assertEqual(rules['controlled_area']['min_cones'], 4)
+        self.assertTrue(rules['driver_exclusion']['enabled'])
+        self.assertFalse(rules['no_hardhat']['enabled'])
+        self.assertFalse(rules['no_safety_vest']['enabled'])
+        self.assertFalse(rules['close_to_machinery']['enabled'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import unittest
+
+import cv2
+import numpy as np
+
+from src.frame_encoder import FrameEncoder
+from src.frame_encoder import get_executor
+from src.frame_encoder import guess_extension
+from src.frame_encoder import shutdown_executor
+
+
+class TestFrameEncoder(unittest.IsolatedAsyncioTestCase):
+    """
+    Unit tests for the FrameEncoder class.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up an encoder and a test frame.
+        """
+        self.encoder = FrameEncoder()
+        self.frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        cv2.rectangle(self.frame, (20, 20), (100, 100), (0, 255, 0), -1)
+
+    def tearDown(self) -> None:
+        """
+        Shut down the encoder's thread pool.
+        """
+        self.encoder.shutdown()
+
+    def test_default_profiles(self) -> None:
+        """
+        Test the default format of each consumer.
+        """
+        self.assertEqual(self.encoder.get_params('live')[0], '.jpg')
+        self.assertEqual(self.encoder.get_params('notification')[0], '.jpg')
+        self.assertEqual(self.encoder.get_params('archive')[0], '.png')
+
+    def test_profile_overrides(self) -> None:
+        """
+        Test overriding the format and quality of a consumer.
+        """
+        encoder = FrameEncoder({'live': {'format': 'webp', 'quality': 60}})
+        try:
+            self.assertEqual(
+                encoder.get_params('live'),
+                ('.webp', (cv2.IMWRITE_WEBP_QUALITY, 60)),
+            )
+            # Other consumers keep their defaults
+            self.assertEqual(encoder.get_params('archive')[0], '.png')
+        finally:
+            encoder.shutdown()
+
+    def test_override_with_another_format(self) -> None:
+        """
+        Test that a new format drops the settings of the default profile.
+        """
+        encoder = FrameEncoder({
+            'archive': {'format': 'jpeg', 'quality': 90},
+            'live': {'format': 'png'},
+            'notification': {'quality': 70},
+        })
+        try:
+            self.assertEqual(
+                encoder.get_params('archive'),
+                ('.jpg', (cv2.IMWRITE_JPEG_QUALITY, 90)),
+            )
+            # The JPEG quality of the default is not used as compression
+            self.assertEqual(encoder.get_params('live'), ('.png', ()))
+            self.assertTrue(encoder.renders_overlay('live'))
+            # Without a format, overrides are merged into the default
+            self.assertEqual(
+                encoder.get_params('notification'),
+                ('.jpg', (cv2.IMWRITE_JPEG_QUALITY, 70)),
+            )
+        finally:
+            encoder.shutdown()
+
+    def test_setting_out_of_range(self) -> None:
+        """
+        Test that quality settings outside the range of the format fail.
+        """
+        for profile in (
+            {'format': 'png', 'compression': 80},
+            {'format': 'jpeg', 'quality': 101},
+            {'format': 'webp', 'quality': 0},
+        ):
+            with self.subTest(profile=profile), self.assertRaises(
+                ValueError,
+            ):
+                FrameEncoder({'live': profile})
+
+    def test_unsupported_format(self) -> None:
+        """
+        Test that unsupported formats are rejected.
+        """
+        with self.assertRaises(ValueError):
+            FrameEncoder({'live': {'format': 'gif'}})
+
+    def test_overlay(self) -> None:
+        """
+        Test choosing where the detections of the live view are drawn.
+        """
+        self.assertTrue(self.encoder.renders_overlay('live'))
+        self.assertTrue(self.encoder.renders_overlay('notification'))
+
+        encoder = FrameEncoder({'live': {'overlay': 'client'}})
+        try:
+            self.assertFalse(encoder.renders_overlay('live'))
+        finally:
+            encoder.shutdown()
+
+        with self.assertRaises(ValueError):
+            FrameEncoder({'live': {'overlay': 'browser'}})
+
+    def test_resize(self) -> None:
+        """
+        Test downscaling frames to the maximum width of a consumer.
+        """
+        self.assertIs(self.encoder.resize(self.frame, 'live'), self.frame)
+
+        encoder = FrameEncoder({'thumbnail': {'max_width': 80}})
+        try:
+            self.assertEqual(
+                encoder.resize(self.frame, 'thumbnail').shape, (60, 80, 3),
+            )
+            encoded = encoder.encode(self.frame, 'thumbnail')
+            decoded = cv2.imdecode(
+                np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR,
+            )
+            self.assertEqual(decoded.shape, (60, 80, 3))
+
+            # The downscaled buffer is reused once released
+            resized = encoder.resize(self.frame, 'thumbnail')
+            encoder.release(resized, self.frame)
+            self.assertIs(encoder.resize(self.frame, 'thumbnail'), resized)
+        finally:
+            encoder.shutdown()
+
+        # Narrow frames are kept as they are
+        self.assertIs(
+            self.encoder.resize(self.frame, 'thumbnail'), self.frame,
+        )
+
+    def test_encode(self) -> None:
+        """
+        Test encoding in the calling thread for each format.
+        """
+        for consumer, ext in (('live', '.jpg'), ('archive', '.png')):
+            encoded = self.encoder.encode(self.frame, consumer)
+            self.assertEqual(guess_extension(encoded), ext)
+            decoded = cv2.imdecode(
+                np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR,
+            )
+            self.assertEqual(decoded.shape, self.frame.shape)
+
+    async def test_encode_async(self) -> None:
+        """
+        Test encoding in the thread pool matches encoding inline.
+        """
+        encoded = await self.encoder.encode_async(self.frame, 'archive')
+        self.assertEqual(encoded, self.encoder.encode(self.frame, 'archive'))
+
+    def test_shared_executor(self) -> None:
+        """
+        Test that encoders share one thread pool per process.
+        """
+        other = FrameEncoder()
+        self.assertIs(get_executor(), get_executor())
+        other.shutdown()
+        # Releasing an encoder leaves the pool to the other encoders
+        self.assertFalse(get_executor()._shutdown)
+
+        executor = get_executor()
+        shutdown_executor()
+        self.assertTrue(executor._shutdown)
+        self.assertIsNot(get_executor(), executor)
+
+    def test_guess_extension(self) -> None:
+        """
+        Test guessing the format of encoded bytes.
+        """
+        webp = FrameEncoder.imencode(self.frame, '.webp')
+        self.assertEqual(guess_extension(webp), '.webp')
+        self.assertEqual(guess_extension(b'unknown'), '.png')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.frame_pool import FramePool
+from src.frame_pool import MemoryPolicy
+from src.frame_pool import resident_memory
+
+
+class TestFramePool(unittest.TestCase):
+    """
+    Unit tests for reusing frame buffers.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a pool keeping two arrays per shape.
+        """
+        self.pool = FramePool(max_per_shape=2)
+
+    def test_reuse(self) -> None:
+        """
+        Test that released arrays are handed out again by shape and type.
+        """
+        frame = self.pool.acquire((4, 6, 3))
+        self.pool.release(frame)
+        self.assertIsNot(self.pool.acquire((4, 6, 3), np.float32), frame)
+        self.assertIsNot(self.pool.acquire((6, 4, 3)), frame)
+        self.assertIs(self.pool.acquire((4, 6, 3)), frame)
+        self.assertEqual((self.pool.hits, self.pool.misses), (1, 3))
+
+    def test_copy(self) -> None:
+        """
+        Test that copies go into released arrays.
+        """
+        buffer = np.zeros((2, 2), dtype=np.uint8)
+        self.pool.release(buffer)
+        source = np.arange(4, dtype=np.uint8).reshape(2, 2)
+        copy = self.pool.copy(source)
+        self.assertIs(copy, buffer)
+        np.testing.assert_array_equal(copy, source)
+
+    def test_release_ignores_views_and_duplicates(self) -> None:
+        """
+        Test that views, repeated and surplus arrays are not kept.
+        """
+        frame = np.zeros((4, 4), dtype=np.uint8)
+        self.pool.release(frame[:2])
+        self.pool.release(frame.T)
+        self.pool.release(None)
+        self.pool.release(frame)
+        self.pool.release(frame)
+        self.assertEqual(self.pool.free[((4, 4), np.dtype(np.uint8))], [frame])
+
+        for _ in range(3):
+            self.pool.release(np.zeros((4, 4), dtype=np.uint8))
+        self.assertEqual(len(self.pool.free[((4, 4), np.dtype(np.uint8))]), 2)
+
+
+class TestMemoryPolicy(unittest.TestCase):
+    """
+    Unit tests for collecting garbage under memory pressure.
+    """
+
+    def test_resident_memory(self) -> None:
+        """
+        Test that the RSS is read where /proc is available.
+        """
+        with patch('builtins.open', side_effect=OSError):
+            self.assertIsNone(resident_memory())
+
+    def test_disabled(self) -> None:
+        """
+        Test that nothing is collected without a threshold.
+        """
+        with patch.dict('os.environ', {}, clear=True):
+            policy = MemoryPolicy()
+        with patch('src.frame_pool.gc.collect') as collect:
+            self.assertFalse(policy.maybe_collect())
+        collect.assert_not_called()
+
+    @patch('src.frame_pool.gc.collect', return_value=0)
+    @patch('src.frame_pool.resident_memory')
+    def test_collects_over_threshold(self, rss, collect) -> None:
+        """
+        Test that collections only run over the threshold, at most once
+        per interval.
+        """
+        policy = MemoryPolicy(
+            threshold_mb=100, check_interval=0, min_interval=10,
+        )
+        with patch('src.frame_pool.time.monotonic', return_value=1e9):
+            rss.return_value = 50 * 1024 * 1024
+            self.assertFalse(policy.maybe_collect())
+            rss.return_value = 200 * 1024 * 1024
+            self.assertTrue(policy.maybe_collect())
+            self.assertFalse(policy.maybe_collect())
+        with patch('src.frame_pool.time.monotonic', return_value=1e9 + 11):
+            self.assertTrue(policy.maybe_collect())
+        self.assertEqual(collect.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import sys
+import tempfile
+import unittest
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from src.frame_trace import breakdown
+from src.frame_trace import FrameTrace
+from src.frame_trace import load_traces
+from src.frame_trace import main
+from src.frame_trace import outliers
+from src.frame_trace import percentile
+from src.frame_trace import TraceRecorder
+
+
+def record(stream: str, total: float, spans: list | None = None) -> dict:
+    """
+    Build a trace record.
+
+    Args:
+        stream (str): The stream name.
+        total (float): The latency of the frame in the pipeline.
+        spans (list | None): The spans, a single inference span by
+            default.
+
+    Returns:
+        dict: The record.
+    """
+    return {
+        'site': 'site',
+        'stream': stream,
+        'ts': 0.0,
+        'total': total,
+        'spans': spans or [['inference', 0.0, total / 2]],
+    }
+
+
+class TestTraceRecorder(unittest.TestCase):
+    """
+    Unit tests for recording sampled frame traces.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a temporary folder for the trace files.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_disabled(self) -> None:
+        """
+        Test that no trace is started by default.
+        """
+        with patch.dict('os.environ', {}, clear=True):
+            recorder = TraceRecorder()
+        self.assertFalse(recorder.enabled)
+        self.assertIsNone(recorder.start('site', 'gate', 0))
+        self.assertFalse(recorder.finish(None))
+
+    def test_sampling(self) -> None:
+        """
+        Test that frames are written when drawn by the sample rate.
+        """
+        recorder = TraceRecorder(
+            sample_rate=0.5, slow_seconds=0,
+            directory=self.directory.name, rng=iter([0.7, 0.2]).__next__,
+        )
+        self.assertFalse(recorder.finish(recorder.start('site', 'a', 1)))
+        trace = recorder.start('site', 'b', 2)
+        trace.add('inference', 0.25)
+        trace.dropped = 'publish'
+        self.assertTrue(recorder.finish(trace))
+        recorder.close()
+
+        records = load_traces([str(recorder.path)])
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['stream'], 'b')
+        self.assertEqual(records[0]['dropped'], 'publish')
+        name, offset, seconds = records[0]['spans'][0]
+        self.assertEqual((name, seconds), ('inference', 0.25))
+        self.assertLess(offset, 0)
+
+    def test_slow_frames_are_kept(self) -> None:
+        """
+        Test that frames over the slow threshold are always written.
+        """
+        recorder = TraceRecorder(
+            sample_rate=0, slow_seconds=5,
+            directory=self.directory.name, rng=lambda: 1.0,
+        )
+        trace = FrameTrace('site', 'gate', 0, start=0)
+        with patch('src.frame_trace.time.monotonic', return_value=20):
+            self.assertTrue(recorder.finish(trace))
+        recorder.close()
+        self.assertEqual(load_traces([str(recorder.path)])[0]['total'], 20)
+
+    def test_batched_writes(self) -> None:
+        """
+        Test that records are appended once a batch is full.
+        """
+        recorder = TraceRecorder(
+            sample_rate=1, slow_seconds=0, directory=self.directory.name,
+            rng=lambda: 0.0, batch_size=2, flush_interval=60,
+        )
+        self.addCleanup(recorder.close)
+        recorder.finish(recorder.start('site', 'gate', 0))
+        self.assertFalse(recorder.path.exists())
+        recorder.finish(recorder.start('site', 'gate', 1))
+        self.assertEqual(len(load_traces([str(recorder.path)])), 2)
+        self.assertEqual(recorder.buffer, [])
+
+    def test_truncated_lines_are_skipped(self) -> None:
+        """
+        Test that a partly written last line does not stop the analysis.
+        """
+        path = Path(self.directory.name) / 'trace-1.jsonl'
+        path.write_text(json.dumps(record('gate', 1)) + '\n{"site":')
+        self.assertEqual(len(load_traces([str(path)])), 1)
+
+
+class TestTraceAnalysis(unittest.TestCase):
+    """
+    Unit tests for the offline analysis of the traces.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up ten usual frames per camera and one 20-second frame.
+        """
+        self.records = [
+            record(stream, 0.5) for stream in ('gate', 'crane')
+            for _ in range(10)
+        ] + [record('crane', 20)]
+
+    def test_percentile(self) -> None:
+        """
+        Test the interpolated percentiles.
+        """
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(percentile([1, 2], 75), 1.75)
+        self.assertEqual(percentile([], 99), 0)
+
+    def test_breakdown(self) -> None:
+        """
+        Test that time outside the spans is reported as queueing.
+        """
+        summary = breakdown([
+            record('gate', 1.0, [
+                ['capture_wait', -2.0, 2.0],
+                ['inference', 0.0, 0.4],
+                ['redis_publish', 0.9, 0.1],
+            ]),
+        ])
+        self.assertEqual(summary['capture_wait']['max'], 2.0)
+        self.assertAlmostEqual(summary['queueing']['max'], 0.5)
+        self.assertEqual(summary['total']['count'], 1)
+
+    def test_outliers(self) -> None:
+        """
+        Test that frames far slower than their camera are listed.
+        """
+        found = outliers(self.records, top=5, factor=3)
+        self.assertEqual([item['total'] for item in found], [20])
+        self.assertEqual(found[0]['stream'], 'crane')
+
+    def test_main(self) -> None:
+        """
+        Test the report printed by the command line interface.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'trace-1.jsonl'
+            path.write_text(
+                ''.join(json.dumps(item) + '\n' for item in self.records),
+            )
+            with patch.object(
+                sys, 'argv', ['frame_trace.py', str(path), '--top', '1'],
+            ), patch('sys.stdout', new_callable=StringIO) as stdout:
+                main()
+        output = stdout.getvalue()
+        self.assertIn('site/crane', output)
+        self.assertIn(
+            'site/crane at 0.0: 20.000s, longest span inference', output,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -113,6 +113,11 @@ class TestLiveStreamDetector(unittest.TestCase):
             self.assertIsInstance(data[4], float)
             self.assertIsInstance(data[5], int)
 
+        # The stage timings of the frame are recorded
+        self.assertEqual(
+            set(self.detector.timings), {'inference', 'postprocess'},
+        )
+
     @pytest.mark.asyncio
     async def test_run_detection(self) -> None:
         """
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 import os
+import tempfile
 import unittest
 from datetime import datetime
 from datetime import timedelta
@@ -28,8 +29,14 @@ class TestLineMessenger(unittest.TestCase):
         logging.basicConfig(level=logging.ERROR)
 
         self.channel_access_token = 'test_channel_access_token'
+        # Keep the upload records out of the tracked config folder
+        self.records_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.records_dir.cleanup)
         self.messenger = LineMessenger(
             channel_access_token=self.channel_access_token,
+            image_record_file=os.path.join(
+                self.records_dir.name, 'image_records.json',
+            ),
         )
         self.message = 'Test message'
         self.recipient_id = 'test_recipient_id'
@@ -144,6 +144,30 @@ class TestLineNotifier(unittest.TestCase):
         image: Image.Image = Image.open(image_file[1])
         self.assertTrue(np.array_equal(np.array(image), self.image))
 
+    @patch('src.notifiers.line_notifier.requests.post')
+    def test_send_notification_with_jpeg_bytes(
+        self,
+        mock_post: MagicMock,
+    ) -> None:
+        """
+        Test case for sending already JPEG-encoded bytes without re-encoding.
+        """
+        mock_response: MagicMock = MagicMock()
+        mock_response.status_code = 200
+        mock_post.return_value = mock_response
+
+        buffer: BytesIO = BytesIO()
+        Image.fromarray(self.image).save(buffer, format='JPEG')
+        image_bytes: bytes = buffer.getvalue()
+
+        self.notifier.send_notification(
+            self.message, image_bytes, line_token=self.line_token,
+        )
+        image_file = mock_post.call_args.kwargs['files']['imageFile']
+        self.assertEqual(image_file[0], 'image.jpg')
+        self.assertEqual(image_file[2], 'image/jpeg')
+        self.assertEqual(image_file[1].getvalue(), image_bytes)
+
     @patch('src.notifiers.line_notifier.requests.post')
     def test_main(self, mock_post: MagicMock) -> None:
         """
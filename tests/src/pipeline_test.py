@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from collections.abc import AsyncIterator
+
+from src.pipeline import BLOCK
+from src.pipeline import DROP_OLDEST
+from src.pipeline import Pipeline
+from src.pipeline import Stage
+
+
+async def count(items: int, interval: float = 0) -> AsyncIterator[int]:
+    """
+    Yield consecutive integers, like frames from a capture.
+
+    Args:
+        items (int): The number of items.
+        interval (float): Seconds between items.
+
+    Yields:
+        int: The next integer.
+    """
+    for item in range(items):
+        yield item
+        await asyncio.sleep(interval)
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    """
+    Unit tests for the staged pipeline.
+    """
+
+    async def test_stages_in_order(self) -> None:
+        """
+        Test that every item goes through the stages in order.
+        """
+        results: list[int] = []
+
+        async def double(item: int) -> int:
+            return item * 2
+
+        async def collect(item: int) -> None:
+            results.append(item)
+
+        pipeline = Pipeline([
+            Stage('double', double, maxsize=2),
+            Stage('collect', collect, maxsize=2),
+        ])
+        await pipeline.run(count(5))
+        self.assertEqual(results, [0, 2, 4, 6, 8])
+        self.assertEqual(pipeline.stats()['double']['processed'], 5)
+
+    async def test_stages_overlap(self) -> None:
+        """
+        Test that stages work on different items at once, and that the
+        slowest stage is reported as the bottleneck.
+        """
+        third_started = asyncio.Event()
+
+        async def first(item: int) -> int:
+            if item == 2:
+                third_started.set()
+            return item
+
+        async def slow(item: int) -> int:
+            await asyncio.sleep(0.02)
+            return item
+
+        async def last(item: int) -> int:
+            # Sequential stages would only start the third item after
+            # the first one left the last stage, and time out here
+            if item == 0:
+                await asyncio.wait_for(third_started.wait(), timeout=5)
+            return item
+
+        pipeline = Pipeline([
+            Stage('first', first, maxsize=1),
+            Stage('slow', slow, maxsize=1),
+            Stage('last', last, maxsize=1),
+        ])
+        await pipeline.run(count(5))
+        stats = pipeline.stats()
+        self.assertEqual(stats['last']['processed'], 5)
+        self.assertEqual(pipeline.bottleneck(), stats['slow']['latency'])
+        self.assertGreaterEqual(pipeline.bottleneck(), 0.015)
+
+    async def test_drop_oldest(self) -> None:
+        """
+        Test that a slow stage drops stale items instead of blocking.
+        """
+        seen: list[int] = []
+
+        async def slow(item: int) -> None:
+            seen.append(item)
+            await asyncio.sleep(0.05)
+
+        dropped: list[int] = []
+        stage = Stage('slow', slow, maxsize=1, policy=DROP_OLDEST)
+        await Pipeline(
+            [stage], on_drop=lambda _, item: dropped.append(item),
+        ).run(count(10, interval=0.01))
+        self.assertLess(len(seen), 10)
+        # The newest item is always processed
+        self.assertEqual(seen[-1], 9)
+        self.assertEqual(stage.dropped + stage.processed, 10)
+        # Every dropped item is handed to the callback
+        self.assertEqual(sorted(seen + dropped), list(range(10)))
+
+    async def test_block(self) -> None:
+        """
+        Test that a blocking stage applies backpressure to the source.
+        """
+        produced: list[int] = []
+
+        async def source() -> AsyncIterator[int]:
+            for item in range(5):
+                produced.append(item)
+                yield item
+
+        release = asyncio.Event()
+
+        async def wait(item: int) -> None:
+            await release.wait()
+
+        task = asyncio.create_task(
+            Pipeline([Stage('wait', wait, maxsize=1, policy=BLOCK)]).run(
+                source(),
+            ),
+        )
+        await asyncio.sleep(0.05)
+        # One item in the stage, one queued and one waiting to be queued
+        self.assertEqual(produced, [0, 1, 2])
+        release.set()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(produced, [0, 1, 2, 3, 4])
+
+    async def test_failed_item(self) -> None:
+        """
+        Test that an item a stage fails on is logged and dropped, and
+        that the following items are still processed.
+        """
+        results: list[int] = []
+        dropped: list[tuple[str, int]] = []
+
+        async def check(item: int) -> int:
+            if item == 1:
+                raise RuntimeError('inference failed')
+            return item
+
+        async def collect(item: int) -> None:
+            results.append(item)
+
+        pipeline = Pipeline(
+            [Stage('check', check), Stage('collect', collect)],
+            on_drop=lambda stage, item: dropped.append((stage, item)),
+        )
+        with self.assertLogs(level='ERROR') as logs:
+            await asyncio.wait_for(pipeline.run(count(3)), 1)
+        self.assertIn('Stage check failed', logs.output[0])
+        self.assertEqual(results, [0, 2])
+        self.assertEqual(dropped, [('check', 1)])
+        self.assertEqual(pipeline.stats()['check']['failed'], 1)
+
+    async def test_failed_source(self) -> None:
+        """
+        Test that a failing source stops the pipeline with its error.
+        """
+        async def source() -> AsyncIterator[int]:
+            yield 0
+            raise RuntimeError('camera offline')
+
+        async def handler(item: int) -> int:
+            return item
+
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(
+                Pipeline([Stage('stage', handler)]).run(source()), 1,
+            )
+
+    def test_invalid_stage(self) -> None:
+        """
+        Test that unknown policies and unbounded queues are rejected.
+        """
+        async def handler(item: int) -> int:
+            return item
+
+        with self.assertRaises(ValueError):
+            Stage('stage', handler, policy='drop_newest')
+        with self.assertRaises(ValueError):
+            Stage('stage', handler, maxsize=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
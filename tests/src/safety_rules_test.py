@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+
+from src.danger_detector import DangerDetector
+from src.safety_rules import compile_rules
+from src.safety_rules import DEFAULT_SAFETY_RULES
+from src.safety_rules import driver_matrix
+from src.safety_rules import evaluate_rules
+from src.safety_rules import merge_rule_config
+from src.safety_rules import pairwise_overlap
+from src.safety_rules import proximity_matrix
+
+
+class TestSafetyRules(unittest.TestCase):
+    """
+    Unit tests for the compiled safety rules.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up detections forming a controlled area with a person inside.
+        """
+        self.cone_datas: list[list[float]] = [
+            [100, 100, 120, 120, 0.9, 6],
+            [150, 150, 170, 170, 0.85, 6],
+            [130, 130, 140, 140, 0.95, 5],
+            [200, 200, 220, 220, 0.89, 6],
+            [250, 250, 270, 270, 0.85, 6],
+            [450, 450, 470, 470, 0.92, 6],
+            [500, 500, 520, 520, 0.88, 6],
+            [550, 550, 570, 570, 0.86, 6],
+            [600, 600, 620, 620, 0.84, 6],
+            [650, 650, 670, 670, 0.82, 6],
+            [700, 700, 720, 720, 0.80, 6],
+        ]
+
+    def test_merge_rule_config_defaults(self) -> None:
+        """
+        Test that no overrides yields the default rules.
+        """
+        self.assertEqual(merge_rule_config(None), DEFAULT_SAFETY_RULES)
+
+    def test_merge_rule_config_overrides(self) -> None:
+        """
+        Test boolean toggles and parameter overrides.
+        """
+        merged = merge_rule_config({
+            'controlled_area': False,
+            'no_hardhat': {'overlap_threshold': 0.3},
+        })
+        self.assertFalse(merged['controlled_area']['enabled'])
+        self.assertEqual(merged['no_hardhat']['overlap_threshold'], 0.3)
+        self.assertTrue(merged['no_hardhat']['enabled'])
+
+        # The defaults must not be mutated
+        self.assertTrue(DEFAULT_SAFETY_RULES['controlled_area']['enabled'])
+
+    def test_merge_rule_config_unknown(self) -> None:
+        """
+        Test that unknown rules and parameters are rejected.
+        """
+        with self.assertRaises(ValueError):
+            merge_rule_config({'no_gloves': True})
+        with self.assertRaises(ValueError):
+            merge_rule_config({'no_hardhat': {'threshold': 0.3}})
+
+    def test_merge_rule_config_null_rule(self) -> None:
+        """
+        Test that rules that are neither mappings nor booleans, such as
+        an empty ``no_hardhat:``, are rejected with the rule name.
+        """
+        for params in (None, 'off', [0.5]):
+            with self.subTest(params=params):
+                with self.assertRaisesRegex(ValueError, 'no_hardhat'):
+                    merge_rule_config({'no_hardhat': params})
+
+    def test_compile_rules_skips_disabled(self) -> None:
+        """
+        Test that disabled rules are not compiled.
+        """
+        rules = compile_rules({
+            'controlled_area': False,
+            'close_to_machinery': False,
+        })
+        self.assertEqual(
+            [rule.name for rule in rules],
+            ['driver_exclusion', 'no_hardhat', 'no_safety_vest'],
+        )
+
+    def test_pairwise_overlap(self) -> None:
+        """
+        Test the overlap matrix of two sets of boxes.
+        """
+        boxes1 = np.array([[100, 100, 200, 200], [0, 0, 10, 10]], float)
+        boxes2 = np.array([[150, 150, 250, 250], [100, 100, 200, 200]], float)
+        np.testing.assert_allclose(
+            pairwise_overlap(boxes1, boxes2), [[1 / 7, 1.0], [0.0, 0.0]],
+        )
+
+    def test_driver_matrix(self) -> None:
+        """
+        Test the driver check of persons within a vehicle.
+        """
+        persons = np.array([
+            [150, 250, 170, 350],
+            [50, 250, 90, 300],
+            [150, 210, 180, 300],
+            [150, 300, 180, 450],
+        ], float)
+        vehicles = np.array([[100, 200, 300, 400]], float)
+        self.assertEqual(
+            driver_matrix(persons, vehicles)[:, 0].tolist(),
+            [True, False, True, False],
+        )
+
+    def test_proximity_matrix(self) -> None:
+        """
+        Test the proximity check of persons to a machine.
+        """
+        persons = np.array([
+            [100, 100, 120, 120],
+            [0, 0, 10, 10],
+        ], float)
+        vehicles = np.array([[110, 110, 200, 200]], float)
+        matrix = proximity_matrix(
+            persons, vehicles, np.array([0.05]), 5.0, 1.5,
+        )
+        self.assertEqual(matrix[:, 0].tolist(), [True, False])
+
+    def test_evaluate_rules_records_timings(self) -> None:
+        """
+        Test that each enabled rule records its evaluation time.
+        """
+        rules = compile_rules()
+        timings: dict[str, float] = {}
+        warnings, polygons = evaluate_rules(rules, self.cone_datas, timings)
+        self.assertEqual(set(timings), set(DEFAULT_SAFETY_RULES))
+        self.assertTrue(all(t >= 0 for t in timings.values()))
+        self.assertIn(
+            'Warning: 1 people have entered the controlled area!', warnings,
+        )
+        self.assertTrue(polygons)
+
+    def test_disabled_controlled_area(self) -> None:
+        """
+        Test that a disabled rule produces no warnings or polygons.
+        """
+        detector = DangerDetector({'controlled_area': False})
+        warnings, polygons = detector.detect_danger(self.cone_datas)
+        self.assertEqual(warnings, [])
+        self.assertEqual(polygons, [])
+        self.assertNotIn('controlled_area', detector.rule_timings)
+
+    def test_close_to_vehicle_thresholds(self) -> None:
+        """
+        Test that proximity thresholds come from the configuration.
+        """
+        datas: list[list[float]] = [
+            [100, 100, 120, 120, 0.95, 5],  # Person
+            [110, 110, 200, 200, 0.85, 9],  # Vehicle
+        ]
+        warnings, _ = DangerDetector().detect_danger(datas)
+        self.assertIn('Warning: Someone is too close to vehicle!', warnings)
+
+        strict = DangerDetector({
+            'close_to_machinery': {'vehicle_area_ratio': 0.01},
+        })
+        warnings, _ = strict.detect_danger(datas)
+        self.assertNotIn(
+            'Warning: Someone is too close to vehicle!', warnings,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from src.stage_metrics import render
+from src.stage_metrics import StageMetrics
+
+
+class TestStageMetrics(unittest.TestCase):
+    """
+    Unit tests for the per-stage latency metrics.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up metrics with three buckets.
+        """
+        self.metrics = StageMetrics(buckets=(0.1, 1.0, 10.0))
+
+    def test_observe(self) -> None:
+        """
+        Test that samples land in the first bucket they fit in.
+        """
+        for seconds in (0.05, 0.1, 0.5, 20):
+            self.metrics.observe('site', 'gate', 'inference', seconds)
+        self.assertEqual(
+            self.metrics.histograms[('site', 'gate', 'inference')],
+            [2, 1, 0, 1, 20.65, 4],
+        )
+
+    def test_flush(self) -> None:
+        """
+        Test that snapshots are sent at most once per interval.
+        """
+        send = MagicMock()
+        self.metrics.count('site', 'gate', 'notifications', 'sent')
+        with patch('src.stage_metrics.time.monotonic', return_value=1e9):
+            self.assertTrue(self.metrics.flush(send, interval=5))
+            self.assertFalse(self.metrics.flush(send, interval=5))
+        report = send.call_args.args[0]
+        self.assertEqual(report['type'], 'metrics')
+        self.assertEqual(
+            report['snapshot']['counters'],
+            {('site', 'gate', 'notifications', 'sent'): 1},
+        )
+
+    def test_render(self) -> None:
+        """
+        Test that worker snapshots are merged into the text format.
+        """
+        other = StageMetrics(buckets=(0.1, 1.0, 10.0))
+        self.metrics.observe('site', 'gate', 'inference', 0.05)
+        other.observe('site', 'gate', 'inference', 0.5)
+        other.count('site', 'gate', 'notifications', 'failed')
+
+        text = render([self.metrics.snapshot(), other.snapshot()])
+        name = 'hazard_detection_stage_duration_seconds'
+        labels = 'site="site",stream="gate",stage="inference"'
+        self.assertIn(f'{name}_bucket{{{labels},le="0.1"}} 1\n', text)
+        self.assertIn(f'{name}_bucket{{{labels},le="1.0"}} 2\n', text)
+        self.assertIn(f'{name}_bucket{{{labels},le="+Inf"}} 2\n', text)
+        self.assertIn(f'{name}_sum{{{labels}}} 0.550000\n', text)
+        self.assertIn(f'{name}_count{{{labels}}} 2\n', text)
+        self.assertIn(
+            'hazard_detection_notifications_total'
+            '{site="site",stream="gate",status="failed"} 1\n',
+            text,
+        )
+
+    def test_render_escapes_labels(self) -> None:
+        """
+        Test that quotes in stream names do not break the format.
+        """
+        self.metrics.observe(None, 'Gate "A"', 'decode', 0.01)
+        text = render([self.metrics.snapshot()])
+        self.assertIn('site="None",stream="Gate \\"A\\""', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
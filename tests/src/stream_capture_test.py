@@ -7,6 +7,7 @@ from unittest import TestCase
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import numpy as np
 import pytest
 
 from src.stream_capture import main as stream_capture_main
@@ -306,6 +307,23 @@ class TestStreamCapture(TestCase):
         # Release resources
         await self.stream_capture.release_resources()
 
+    def test_read_frame(self) -> None:
+        """
+        Test that reading a frame records the read time.
+        """
+        self.assertEqual(self.stream_capture.read_frame(), (False, None))
+
+        frame = np.zeros((4, 4, 3), dtype=np.uint8)
+        self.stream_capture.cap = MagicMock()
+        self.stream_capture.cap.read.return_value = (True, frame)
+        self.assertEqual(self.stream_capture.read_frame(), (True, frame))
+        self.assertGreaterEqual(self.stream_capture.read_time, 0)
+
+        # Released frames are decoded into again
+        self.stream_capture.release_frame(frame)
+        self.stream_capture.read_frame()
+        self.assertIs(self.stream_capture.cap.read.call_args.args[0], frame)
+
     def test_update_capture_interval(self) -> None:
         """
         Test that the capture interval is updated correctly.
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import tempfile
+import threading
 import unittest
 from datetime import datetime
 from datetime import timedelta
+from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import pytest
+from shapely.geometry import Polygon
 from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
 
 from src.utils import FileEventHandler
 from src.utils import RedisManager
@@ -28,6 +35,17 @@ class TestUtils(unittest.TestCase):
         # Test with None (should return False)
         self.assertFalse(Utils.is_expired(None))
 
+    def test_diff_configs(self):
+        """
+        Test the added, removed and changed streams of a reload.
+        """
+        old = {'a': {'site': 'x'}, 'b': {'site': 'x'}, 'c': {'site': 'x'}}
+        new = {'a': {'site': 'x'}, 'c': {'site': 'y'}, 'd': {'site': 'x'}}
+        self.assertEqual(
+            Utils.diff_configs(old, new),
+            {'added': ['d'], 'removed': ['b'], 'changed': ['c']},
+        )
+
 
 @pytest.mark.asyncio
 class TestFileEventHandler(unittest.TestCase):
@@ -77,6 +95,73 @@ class TestFileEventHandler(unittest.TestCase):
         mock_callback.assert_not_called()
 
 
+class TestFileEventHandlerReload(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for the debounced reloads of FileEventHandler.
+    """
+
+    def setUp(self):
+        """
+        Set up a watched file.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'config.yaml')
+        with open(self.file_path, 'w') as file:
+            file.write('- video_url: a\n')
+
+    def tearDown(self):
+        """
+        Remove the watched file.
+        """
+        self.directory.cleanup()
+
+    async def test_burst_is_debounced(self):
+        """
+        Test that a burst of events reloads once, on the event loop.
+        """
+        callback = AsyncMock()
+        handler = FileEventHandler(self.file_path, callback, debounce=0.05)
+        with open(self.file_path, 'a') as file:
+            file.write('- video_url: b\n')
+
+        # Events are delivered from the watchdog thread
+        event = FileModifiedEvent(self.file_path)
+        thread = threading.Thread(
+            target=lambda: [handler.on_modified(event) for _ in range(5)],
+        )
+        thread.start()
+        thread.join()
+
+        await asyncio.sleep(0.2)
+        callback.assert_awaited_once()
+
+    async def test_unchanged_content_is_skipped(self):
+        """
+        Test that events without a content change do not reload.
+        """
+        callback = AsyncMock()
+        handler = FileEventHandler(self.file_path, callback, debounce=0)
+        handler.on_modified(FileModifiedEvent(self.file_path))
+        await asyncio.sleep(0.05)
+        callback.assert_not_awaited()
+
+        # Saving by renaming a temporary file is a change too
+        with open(self.file_path, 'w') as file:
+            file.write('- video_url: c\n')
+        handler.on_moved(FileMovedEvent('/tmp/config.yaml~', self.file_path))
+        await asyncio.sleep(0.05)
+        callback.assert_awaited_once()
+
+    async def test_other_file_is_ignored(self):
+        """
+        Test that events of other files are ignored.
+        """
+        handler = FileEventHandler(self.file_path, AsyncMock(), debounce=0)
+        handler.on_modified(FileModifiedEvent('/path/to/other/file.txt'))
+        await asyncio.sleep(0.05)
+        self.assertIsNone(handler.timer)
+
+
 @pytest.mark.asyncio
 class TestRedisManager(unittest.TestCase):
     """
@@ -173,5 +258,325 @@ class TestRedisManager(unittest.TestCase):
             await self.redis_manager.delete(key)
 
 
+class TestRedisManagerPools(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for the per-process connection pools of RedisManager.
+    """
+
+    def test_pool_settings(self):
+        """
+        Test that the pool is created lazily with the configured limits.
+        """
+        redis_manager = RedisManager(
+            pool_size=4,
+            health_check_interval=15,
+            socket_timeout=2.5,
+            socket_connect_timeout=1.5,
+        )
+        self.assertEqual(redis_manager._clients, {})
+
+        pool = redis_manager.redis.connection_pool
+        self.assertEqual(pool.max_connections, 4)
+        self.assertEqual(pool.timeout, 1.5)
+        self.assertEqual(pool.connection_kwargs['health_check_interval'], 15)
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 2.5)
+        self.assertEqual(
+            pool.connection_kwargs['socket_connect_timeout'], 1.5,
+        )
+
+    @patch.dict(
+        'os.environ',
+        {'REDIS_POOL_SIZE': '3', 'REDIS_HEALTH_CHECK_INTERVAL': '0'},
+    )
+    def test_pool_settings_from_env(self):
+        """
+        Test that the pool limits default to the environment variables.
+        """
+        redis_manager = RedisManager()
+        self.assertEqual(redis_manager.pool_size, 3)
+        self.assertEqual(redis_manager.health_check_interval, 0)
+
+    @patch('src.utils.os.getpid')
+    def test_new_client_per_process(self, mock_getpid):
+        """
+        Test that a forked process gets its own client and pool.
+        """
+        redis_manager = RedisManager()
+        mock_getpid.return_value = 100
+        parent = redis_manager.redis
+        self.assertIs(redis_manager.redis, parent)
+
+        mock_getpid.return_value = 101
+        child = redis_manager.redis
+        self.assertIsNot(child, parent)
+        self.assertIsNot(child.connection_pool, parent.connection_pool)
+        self.assertEqual(list(redis_manager._clients), [101])
+
+    async def test_pipeline_and_close(self):
+        """
+        Test the pipeline helper and closing the pool of the process.
+        """
+        client = MagicMock()
+        client.aclose = AsyncMock()
+        redis_manager = RedisManager()
+        redis_manager.redis = client
+
+        redis_manager.pipeline(transaction=True)
+        client.pipeline.assert_called_once_with(transaction=True)
+
+        await redis_manager.close()
+        client.aclose.assert_awaited_once()
+        self.assertEqual(redis_manager._clients, {})
+
+
+class TestRedisManagerViewers(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for the viewer heartbeat checks of RedisManager.
+    """
+
+    def setUp(self):
+        """
+        Set up a RedisManager instance with a mocked async Redis client.
+        """
+        self.mock_redis_instance = AsyncMock()
+        self.redis_manager = RedisManager()
+        self.redis_manager.redis = self.mock_redis_instance
+
+    async def test_has_viewers(self):
+        """
+        Test the heartbeat key is checked for the stream.
+        """
+        self.mock_redis_instance.exists.return_value = 1
+        self.assertTrue(await self.redis_manager.has_viewers('site_cam'))
+        self.mock_redis_instance.exists.assert_awaited_once_with(
+            '_viewers:site_cam',
+        )
+
+        self.mock_redis_instance.exists.return_value = 0
+        self.assertFalse(await self.redis_manager.has_viewers('site_cam'))
+
+    async def test_has_viewers_error(self):
+        """
+        Test that errors are logged and treated as being viewed.
+        """
+        self.mock_redis_instance.exists.side_effect = Exception('Redis error')
+        with self.assertLogs(level='ERROR'):
+            self.assertTrue(await self.redis_manager.has_viewers('site_cam'))
+
+
+class TestRedisManagerPublish(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for publishing frames with RedisManager.
+    """
+
+    def setUp(self):
+        """
+        Set up a RedisManager instance with a mocked pipeline.
+        """
+        self.mock_redis_instance = MagicMock()
+        self.pipe = MagicMock()
+        self.pipe.__aenter__.return_value = self.pipe
+        self.pipe.execute = AsyncMock()
+        self.mock_redis_instance.pipeline.return_value = self.pipe
+        self.redis_manager = RedisManager()
+        self.redis_manager.redis = self.mock_redis_instance
+
+    def test_build_stream_entry(self):
+        """
+        Test the compact serialisation of detections.
+        """
+        entry = RedisManager.build_stream_entry({
+            'stream_name': 'site_cam',
+            'frame': b'frame',
+            'datas': [[1.234, 2, 3, 4, 0.9123, 5.0]],
+            'warnings': ['Warning: Someone is not wearing a hardhat!'],
+            'polygons': [Polygon([(0, 0), (10, 0), (10, 10)])],
+            'timestamp': 1700000000.5,
+        })
+        self.assertEqual(entry['frame'], b'frame')
+        self.assertEqual(entry['detections'], '[[1.2,2.0,3.0,4.0,0.91,5]]')
+        self.assertEqual(
+            entry['warnings'],
+            '["Warning: Someone is not wearing a hardhat!"]',
+        )
+        self.assertEqual(
+            entry['polygons'],
+            '[[[0.0,0.0],[10.0,0.0],[10.0,10.0],[0.0,0.0]]]',
+        )
+        self.assertEqual(entry['timestamp'], '1700000000.5')
+        self.assertEqual(entry['annotated'], '1')
+
+        raw = RedisManager.build_stream_entry({
+            'stream_name': 'site_cam', 'frame': b'frame', 'annotated': False,
+        })
+        self.assertEqual(raw['annotated'], '0')
+
+    async def test_publish_frames_single_round_trip(self):
+        """
+        Test that several streams are published in one pipeline.
+        """
+        await self.redis_manager.publish_frames(
+            [
+                {'stream_name': 'site_cam1', 'frame': b'1'},
+                {'stream_name': 'site_cam2', 'frame': b'2'},
+            ],
+            maxlen=5,
+        )
+        self.mock_redis_instance.pipeline.assert_called_once_with(
+            transaction=True,
+        )
+        self.assertEqual(self.pipe.xadd.call_count, 2)
+        name, fields = self.pipe.xadd.call_args_list[0].args
+        self.assertEqual(name, 'site_cam1')
+        self.assertEqual(fields['frame'], b'1')
+        self.assertEqual(
+            self.pipe.xadd.call_args_list[0].kwargs,
+            {'maxlen': 5, 'approximate': True},
+        )
+        self.pipe.execute.assert_awaited_once()
+
+    async def test_publish_frame_updates_camera_index(self):
+        """
+        Test that the camera index is updated in the publish transaction.
+        """
+        await self.redis_manager.publish_frame({
+            'stream_name': 'Factory_1_camera_1',
+            'site': 'Factory_1',
+            'camera': 'camera_1',
+            'frame': b'1',
+            'timestamp': 1700000000.5,
+        })
+        self.pipe.hset.assert_any_call('_cameras', 'Factory_1', '1700000000.5')
+        self.pipe.hset.assert_any_call(
+            '_cameras:Factory_1',
+            'camera_1',
+            '{"stream":"Factory_1_camera_1","timestamp":1700000000.5}',
+        )
+        self.pipe.execute.assert_awaited_once()
+
+    async def test_publish_frame_without_site(self):
+        """
+        Test that frames without a site and camera are not indexed.
+        """
+        await self.redis_manager.publish_frame(
+            {'stream_name': 'site_cam', 'frame': b'1'},
+        )
+        self.pipe.xadd.assert_called_once()
+        self.pipe.hset.assert_not_called()
+
+    async def test_publish_frame_error(self):
+        """
+        Test that publishing errors are logged.
+        """
+        self.pipe.execute.side_effect = Exception('Redis error')
+        with self.assertLogs(level='ERROR'):
+            await self.redis_manager.publish_frame(
+                {'stream_name': 'site_cam', 'frame': b'1'},
+            )
+
+    async def test_publish_frame_stream_budget(self):
+        """
+        Test that streams are trimmed to their byte budget and expire.
+        """
+        redis_manager = RedisManager(stream_budget_bytes=1000, stream_ttl=60)
+        redis_manager.redis = self.mock_redis_instance
+        await redis_manager.publish_frame({
+            'stream_name': 'Factory_1_camera_1',
+            'site': 'Factory_1',
+            'camera': 'camera_1',
+            'frame': bytes(300),
+        })
+        # Only three frames of about 300 bytes fit in 1000 bytes
+        self.assertEqual(self.pipe.xadd.call_args.kwargs['maxlen'], 3)
+        self.pipe.expire.assert_any_call('Factory_1_camera_1', 60)
+        self.pipe.expire.assert_any_call('_cameras:Factory_1', 60)
+
+    def test_budget_maxlen(self):
+        """
+        Test the stream length kept within the byte budget.
+        """
+        redis_manager = RedisManager(stream_budget_bytes=1000)
+        self.assertEqual(redis_manager.budget_maxlen(100, 5), 5)
+        self.assertEqual(redis_manager.budget_maxlen(300, 5), 3)
+        # The newest frame is always kept
+        self.assertEqual(redis_manager.budget_maxlen(5000, 5), 1)
+
+    async def test_publish_frame_without_ttl(self):
+        """
+        Test that streams are kept forever with a TTL of 0.
+        """
+        redis_manager = RedisManager(stream_ttl=0)
+        redis_manager.redis = self.mock_redis_instance
+        await redis_manager.publish_frame({
+            'stream_name': 'Factory_1_camera_1',
+            'site': 'Factory_1',
+            'camera': 'camera_1',
+            'frame': b'1',
+        })
+        self.pipe.expire.assert_not_called()
+
+    async def test_remove_stream(self):
+        """
+        Test that removing the last camera of a site unlists the site.
+        """
+        self.mock_redis_instance.hdel = AsyncMock()
+        self.pipe.execute.return_value = [1, 1, 0]
+        await self.redis_manager.remove_stream('Factory_1', 'camera_1')
+        self.pipe.delete.assert_called_once_with('Factory_1_camera_1')
+        self.pipe.hdel.assert_called_once_with(
+            '_cameras:Factory_1', 'camera_1',
+        )
+        self.mock_redis_instance.hdel.assert_awaited_once_with(
+            '_cameras', 'Factory_1',
+        )
+
+        # Sites with other cameras stay listed
+        self.mock_redis_instance.hdel.reset_mock()
+        self.pipe.execute.return_value = [1, 1, 2]
+        await self.redis_manager.remove_stream('Factory_1', 'camera_2')
+        self.mock_redis_instance.hdel.assert_not_awaited()
+
+    async def test_memory_report(self):
+        """
+        Test measuring the memory of each indexed stream.
+        """
+        self.mock_redis_instance.hkeys = AsyncMock(
+            return_value=[b'Factory_1'],
+        )
+        self.pipe.execute.side_effect = [
+            [{
+                b'camera_1': b'{"stream":"Factory_1_camera_1"}',
+                b'camera_2': b'{"stream":"Factory_1_camera_2"}',
+            }],
+            [1024, 4096],
+        ]
+        report = await self.redis_manager.memory_report()
+        self.assertEqual(
+            report,
+            {'Factory_1_camera_2': 4096, 'Factory_1_camera_1': 1024},
+        )
+        self.pipe.hgetall.assert_called_once_with('_cameras:Factory_1')
+        self.pipe.memory_usage.assert_any_call(
+            'Factory_1_camera_1', samples=0,
+        )
+
+    async def test_memory_report_error(self):
+        """
+        Test that errors are logged and yield an empty report.
+        """
+        self.mock_redis_instance.hkeys = AsyncMock(
+            side_effect=Exception('Redis error'),
+        )
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(await self.redis_manager.memory_report(), {})
+
+    async def test_publish_frames_empty(self):
+        """
+        Test that nothing is sent without frames.
+        """
+        await self.redis_manager.publish_frames([])
+        self.mock_redis_instance.pipeline.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main()
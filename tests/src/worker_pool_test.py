@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import unittest
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from src.worker_pool import assign_streams
+from src.worker_pool import run_worker
+from src.worker_pool import serve
+from src.worker_pool import worker_count
+from src.worker_pool import WorkerPool
+
+
+class TestWorkerCount(unittest.TestCase):
+    """
+    Unit tests for sizing the worker pool.
+    """
+
+    def test_fixed_count(self) -> None:
+        """
+        Test that a fixed number of workers is used as is.
+        """
+        self.assertEqual(worker_count(3), 3)
+        with patch.dict('os.environ', {'WORKER_PROCESSES': '5'}):
+            self.assertEqual(worker_count(), 5)
+
+    @patch('src.worker_pool.os.sysconf')
+    @patch('src.worker_pool.os.cpu_count', return_value=32)
+    def test_limited_by_memory(self, _, mock_sysconf: MagicMock) -> None:
+        """
+        Test that the pool is sized by the smaller of cores and memory.
+        """
+        # 16 GiB of physical memory in 4 KiB pages
+        mock_sysconf.side_effect = lambda name: (
+            4096 if name == 'SC_PAGE_SIZE' else 4 * 1024 * 1024
+        )
+        with patch.dict('os.environ', {'WORKER_PROCESSES': '0'}):
+            self.assertEqual(worker_count(memory_per_worker_mb=2048), 8)
+            self.assertEqual(worker_count(memory_per_worker_mb=256), 32)
+            self.assertEqual(worker_count(memory_per_worker_mb=65536), 1)
+
+
+class TestAssignStreams(unittest.TestCase):
+    """
+    Unit tests for balancing streams over workers.
+    """
+
+    def test_balanced(self) -> None:
+        """
+        Test that each worker gets an equal share, give or take one.
+        """
+        streams = [f"rtsp://camera{i}" for i in range(10)]
+        assignments = assign_streams(streams, {}, 4)
+        loads = [list(assignments.values()).count(w) for w in range(4)]
+        self.assertEqual(sorted(loads), [2, 2, 3, 3])
+
+    def test_fewer_streams_than_workers(self) -> None:
+        """
+        Test that no more workers than streams are used.
+        """
+        self.assertEqual(assign_streams(['a', 'b'], {}, 8), {'a': 0, 'b': 1})
+        self.assertEqual(assign_streams([], {'a': 0}, 8), {})
+
+    def test_sticky(self) -> None:
+        """
+        Test that only the streams over a worker's share are moved.
+        """
+        current = {'a': 0, 'b': 0, 'c': 0, 'd': 1}
+        streams = ['a', 'b', 'c', 'd', 'e', 'f']
+        assignments = assign_streams(streams, current, 3)
+        moved = [s for s in current if assignments[s] != current[s]]
+        self.assertEqual(moved, ['c'])
+        loads = [list(assignments.values()).count(w) for w in range(3)]
+        self.assertEqual(loads, [2, 2, 2])
+
+    def test_removed_worker(self) -> None:
+        """
+        Test that streams of workers beyond the pool size are moved.
+        """
+        assignments = assign_streams(['a', 'b'], {'a': 0, 'b': 5}, 2)
+        self.assertEqual(assignments, {'a': 0, 'b': 1})
+
+
+class TestServe(unittest.IsolatedAsyncioTestCase):
+    """
+    Unit tests for the event loop of a worker.
+    """
+
+    async def test_start_stop_shutdown(self) -> None:
+        """
+        Test starting, restarting and stopping stream coroutines.
+        """
+        started: list[dict] = []
+        cancelled: list[str] = []
+
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            started.append(config)
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(config['video_url'])
+                raise
+
+        commands: queue.Queue = queue.Queue()
+        for command in (
+            ('start', {'video_url': 'a'}),
+            ('start', {'video_url': 'b'}),
+            ('start', {'video_url': 'a', 'changed': True}),
+            ('stop', 'b'),
+            ('shutdown', None),
+        ):
+            commands.put(command)
+        cleanup = AsyncMock()
+
+        await asyncio.wait_for(serve(commands, target, cleanup), 5)
+
+        self.assertEqual([c['video_url'] for c in started], ['a', 'b', 'a'])
+        # The restarted 'a' and the stopped 'b' are cancelled, then the
+        # new 'a' on shutdown
+        self.assertEqual(sorted(cancelled), ['a', 'a', 'b'])
+        cleanup.assert_awaited_once()
+
+    async def test_update(self) -> None:
+        """
+        Test that changed configs are passed to the running stream.
+        """
+        received: list[dict] = []
+
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            while True:
+                received.append(await updates.get())
+
+        commands: queue.Queue = queue.Queue()
+        commands.put(('start', {'video_url': 'a'}))
+        commands.put(('update', {'video_url': 'a', 'stream_name': 'gate'}))
+        # Updates of streams that are not running are dropped
+        commands.put(('update', {'video_url': 'b'}))
+
+        task = asyncio.create_task(serve(commands, target))
+        while not received:
+            await asyncio.sleep(0.01)
+        commands.put(('shutdown', None))
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(
+            received,
+            [('config', {'video_url': 'a', 'stream_name': 'gate'})],
+        )
+
+    async def test_rate(self) -> None:
+        """
+        Test that detection rates are passed to the running streams.
+        """
+        received: list[tuple] = []
+
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            while True:
+                received.append(await updates.get())
+
+        commands: queue.Queue = queue.Queue()
+        commands.put(('start', {'video_url': 'a'}))
+        commands.put(('rate', {'a': 0.5, 'b': 2.0}))
+
+        task = asyncio.create_task(serve(commands, target))
+        while not received:
+            await asyncio.sleep(0.01)
+        commands.put(('shutdown', None))
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(received, [('rate', 0.5)])
+
+    async def test_failed_stream_is_logged(self) -> None:
+        """
+        Test that a failing stream does not stop the worker.
+        """
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            raise RuntimeError('camera offline')
+
+        commands: queue.Queue = queue.Queue()
+        commands.put(('start', {'video_url': 'a'}))
+
+        with self.assertLogs(level='ERROR') as logs:
+            task = asyncio.create_task(serve(commands, target))
+            while not logs.records:
+                await asyncio.sleep(0.01)
+            commands.put(('shutdown', None))
+            await asyncio.wait_for(task, 5)
+        self.assertIn('Stream a failed', logs.output[0])
+
+
+    async def test_failed_stream_is_restarted(self) -> None:
+        """
+        Test that a failed stream is restarted with its rate, and that
+        later updates reach the new stream.
+        """
+        started: list[dict] = []
+        received: list[tuple] = []
+
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            started.append(config)
+            if len(started) == 1:
+                raise RuntimeError('camera offline')
+            while True:
+                received.append(await updates.get())
+
+        commands: queue.Queue = queue.Queue()
+        commands.put(('rate', {'a': 0.5}))
+        commands.put(('start', {'video_url': 'a'}))
+        commands.put(('rate', {'a': 0.5}))
+
+        with self.assertLogs(level='ERROR'):
+            task = asyncio.create_task(
+                serve(commands, target, restart_delay=0),
+            )
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+        commands.put(('update', {'video_url': 'a', 'stream_name': 'gate'}))
+        while len(received) < 2:
+            await asyncio.sleep(0.01)
+        commands.put(('shutdown', None))
+        await asyncio.wait_for(task, 5)
+
+        self.assertEqual(started, [{'video_url': 'a'}] * 2)
+        self.assertEqual(
+            received,
+            [
+                ('rate', 0.5),
+                ('config', {'video_url': 'a', 'stream_name': 'gate'}),
+            ],
+        )
+
+    async def test_stopped_stream_is_not_restarted(self) -> None:
+        """
+        Test that stopping a failed stream cancels its restart.
+        """
+        started: list[dict] = []
+
+        async def target(config: dict, updates: asyncio.Queue) -> None:
+            started.append(config)
+            raise RuntimeError('camera offline')
+
+        commands: queue.Queue = queue.Queue()
+        commands.put(('start', {'video_url': 'a'}))
+
+        with self.assertLogs(level='ERROR'):
+            task = asyncio.create_task(
+                serve(commands, target, restart_delay=0.2),
+            )
+            while not started:
+                await asyncio.sleep(0.01)
+        commands.put(('stop', 'a'))
+        await asyncio.sleep(0.4)
+        commands.put(('shutdown', None))
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(len(started), 1)
+
+
+class TestRunWorker(unittest.TestCase):
+    """
+    Unit tests for the entry point of the worker processes.
+    """
+
+    @patch('src.worker_pool.reports', None)
+    def test_initializer(self) -> None:
+        """
+        Test that the initializer runs first and its layout is reported.
+        """
+        order: list[str] = []
+        commands: queue.Queue = queue.Queue()
+        commands.put(('shutdown', None))
+        reports: queue.Queue = queue.Queue()
+
+        async def cleanup() -> None:
+            order.append('cleanup')
+
+        def initializer(worker: int) -> dict:
+            order.append('initializer')
+            return {'worker': worker, 'cpus': [2, 3]}
+
+        run_worker(commands, AsyncMock(), cleanup, reports, initializer, 1)
+        self.assertEqual(order, ['initializer', 'cleanup'])
+        self.assertEqual(
+            reports.get_nowait(),
+            {'type': 'layout', 'worker': 1, 'cpus': [2, 3]},
+        )
+
+
+class TestWorkerPool(unittest.TestCase):
+    """
+    Unit tests for assigning streams to worker processes.
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a pool of two workers with mocked processes.
+        """
+        patcher = patch(
+            'src.worker_pool.Process', side_effect=lambda **_: MagicMock(),
+        )
+        self.mock_process = patcher.start()
+        self.addCleanup(patcher.stop)
+        queue_patcher = patch('src.worker_pool.Queue', side_effect=MagicMock)
+        queue_patcher.start()
+        self.addCleanup(queue_patcher.stop)
+
+        self.pool = WorkerPool(AsyncMock(), max_workers=2)
+        self.configs = {
+            url: {'video_url': url} for url in ('a', 'b', 'c')
+        }
+
+    def commands(self, worker: int) -> list[tuple]:
+        """
+        Get the commands sent to a worker.
+
+        Args:
+            worker (int): The index of the worker.
+
+        Returns:
+            list[tuple]: The commands in the order they were sent.
+        """
+        commands = self.pool.workers[worker][1]
+        return [call.args[0] for call in commands.put.call_args_list]
+
+    def test_update(self) -> None:
+        """
+        Test starting, restarting and rebalancing streams.
+        """
+        self.pool.update(self.configs)
+        self.assertEqual(self.mock_process.call_count, 2)
+        self.assertEqual(self.pool.assignments, {'a': 0, 'b': 1, 'c': 0})
+
+        # Restart a changed stream on the same worker
+        self.pool.update(self.configs, changed=['b'])
+        self.assertEqual(
+            self.commands(1),
+            [('start', {'video_url': 'b'}), ('start', {'video_url': 'b'})],
+        )
+
+        # Changes applied in place are sent to the running stream
+        self.configs['b'] = {'video_url': 'b', 'stream_name': 'gate'}
+        self.pool.update(self.configs, updated=['b'])
+        self.assertEqual(self.commands(1)[-1], ('update', self.configs['b']))
+        self.assertEqual(len(self.commands(0)), 2)
+
+        # Removing 'b' moves a stream of worker 0 to worker 1
+        del self.configs['b']
+        self.pool.update(self.configs)
+        self.assertEqual(self.commands(1)[-2][0], 'stop')
+        self.assertEqual(self.commands(1)[-1][0], 'start')
+        self.assertEqual(sorted(self.pool.assignments.values()), [0, 1])
+        moved = self.commands(1)[-1][1]['video_url']
+        self.assertEqual(self.commands(0)[-1], ('stop', moved))
+
+    def test_set_rates(self) -> None:
+        """
+        Test that only changed rates are sent, grouped by worker.
+        """
+        self.pool.update(self.configs)
+        self.pool.set_rates({'a': 1.0, 'b': 0.5, 'c': 0.2, 'x': 1.0})
+        self.assertEqual(self.commands(0)[-1], ('rate', {'a': 1.0, 'c': 0.2}))
+        self.assertEqual(self.commands(1)[-1], ('rate', {'b': 0.5}))
+
+        self.pool.set_rates({'a': 1.0, 'b': 0.5, 'c': 0.4})
+        self.assertEqual(self.commands(0)[-1], ('rate', {'c': 0.4}))
+        self.assertEqual(len(self.commands(1)), 2)
+
+        # Restarted streams get their rate again
+        self.pool.update(self.configs, changed=['b'])
+        self.assertEqual(
+            self.commands(1)[-2:],
+            [('start', {'video_url': 'b'}), ('rate', {'b': 0.5})],
+        )
+
+    def test_drain_reports(self) -> None:
+        """
+        Test collecting the reports sent by the streams.
+        """
+        self.pool.reports = queue.Queue()
+        self.pool.reports.put({'video_url': 'a'})
+        self.pool.reports.put({'video_url': 'b'})
+        self.assertEqual(
+            self.pool.drain_reports(),
+            [{'video_url': 'a'}, {'video_url': 'b'}],
+        )
+        self.assertEqual(self.pool.drain_reports(), [])
+
+    def test_respawn(self) -> None:
+        """
+        Test that a dead worker is restarted with its streams.
+        """
+        self.pool.update(self.configs)
+        process = self.pool.workers[0][0]
+        process.is_alive.return_value = False
+        self.pool.workers[1][0].is_alive.return_value = True
+
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(self.pool.respawn(), [0])
+        self.assertEqual(
+            self.commands(0),
+            [('start', {'video_url': 'a'}), ('start', {'video_url': 'c'})],
+        )
+
+    def test_shutdown(self) -> None:
+        """
+        Test that workers are asked to shut down, then joined.
+        """
+        self.pool.update(self.configs)
+        workers = list(self.pool.workers.values())
+        for process, _ in workers:
+            process.is_alive.side_effect = [True, False]
+
+        self.pool.shutdown()
+        for process, commands in workers:
+            commands.put.assert_called_with(('shutdown', None))
+            process.join.assert_called_once_with(10)
+            process.terminate.assert_not_called()
+        self.assertEqual(self.pool.workers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()